@@ -23,8 +23,14 @@ from vehicle.vehicle2d import SimpleVehicle2d, SimpleObstacle2d, BaseWall2d
 
 import steering
 steering.FLOCKING_RADIUS_MULTIPLIER = 1.2
+from formations import Formation
+from world import World
+from contacts import ContactResolver
+from render2d import DirtyRenderer
 
 UPDATE_SPEED = 0.2
+STEP_RATE = 100
+FRAME_RATE = 60
 
 if __name__ == "__main__":
     pygame.init()
@@ -58,6 +64,8 @@ if __name__ == "__main__":
     # Array of vehicles for pygame
     obj = [SimpleVehicle2d(pos[i], 50, vel, (img[i], rec[i])) for i in range(numveh)]
     rgroup = [veh.sprite for veh in obj]
+    # Obstacles and walls don't move; these are drawn onto the background
+    static = []
     
     # List of vehicles only, for later use
     vehlist = obj[:]
@@ -72,7 +80,7 @@ if __name__ == "__main__":
         pos.append(Point2d(offset*sc_width, rany))
         obstacle = SimpleObstacle2d(pos[i], 10, (img[i], rec[i]))
         obj.append(obstacle)
-        rgroup.append(obstacle.sprite)
+        static.append(obstacle.sprite)
     # This gives a convenient list of obstacles for later use
     obslist = obj[numveh:]
 
@@ -82,10 +90,11 @@ if __name__ == "__main__":
                  BaseWall2d((10, sc_height//2), sc_height-20, 4, Point2d(1,0)),
                  BaseWall2d((sc_width-10,sc_height//2), sc_height-20, 4, Point2d(-1,0)))
     obj.extend(wall_list)
-    rgroup.extend([wall.sprite for wall in wall_list])
+    static.extend([wall.sprite for wall in wall_list])
 
-    # Set-up pygame rendering
-    allsprites = pygame.sprite.RenderPlain(rgroup)
+    # Set-up pygame rendering (only regions with moving sprites are redrawn)
+    renderer = DirtyRenderer(screen, bgcolor, static)
+    renderer.add(*rgroup)
 
     ### Vehicle behavior defined below ###
     # Green leader (WANDER)
@@ -99,12 +108,12 @@ if __name__ == "__main__":
         #obj[i].steering.set_target(SEPARATE=[obj[i] for i in range(numveh)])
         pass
 
-    # Formation    
-    obj[1].steering.set_target(FOLLOW=(obj[0], Point2d(-40,20)))
-    obj[2].steering.set_target(FOLLOW=(obj[0], Point2d(-40,-20)))
-    obj[3].steering.set_target(FOLLOW=(obj[0], Point2d(-80,40)))
-    obj[4].steering.set_target(FOLLOW=(obj[0], Point2d(-80,0)))
-    obj[5].steering.set_target(FOLLOW=(obj[0], Point2d(-80,-40)))
+    # Formation (slot positions are shared by all followers)
+    offsets = [Point2d(-40,20), Point2d(-40,-20), Point2d(-80,40),
+               Point2d(-80,0), Point2d(-80,-40)]
+    formation = Formation(obj[0], offsets)
+    for i in range(1,numveh):
+        formation.add_follower(obj[i], i-1)
 
     # All vehicles will avoid obstacles and walls
     for i in range(numveh):
@@ -112,33 +121,35 @@ if __name__ == "__main__":
 
     ### End of vehicle behavior ###
 
-    ticks = 0
-    while 1:
-        for event in pygame.event.get():
-            if event.type in [QUIT, MOUSEBUTTONDOWN]:
-                pygame.quit()
-                sys.exit()
-                
-        # Update leader's target every so often
-        ticks += 1
-        if ticks == TARGET_FREQ:
+    # Fixed-timestep world: physics runs at STEP_RATE regardless of frame rate;
+    # contacts keep vehicles from passing through walls or obstacles
+    world = World(UPDATE_SPEED, STEP_RATE, contacts=ContactResolver(wall_list, obslist))
+    world.add(*vehlist)
+    # Update formation slots once per step, for all followers
+    world.add_update(formation.update)
+
+    def new_leader_target():
+        """Update leader's target every so often."""
+        if world.ticks % TARGET_FREQ == 0:
             # Green target
             x_new = randint(30, sc_width-30)
             y_new = randint(30, sc_height-30)
-            new_pos = Point2d(x_new,y_new)
             obj[0].steering.set_target(ARRIVE=(x_new,y_new))
-            ticks = 0
+            # Leader is changing direction, so let followers swap slots
+            formation.reassign()
+    world.add_update(new_leader_target)
 
-        # Update Vehicles (via manually calling each move() method)
-        for v in vehlist:
-            v.move(UPDATE_SPEED)
-
-        # Update Sprites (via pygame sprite group update)
-        allsprites.update(UPDATE_SPEED)
+    def render(alpha):
+        for event in pygame.event.get():
+            if event.type in [QUIT, MOUSEBUTTONDOWN]:
+                return False
 
-        # Render
-        screen.fill(bgcolor)
-        allsprites.draw(screen)
-        pygame.display.flip()
+        # Update Sprites (via pygame sprite group update), then draw vehicles
+        # partway between physics steps for smooth motion
+        renderer.update(UPDATE_SPEED)
+        renderer.render(world.interpolated(alpha))
 
-    pygame.time.delay(2000)
+    world.run(render, FRAME_RATE)
+    stats = renderer.report()
+    pygame.quit()
+    print('Render stats: %s' % stats)
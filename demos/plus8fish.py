@@ -47,6 +47,8 @@ ZERO_VECTOR = Point2d(0,0)
 import fsm_ex.ent_fish as entfish
 import fsm_ex.ent_shark as entshark
 
+from collisions import collide_any, collide_groups
+
 class FishFeeder(pygame.sprite.Group):
     """Mangager object for keeping track of fish food."""
 
@@ -55,7 +57,10 @@ class FishFeeder(pygame.sprite.Group):
         self.obs = obstacles
         self.maxfood = maxfood
         self.spritedata = foodsprite_data
-        # Generate pygame sprites for food
+        # Food objects (the sprite group is used for rendering only)
+        self.foods = []
+        # Fish currently touching food; see find_contacts()
+        self.contacts = dict()
 
     def add_food(self, num_new=1):
         """Adds food unit(s), but don't exceed the maximum number."""
@@ -64,10 +69,11 @@ class FishFeeder(pygame.sprite.Group):
             new_pos = Point2d(randint(30, sc_width-30), randint(30, sc_height-30))
             new_food = SimpleObstacle2d(new_pos, 2.5, self.spritedata)
             #new_food.sprite.rect.center = new_pos
-            # If it doesn't collide with any fish/obstacles, add to our sprite group
-            if pygame.sprite.spritecollideany(new_food.sprite, self, pygame.sprite.collide_circle):
+            # If it doesn't collide with any other food, add to our sprite group
+            if collide_any(new_food, self.foods) is not None:
                 del new_food
             else:
+                self.foods.append(new_food)
                 new_food.sprite.add(self, allsprites)
                 num_new -= 1
                 logging.debug('Fishfeeder added food at %s. %d left' % (new_pos, num_new))
@@ -89,12 +95,17 @@ class FishFeeder(pygame.sprite.Group):
                dsq = food_dsq
         return result
 
+    def find_contacts(self, fishes):
+        """Find all fish touching food, in one batch; call once per tick."""
+        self.contacts = dict(collide_groups(fishes, self.foods))
+
     def chomp(self, fish):
-        foodhit = pygame.sprite.spritecollideany(fish.sprite, self, pygame.sprite.collide_circle)
-        if foodhit is not None:
-            # foodhit is the sprite that was collided with
-            logging.info('Eating food at {!s}'.format(foodhit.rect.center))
-            foodhit.kill()
+        foodhit = self.contacts.pop(fish, None)
+        # Food may have been eaten by another fish since find_contacts()
+        if foodhit is not None and foodhit in self.foods:
+            logging.info('Eating food at {!s}'.format(foodhit.sprite.rect.center))
+            self.foods.remove(foodhit)
+            foodhit.sprite.kill()
             del(foodhit)
             self.add_food()
             return True
@@ -196,9 +207,6 @@ if __name__ == "__main__":
         fish.walls = wall_list
         fish.prey = fishlist
 
-    # Used by pygame for collision detection
-    COLLIDE_FUNCTION = pygame.sprite.collide_circle
-
     ### Main loop ###
     while True:
         for event in pygame.event.get():
@@ -206,6 +214,9 @@ if __name__ == "__main__":
                 pygame.quit()
                 sys.exit()
 
+        # Fish/food collisions for this tick, used by feeder.chomp()
+        feeder.find_contacts(fishlist)
+
         # FSM Updates (which update movement and steering)
         for veh in vehicles:
             veh.fsm.update()
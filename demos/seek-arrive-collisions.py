@@ -23,6 +23,8 @@ from vehicle.vehicle2d import load_pygame_image
 from vehicle.vehicle2d import SimpleVehicle2d, SimpleObstacle2d, BaseWall2d
 ZERO_VECTOR = Point2d(0,0)
 
+from collisions import collide_groups
+
 if __name__ == "__main__":
     pygame.init()
 
@@ -71,6 +73,7 @@ if __name__ == "__main__":
         obj[i].ent_id = i
     rgroup = [veh.sprite for veh in obj]
     vehicles = obj[:]
+    targets = []
 
     # Steering behaviour targets (implemented as vehicles for later use...)
     for i in range(numveh, 2*numveh):
@@ -79,6 +82,7 @@ if __name__ == "__main__":
         new_pos = Point2d(x_new,y_new)
         target = SimpleVehicle2d(new_pos, 10, ZERO_VECTOR, (img[i], rec[i]))
         obj.append(target)
+        targets.append(target)
         rgroup.append(target.sprite)
 
     # Static obstacles for pygame (randomly-generated positions)
@@ -120,18 +124,15 @@ if __name__ == "__main__":
     x_new, y_new = obj[5].pos[0], obj[5].pos[1]
     obj[2].steering.set_target(SEEK=(x_new, y_new))
 
-    # Target sprite groups for each vehicle
+    # Current target for each vehicle (None once reached)
     for i in range(numveh):
-        obj[i].tgroup = pygame.sprite.GroupSingle(obj[i + numveh].sprite)
+        obj[i].target = obj[i + numveh]
 
     # All vehicles will avoid obstacles and walls
     for i in range(3):
         obj[i].steering.set_target(AVOID=obslist, WALLAVOID=[30, wall_list])
     ### End of vehicle behavior ###
 
-    # Used by pygame for collision detection
-    COLLIDE_FUNCTION = pygame.sprite.collide_circle
-
     ### Main loop ###
     ticks = 0
     while 1:
@@ -142,12 +143,13 @@ if __name__ == "__main__":
 
         # Update Vehicles (via manually calling each move() method)
         for v in vehicles:
-            v_id = v.ent_id
             v.move(UPDATE_SPEED)
-            hit_list = pygame.sprite.spritecollide(v.sprite, v.tgroup, False, COLLIDE_FUNCTION)
-            if len(hit_list) > 0:
-                print("Vehicle %d: Now at target!" % v_id)
-                v.tgroup.remove(obj[v_id + numveh].sprite)
+
+        # Check all vehicle/target collisions at once
+        for (v, target) in collide_groups(vehicles, targets):
+            if v.target is target:
+                print("Vehicle %d: Now at target!" % v.ent_id)
+                v.target = None
 
         # Update steering targets every so often
         ticks += 1
@@ -158,7 +160,7 @@ if __name__ == "__main__":
             new_pos = Point2d(x_new,y_new)
             obj[5].pos = new_pos
             obj[2].steering.set_target(SEEK=(x_new,y_new))
-            obj[2].tgroup.add(obj[5].sprite)
+            obj[2].target = obj[5]
 
         if ticks == TARGET_FREQ*2:
             # Yellow target
@@ -167,7 +169,7 @@ if __name__ == "__main__":
             new_pos = Point2d(x_new,y_new)
             obj[4].pos = new_pos
             obj[1].steering.set_target(ARRIVE=(x_new,y_new,0.5))
-            obj[1].tgroup.add(obj[4].sprite)
+            obj[1].target = obj[4]
 
         if ticks == TARGET_FREQ*3:
             # Red target
@@ -176,7 +178,7 @@ if __name__ == "__main__":
             new_pos = Point2d(x_new,y_new)
             obj[3].pos = new_pos
             obj[0].steering.set_target(ARRIVE=(x_new,y_new,3.0))
-            obj[0].tgroup.add(obj[3].sprite)
+            obj[0].target = obj[3]
             ticks = 0
 
         # Update Sprites (via pygame sprite group update)
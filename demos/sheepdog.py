@@ -15,8 +15,9 @@ from random import randint, shuffle
 sys.path.append('..')
 from vpoints.point2d import Point2d
 
-from vehicle.vehicle2d import load_pygame_image, set_physics_defaults
+from vehicle.vehicle2d import load_pygame_image, PhysicsProfile
 from vehicle.vehicle2d import SimpleVehicle2d, SimpleObstacle2d, BaseWall2d
+from vehicle.intercept import InterceptSolver
 
 import steering
 # Override some default values from steering_constants:
@@ -46,13 +47,13 @@ if __name__ == "__main__":
         img[i], rec[i] = load_pygame_image('../images/gpig.png', -1)
 
     # Vehicle Physics
-    set_physics_defaults(MAXSPEED=8.0, MAXFORCE=6.0)
+    sheep_profile = PhysicsProfile(maxspeed=8.0, maxforce=6.0)
     pos = [Point2d(randint(30, sc_width-30), randint(30, sc_height-30)) for i in range(numveh)]
     pos[0] = Point2d(sc_width/2, sc_height/2)
     vel = Point2d(5.0,0).rotated_by(147*i, True)
 
     # List of vehicles and their associated sprites
-    obj = [SimpleVehicle2d(pos[i], 50, vel, (img[i], rec[i])) for i in range(numveh)]
+    obj = [SimpleVehicle2d(pos[i], 50, vel, (img[i], rec[i]), sheep_profile) for i in range(numveh)]
     rgroup = [veh.sprite for veh in obj]
 
     # List of vehicles only, for later use
@@ -98,12 +99,16 @@ if __name__ == "__main__":
     dog.steering.set_target(SEPARATE=vehlist, ALIGN=vehlist)
     dog.steering.set_target(WANDER=(200, 25, 6))
 
+    # All sheep EVADE the dog; their forces are computed together, once per
+    # tick, by an InterceptSolver (see intercept.py)
+    solver = InterceptSolver(vehlist[1:], [dog])
+
     # Flocking demo fails to celebrate its sheep diversity...(default physics)
     for sheep in vehlist[1:]:
         sheep.radius = 40
         sheep.steering.set_target(AVOID=obslist, WALLAVOID=[25, walllist])
         sheep.steering.set_target(SEPARATE=vehlist, ALIGN=vehlist, COHESION=vehlist[1:])
-        sheep.steering.set_target(EVADE=dog)
+        sheep.steering.set_target(EVADE=(dog, solver))
         sheep.steering.set_target(WANDER=(250, 10, 3))
 
     FREQ = 1200
@@ -133,6 +138,7 @@ if __name__ == "__main__":
         # Update Vehicles (via manually calling each move() method)
         for v in vehlist:
             v.move(UPDATE_SPEED)
+        solver.update()
 
         # Update Sprites (via pygame sprite group update)
         allsprites.update(UPDATE_SPEED)
@@ -121,7 +121,7 @@ class GlobalFishState(State):
 
     def on_msg(self, agent, msg):
         if msg == 'UR_EATEN':
-            logging.info('Fish {}: Was eaten by shark'.format(agent.ent_id))
+            logging.info('Fish %s: Was eaten by shark', agent.ent_id)
             agent.fsm.change_state(DeadState())
             return True
         if msg == 'SHARK':
@@ -143,7 +143,7 @@ class SwimState(State):
         # Activate WANDER
         agent.steering.set_target(WANDER=(90, 15, 3))
         agent.flocking_on()
-        logging.info('Fish {}: Fatigue = {}, Hunger = {}'.format(agent.ent_id, agent.fatigue, agent.hunger))
+        logging.info('Fish %s: Fatigue = %s, Hunger = %s', agent.ent_id, agent.fatigue, agent.hunger)
 
     def leave(self, agent):
         # Stop WANDER
@@ -180,7 +180,7 @@ class HuntState(State):
         # and try again later.
         agent.food_pos = agent.feeder.nearest_food_pos(agent.pos)
         if agent.food_pos is not None:
-            logging.info('Fish {}: HUNGRY ({}), Hunting food at ({:.0f}, {:.0f})'.format(agent.ent_id, agent.hunger, *agent.food_pos.ntuple()[:]))
+            logging.info('Fish %s: HUNGRY (%s), Hunting food at (%.0f, %.0f)', agent.ent_id, agent.hunger, *agent.food_pos.ntuple())
             agent.steering.set_target(ARRIVE=agent.food_pos)
         # Check our current target every so often
         agent.hunting_countdown = HUNTING_UPDATE_RATE
@@ -271,7 +271,7 @@ class GoHomeState(State):
 
     def enter(self, agent):
         # Activate ARRIVE (home)
-        logging.info('Fish {}: TIRED ({}), going home'.format(agent.ent_id, agent.fatigue))
+        logging.info('Fish %s: TIRED (%s), going home', agent.ent_id, agent.fatigue)
         agent.steering.set_target(ARRIVE=agent.home)
 
     def execute(self, agent):
@@ -302,7 +302,7 @@ class DeadState(State):
             agent.fsm.change_state(InitialFishState())
             
     def leave(self, agent):
-        logging.info('Fish {}: now respawning at {}'.format(agent.ent_id, agent.home))
+        logging.info('Fish %s: now respawning at %s', agent.ent_id, agent.home)
         agent.pos = agent.home
         agent.hunger = 0
         agent.fatigue = 0
@@ -15,6 +15,7 @@ from fsm_ex.state_machine import State, STATE_NONE, StateMachine
 # Note: Adjust this depending on where this file ends up.
 sys.path.append('..')
 from vehicle.vehicle2d import SimpleVehicle2d
+from vehicle.intercept import best_targets
 
 INF = float('inf')
 
@@ -101,7 +102,7 @@ class SwimState(State):
     def enter(self, agent):
         # Activate WANDER
         agent.steering.set_target(WANDER=(90, 40, 3))
-        logging.debug('Shark: Fatigue = %d, Hunger = %d' % (agent.fatigue, agent.hunger))
+        logging.debug('Shark: Fatigue = %d, Hunger = %d', agent.fatigue, agent.hunger)
 
     def execute(self, agent):
         # TODO: Flocking here
@@ -117,7 +118,7 @@ class EatState(State):
 
     def enter(self, agent):
         # TODO: Send message that food is being eaten
-        logging.info('Shark: Eating fish! Hunger now {}'.format(agent.hunger))
+        logging.info('Shark: Eating fish! Hunger now %s', agent.hunger)
         agent.target_prey.fsm.handle_msg('UR_EATEN')
 
     def execute(self, agent):
@@ -141,23 +142,16 @@ class HuntState(State):
         agent.maxspeed += SHARK_SPEED_BOOST
         # TODO: This assumes shark keeps track of the fish
         # TODO: Have global state manage the prey list??
-        # For now, find the location of the nearest prey
-        target = None
-        dsq = HUNTING_RANGE_SQ
-        for fish in agent.prey:
-           #fish_loc = Point2d(*food.rect.center)
-           food_dsq = (agent.pos - fish.pos).sqnorm()
-           if food_dsq < dsq:
-               target = fish
-               dsq = food_dsq
-        
+        # For now, pick the prey in range that we can intercept soonest
+        target = best_targets([agent], agent.prey, HUNTING_RANGE_SQ)[0][0]
+
         agent.target_prey = target
         if target is not None:
-            logging.info('Shark: HUNGRY ({}), Hunting prey at ({:.0f}, {:.0f})'.format(agent.hunger, *target.pos.ntuple()[:]))
+            logging.info('Shark: HUNGRY (%s), Hunting prey at (%.0f, %.0f)', agent.hunger, *target.pos.ntuple())
             agent.steering.set_target(PURSUE=target)
             target.fsm.handle_msg('SHARK')
         else:
-            logging.debug('Shark: HUNGRY ({}), but no prey found'.format(agent.hunger))
+            logging.debug('Shark: HUNGRY (%s), but no prey found', agent.hunger)
         agent.hunting_countdown = HUNTING_UPDATE_RATE
 
     def execute(self, agent):
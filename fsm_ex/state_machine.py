@@ -16,10 +16,32 @@ In entity's receive_msg() method, calling entity.fsm.handle_msg(message) will
 allow the FSM to route messages to the appropriate state logic: first to the
 current state, then to the global state.
 
+Debug messages for state changes are only produced if the root logger was
+enabled for DEBUG when this module was imported; call refresh_logging() after
+changing the logging configuration. For profiling runs, set_event_trace() can
+be used to record state changes with much less overhead.
 """
 
 import logging
 
+#: Cached check of whether debug messages will be logged; formatting of these
+#: messages is skipped entirely when False. Use refresh_logging() to update.
+LOG_DEBUG = logging.getLogger().isEnabledFor(logging.DEBUG)
+
+def refresh_logging():
+    """Re-check the logging level after the logging configuration changes."""
+    global LOG_DEBUG
+    LOG_DEBUG = logging.getLogger().isEnabledFor(logging.DEBUG)
+
+#: Optional trace object for state changes (see vehicle/event_trace.py); any
+#: object with a record(source, event, *data) method will do. None disables.
+EVENT_TRACE = None
+
+def set_event_trace(trace):
+    """Record FSM state changes in trace (None to stop tracing)."""
+    global EVENT_TRACE
+    EVENT_TRACE = trace
+
 class State(object):
     """Base class for all states.
 
@@ -142,8 +164,13 @@ class StateMachine(object):
             self.cur_state.leave(self.owner)
             self.cur_state = newstate
             self.cur_state.enter(self.owner)
-            info = (self.owner, self.pre_state.__class__, self.cur_state.__class__)
-            logging.debug('%s: FSM Changed state from %s -> %s' % info)
+            if LOG_DEBUG:
+                logging.debug('%s: FSM Changed state from %s -> %s', self.owner,
+                              self.pre_state.__class__, self.cur_state.__class__)
+            if EVENT_TRACE is not None:
+                EVENT_TRACE.record(self.owner, 'CHANGE_STATE',
+                                   self.pre_state.__class__.__name__,
+                                   self.cur_state.__class__.__name__)
 
     def revert_state(self):
         """Reverts owner to its previous state; useful for state blips."""
@@ -175,8 +202,9 @@ class StateMachine(object):
             return True
         # If neither, the message could not be handled
         else:
-            logging.debug('%s: FSM message was not handled by state logic.',
-                         self.owner.name)
+            if LOG_DEBUG:
+                logging.debug('%s: FSM message was not handled by state logic.',
+                              self.owner.name)
             return False
 
 if __name__ == "__main__":
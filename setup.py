@@ -15,6 +15,7 @@ setup(
     scripts=[],
     requires=[
         "pygame",
+        "numpy",
     ],
     classifiers=[
         'Programming Language :: Python',
@@ -0,0 +1,207 @@
+# collisions.py
+"""Circle collision detection for BasePointMass2d-derived bodies.
+
+This replaces pygame.sprite.spritecollide() and friends in simulation loops:
+collisions are found from each body's pos and radius, without pygame, and
+all overlapping pairs are returned from a single batch call per tick.
+
+The broadphase is a vectorized sweep-and-prune along the x-axis: bodies are
+sorted by the left edge of their bounding circle, and each body is paired
+only with the bodies whose left edge lies within its own x-extent (within
+the same or next horizontal strip; see overlapping_pairs). Candidate pairs
+are then checked exactly. As with pygame.sprite.collide_circle, bodies
+that are exactly touching count as overlapping.
+
+Usage::
+
+    for (vehicle, target) in collide_groups(vehicles, targets):
+        print('%s reached %s' % (vehicle, target))
+"""
+
+# for python3 compat
+from __future__ import unicode_literals
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import numpy as np
+
+from vehicle_store import VehicleStore
+
+def body_arrays(bodies):
+    """Get (pos, radius) arrays of shape (N,2) and (N,) for a list of bodies.
+
+    A VehicleStore may also be given, in which case its arrays are used.
+    """
+    if isinstance(bodies, VehicleStore):
+        return bodies.active('pos'), bodies.active('radius')
+    pos = np.array([b.pos.ntuple() for b in bodies], dtype=float).reshape(-1, 2)
+    radius = np.array([b.radius for b in bodies], dtype=float)
+    return pos, radius
+
+def _expand_ranges(starts, ends):
+    """Candidate pairs (k, m) for m in range(starts[k], ends[k])."""
+    counts = np.maximum(ends - starts, 0)
+    total = int(counts.sum())
+    first = np.repeat(np.arange(len(counts)), counts)
+    within = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    second = np.repeat(starts, counts) + within
+    return first, second
+
+def overlapping_pairs(pos, radius):
+    """Find all pairs of overlapping circles.
+
+    Parameters
+    ----------
+    pos: array of shape (N,2)
+        Circle centers.
+    radius: array of shape (N,)
+        Circle radii.
+
+    Returns
+    -------
+    (I, J): tuple of numpy.ndarray
+        Integer arrays of equal length; circles I[k] and J[k] overlap, with
+        I[k] < J[k]. Each overlapping pair is given exactly once.
+
+    Notes
+    -----
+    To keep the sweep short for large, dense worlds, bodies are first split
+    into horizontal strips whose height is the largest diameter; each body
+    is then swept only against its own strip and the next one down.
+    """
+    n = len(radius)
+    if n < 2:
+        empty = np.zeros(0, dtype=np.intp)
+        return empty, empty
+
+    # Sort by (strip, left edge) using a single combined key
+    height = 2*radius.max()
+    if not height > 0:
+        height = 1.0
+    xmin = pos[:, 0] - radius
+    xmax = pos[:, 0] + radius
+    x0 = xmin.min()
+    span = xmax.max() - x0 + 2*height + 1.0
+    strip = np.floor(pos[:, 1]/height)
+    strip -= strip.min()
+    base = strip*span - x0
+    order = np.argsort(base + xmin, kind='stable')
+    keys = (base + xmin)[order]
+    base, xmin, xmax = base[order], xmin[order], xmax[order]
+
+    # Same strip: later bodies whose left edge is within our x-extent
+    starts = np.arange(1, n + 1)
+    ends = np.searchsorted(keys, base + xmax, side='right')
+    i_same, j_same = _expand_ranges(starts, ends)
+
+    # Next strip: bodies whose x-extent might overlap ours
+    starts = np.searchsorted(keys, base + span + xmin - height, side='left')
+    ends = np.searchsorted(keys, base + span + xmax, side='right')
+    i_next, j_next = _expand_ranges(starts, ends)
+
+    # Exact test
+    i = order[np.concatenate((i_same, i_next))]
+    j = order[np.concatenate((j_same, j_next))]
+    diff = pos[i] - pos[j]
+    reach = radius[i] + radius[j]
+    hit = np.einsum('nk,nk->n', diff, diff) <= reach*reach
+    i, j = i[hit], j[hit]
+    swap = i > j
+    return np.where(swap, j, i), np.where(swap, i, j)
+
+def overlapping_between(pos_a, radius_a, pos_b, radius_b):
+    """Find all overlapping pairs between two sets of circles.
+
+    Returns
+    -------
+    (I, J): tuple of numpy.ndarray
+        Circle I[k] of the first set overlaps circle J[k] of the second.
+
+    Notes
+    -----
+    Only pairs between the two sets are considered, so this stays cheap
+    even when either set is large and crowded. As in overlapping_pairs,
+    the second set is split into horizontal strips, and each circle of the
+    first set is swept against its own strip and the two beside it.
+    """
+    n_a, n_b = len(radius_a), len(radius_b)
+    if n_a == 0 or n_b == 0:
+        empty = np.zeros(0, dtype=np.intp)
+        return empty, empty
+
+    # Sort the second set by (strip, left edge) using a single combined key
+    height = 2*max(radius_a.max(), radius_b.max())
+    if not height > 0:
+        height = 1.0
+    xmin_a = pos_a[:, 0] - radius_a
+    xmax_a = pos_a[:, 0] + radius_a
+    xmin_b = pos_b[:, 0] - radius_b
+    x0 = min(xmin_a.min(), xmin_b.min())
+    span = max(xmax_a.max(), pos_b[:, 0].max() + radius_b.max()) - x0 + 2*height + 1.0
+    y0 = min(pos_a[:, 1].min(), pos_b[:, 1].min())
+    strip_a = np.floor((pos_a[:, 1] - y0)/height)
+    strip_b = np.floor((pos_b[:, 1] - y0)/height)
+    keys = strip_b*span + xmin_b - x0
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    # Searching is much faster in sorted order, so sort the first set too
+    order_a = np.argsort(strip_a*span + xmin_a, kind='stable')
+    strip_a, xmin_a, xmax_a = strip_a[order_a], xmin_a[order_a], xmax_a[order_a]
+
+    # Since no radius exceeds height/2, any circle of the second set that
+    # overlaps ours in x has its left edge within [xmin - height, xmax]
+    firsts, seconds = [], []
+    for offset in (-1, 0, 1):
+        base = (strip_a + offset)*span - x0
+        starts = np.searchsorted(keys, base + xmin_a - height, side='left')
+        ends = np.searchsorted(keys, base + xmax_a, side='right')
+        first, second = _expand_ranges(starts, ends)
+        firsts.append(order_a[first])
+        seconds.append(order[second])
+
+    # Exact test
+    i = np.concatenate(firsts)
+    j = np.concatenate(seconds)
+    diff = pos_a[i] - pos_b[j]
+    reach = radius_a[i] + radius_b[j]
+    hit = np.einsum('nk,nk->n', diff, diff) <= reach*reach
+    return i[hit], j[hit]
+
+def collide_pairs(bodies):
+    """Get a list of all (body, body) pairs that overlap."""
+    bodylist = bodies.bodies if isinstance(bodies, VehicleStore) else bodies
+    i, j = overlapping_pairs(*body_arrays(bodies))
+    return [(bodylist[a], bodylist[b]) for a, b in zip(i.tolist(), j.tolist())]
+
+def collide_groups(group_a, group_b):
+    """Get a list of all (a, b) pairs that overlap, with a and b from each group.
+
+    A body belonging to both groups is never paired with itself.
+    """
+    list_a = group_a.bodies if isinstance(group_a, VehicleStore) else group_a
+    list_b = group_b.bodies if isinstance(group_b, VehicleStore) else group_b
+    i, j = overlapping_between(*(body_arrays(group_a) + body_arrays(group_b)))
+    return [(list_a[a], list_b[b]) for a, b in zip(i.tolist(), j.tolist())
+            if list_a[a] is not list_b[b]]
+
+def collide_any(body, bodies):
+    """Get the first of bodies that overlaps body (other than itself), or None.
+
+    This is for single queries (e.g. placing a new object); use the batch
+    functions above for per-tick checks.
+    """
+    pos, radius = body_arrays(bodies)
+    if len(radius) == 0:
+        return None
+    diff = pos - np.array(body.pos.ntuple())
+    reach = radius + body.radius
+    hits = np.flatnonzero(np.einsum('nk,nk->n', diff, diff) <= reach*reach)
+    bodylist = bodies.bodies if isinstance(bodies, VehicleStore) else bodies
+    for k in hits.tolist():
+        if bodylist[k] is not body:
+            return bodylist[k]
+    return None
+
+if __name__ == "__main__":
+    print("Circle collision detection for vehicles. Import this elsewhere.")
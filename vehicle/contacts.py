@@ -0,0 +1,358 @@
+# contacts.py
+"""Continuous collision response against walls and static obstacles.
+
+WALLAVOID and AVOID are only steering forces, so a fast vehicle (with
+maxspeed*delta_t larger than a wall's thickness) can pass straight through
+a wall between two physics steps. ContactResolver is an optional stage run
+after move(): it sweeps each body's bounding circle from its previous to
+its new position, and stops it at the first wall or obstacle it would hit.
+
+Response is a simple slide: the body is placed at the point of contact,
+the rest of its motion for that step continues along the surface, and the
+velocity component into the surface is removed (or reversed and scaled,
+if restitution > 0). This is repeated a few times per step, so that bodies
+sliding into a corner are handled.
+
+Walls (BaseWall2d) are treated as line segments of the given length, with
+rounded ends; bodies keep a distance of their radius plus half the wall
+thickness from them. Obstacles are circles with the given pos and radius.
+Candidate obstacles are found with the collisions.py broadphase, so that
+large numbers of bodies and obstacles remain cheap; each wall is checked
+directly against all bodies.
+
+Usage::
+
+    contacts = ContactResolver(walls=wall_list, obstacles=obstacle_list)
+    world = World(delta_t=2.0, contacts=contacts)
+    # ...or without a World, once per physics step:
+    previous = [veh.pos for veh in vehicles]
+    for veh in vehicles:
+        veh.move(delta_t)
+    contacts.resolve(vehicles, previous)
+"""
+
+# for python3 compat
+from __future__ import unicode_literals
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import numpy as np
+
+from vehicle2d import SPEED_EPSILON
+from point2d import Point2d
+from collisions import overlapping_between
+
+#: Maximum number of contacts resolved per body each step.
+CONTACT_ITERATIONS = 3
+
+#: Bodies are placed this far outside of a surface after contact, so that
+#: rounding errors don't leave them slightly inside it.
+CONTACT_SKIN = 1e-6
+
+def _dot(a, b):
+    return np.einsum('nk,nk->n', a, b)
+
+def _sweep_circle(start, disp, center, reach):
+    """Time of impact of moving points with circles, or inf if none.
+
+    Points start at start and move by disp; a hit occurs when a point comes
+    within reach of the circle center. Points already inside a circle are
+    handled by the callers.
+    """
+    f = start - center
+    a = _dot(disp, disp)
+    b = _dot(f, disp)
+    c = _dot(f, f) - reach*reach
+    disc = b*b - a*c
+    hit = (c >= 0) & (b < 0) & (disc >= 0) & (a > 0)
+    t = np.full(len(reach), np.inf)
+    t[hit] = (-b[hit] - np.sqrt(disc[hit]))/a[hit]
+    t[t > 1] = np.inf
+    return t
+
+class ContactResolver(object):
+    """Stops bodies from passing through walls and static obstacles.
+
+    Parameters
+    ----------
+    walls: list of BaseWall2d, optional
+        Walls to collide with.
+    obstacles: list of BasePointMass2d, optional
+        Static circular obstacles (e.g. SimpleObstacle2d) to collide with.
+    restitution: float
+        Fraction of the normal velocity kept (reversed) on contact; 0.0
+        (default) means bodies slide along surfaces without bouncing.
+    iterations: positive int
+        Maximum number of contacts resolved per body each step.
+
+    Notes
+    -----
+    Walls and obstacles are copied to arrays on creation; call set_walls()
+    or set_obstacles() if they change. An obstacle that is also one of the
+    bodies being resolved is never collided with itself.
+    """
+
+    def __init__(self, walls=(), obstacles=(), restitution=0.0, iterations=CONTACT_ITERATIONS):
+        self.restitution = restitution
+        self.iterations = iterations
+        self.set_walls(walls)
+        self.set_obstacles(obstacles)
+        # Number of bodies in contact during the last resolve()
+        self.contacts = 0
+
+    def set_walls(self, walls):
+        """Replace the list of walls."""
+        self.walls = list(walls)
+        n = len(self.walls)
+        self.wall_center = np.array([w.pos.ntuple() for w in self.walls], dtype=float).reshape(n, 2)
+        self.wall_normal = np.array([w.front.ntuple() for w in self.walls], dtype=float).reshape(n, 2)
+        self.wall_tangent = np.array([w.left.ntuple() for w in self.walls], dtype=float).reshape(n, 2)
+        self.wall_half = np.array([w.length/2 for w in self.walls], dtype=float)
+        self.wall_thick = np.array([w.thick/2 for w in self.walls], dtype=float)
+
+    def set_obstacles(self, obstacles):
+        """Replace the list of obstacles."""
+        self.obstacles = list(obstacles)
+        n = len(self.obstacles)
+        self.obstacle_pos = np.array([obs.pos.ntuple() for obs in self.obstacles], dtype=float).reshape(n, 2)
+        self.obstacle_radius = np.array([obs.radius for obs in self.obstacles], dtype=float)
+        self.obstacle_index = {id(obs): i for i, obs in enumerate(self.obstacles)}
+
+    def candidates(self, start, disp, radius, skip=None):
+        """Broadphase: (body, wall) and (body, obstacle) pairs that might touch.
+
+        Parameters
+        ----------
+        start, disp: arrays of shape (N,2)
+            Start position and displacement of each body this step.
+        radius: array of shape (N,)
+            Body radii.
+        skip: array of shape (N,), optional
+            For each body, the index of an obstacle to ignore (-1 for none).
+
+        Returns
+        -------
+        (bw, w, bo, o): tuple of numpy.ndarray
+            Candidate body/wall pairs (bw[k], w[k]), and body/obstacle pairs
+            (bo[k], o[k]).
+        """
+        # Anywhere a body can reach this step (slides included) is within
+        # its radius plus full displacement of its start.
+        reach = radius + np.sqrt(_dot(disp, disp))
+
+        # Walls are long and few, so test them directly rather than through
+        # their (large) bounding circles.
+        bw, w = [], []
+        for k in range(len(self.walls)):
+            offset = start - self.wall_center[k]
+            along = np.clip(np.dot(offset, self.wall_tangent[k]), -self.wall_half[k], self.wall_half[k])
+            away = offset - along[:, None]*self.wall_tangent[k]
+            near = reach + self.wall_thick[k]
+            bodies = np.flatnonzero(_dot(away, away) <= near*near)
+            bw.append(bodies)
+            w.append(np.full(len(bodies), k, dtype=np.intp))
+        bw = np.concatenate(bw) if bw else np.zeros(0, dtype=np.intp)
+        w = np.concatenate(w) if w else np.zeros(0, dtype=np.intp)
+
+        bo, o = overlapping_between(start, reach, self.obstacle_pos, self.obstacle_radius)
+        if skip is not None:
+            keep = skip[bo] != o
+            bo, o = bo[keep], o[keep]
+        return bw, w, bo, o
+
+    def _sweep_walls(self, start, disp, radius, b, w):
+        """Time of impact and contact normal for body/wall pairs (b, w)."""
+        p0, d = start[b], disp[b]
+        center, normal, tangent = self.wall_center[w], self.wall_normal[w], self.wall_tangent[w]
+        half = self.wall_half[w]
+        reach = radius[b] + self.wall_thick[w]
+
+        # Position relative to the wall: s along its normal, u along its length
+        offset = p0 - center
+        s0 = _dot(offset, normal)
+        s1 = s0 + _dot(d, normal)
+        u0 = _dot(offset, tangent)
+        ud = _dot(d, tangent)
+
+        t = np.full(len(b), np.inf)
+        hit_normal = np.zeros((len(b), 2))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # Long sides of the wall (front, then back)
+            for side in (1.0, -1.0):
+                crossing = (side*s0 >= reach) & (side*s1 < reach)
+                t_side = (side*s0 - reach)/(side*s0 - side*s1)
+                crossing &= np.abs(u0 + t_side*ud) <= half
+                better = crossing & (t_side < t)
+                t[better] = t_side[better]
+                hit_normal[better] = side*normal[better]
+            # Rounded ends
+            for end in (1.0, -1.0):
+                end_pos = center + end*half[:, None]*tangent
+                t_end = _sweep_circle(p0, d, end_pos, reach)
+                better = t_end < t
+                t[better] = t_end[better]
+                hit = p0[better] + t_end[better, None]*d[better]
+                hit_normal[better] = (hit - end_pos[better])/reach[better, None]
+
+        # Already touching or inside, and moving further in
+        closest = center + np.clip(u0, -half, half)[:, None]*tangent
+        away = p0 - closest
+        dist = np.sqrt(_dot(away, away))
+        inside = dist <= reach
+        if np.any(inside):
+            flat = dist < CONTACT_SKIN
+            away[flat] = np.where(s0[flat, None] >= 0, 1.0, -1.0)*normal[flat]
+            dist[flat] = 1.0
+            away /= dist[:, None]
+            inside &= _dot(d, away) < 0
+            t[inside] = 0.0
+            hit_normal[inside] = away[inside]
+        return t, hit_normal
+
+    def _sweep_obstacles(self, start, disp, radius, b, o):
+        """Time of impact and contact normal for body/obstacle pairs (b, o)."""
+        p0, d = start[b], disp[b]
+        center = self.obstacle_pos[o]
+        reach = radius[b] + self.obstacle_radius[o]
+        t = _sweep_circle(p0, d, center, reach)
+        hit = np.isfinite(t)
+        hit_normal = np.zeros((len(b), 2))
+        hit_normal[hit] = (p0[hit] + t[hit, None]*d[hit] - center[hit])/reach[hit, None]
+
+        # Already touching or inside, and moving further in
+        away = p0 - center
+        dist = np.sqrt(_dot(away, away))
+        inside = (dist <= reach) & (dist > 0)
+        if np.any(inside):
+            away[inside] /= dist[inside, None]
+            inside &= _dot(d, away) < 0
+            t[inside] = 0.0
+            hit_normal[inside] = away[inside]
+        return t, hit_normal
+
+    def sweep(self, start, disp, radius, pairs):
+        """First contact for each body, given candidate pairs.
+
+        Returns
+        -------
+        (t, normal): array of shape (N,), array of shape (N,2)
+            Fraction of disp travelled before first contact (inf if none),
+            and the unit surface normal at that contact.
+        """
+        bw, w, bo, o = pairs
+        t_wall, n_wall = self._sweep_walls(start, disp, radius, bw, w)
+        t_obs, n_obs = self._sweep_obstacles(start, disp, radius, bo, o)
+        body = np.concatenate((bw, bo))
+        t_pair = np.concatenate((t_wall, t_obs))
+        n_pair = np.concatenate((n_wall, n_obs)).reshape(-1, 2)
+
+        t = np.full(len(radius), np.inf)
+        normal = np.zeros((len(radius), 2))
+        hit = np.isfinite(t_pair)
+        body, t_pair, n_pair = body[hit], t_pair[hit], n_pair[hit]
+        if len(body) > 0:
+            order = np.lexsort((t_pair, body))
+            first = order[np.unique(body[order], return_index=True)[1]]
+            t[body[first]] = t_pair[first]
+            normal[body[first]] = n_pair[first]
+        return t, normal
+
+    def resolve_arrays(self, start, pos, vel, radius, skip=None):
+        """Resolve contacts in place, given arrays of body state.
+
+        Parameters
+        ----------
+        start: array of shape (N,2)
+            Body positions before this step's move().
+        pos, vel: arrays of shape (N,2)
+            Body positions and velocities after move(); updated in place.
+        radius: array of shape (N,)
+            Body radii.
+        skip: array of shape (N,), optional
+            For each body, the index of an obstacle to ignore (-1 for none).
+
+        Returns
+        -------
+        numpy.ndarray:
+            Boolean mask of bodies that made contact.
+        """
+        start = np.array(start, dtype=float)
+        disp = pos - start
+        pairs = self.candidates(start, disp, radius, skip)
+        touched = np.zeros(len(radius), dtype=bool)
+        if len(pairs[0]) + len(pairs[2]) == 0:
+            return touched
+
+        # Only bodies with candidates need to be swept at all; after that,
+        # only those that made contact in the previous iteration
+        bw, w, bo, o = pairs
+        for i in range(self.iterations):
+            t, normal = self.sweep(start, disp, radius, (bw, w, bo, o))
+            hit = np.isfinite(t)
+            if not np.any(hit):
+                break
+            touched |= hit
+            t, normal = t[hit, None], normal[hit]
+            contact = start[hit] + t*disp[hit] + CONTACT_SKIN*normal
+            # Slide along the surface for the rest of this step
+            rest = (1 - t)*disp[hit]
+            rest -= np.minimum(_dot(rest, normal), 0)[:, None]*normal
+            into = np.minimum(_dot(vel[hit], normal), 0)
+            vel[hit] -= ((1 + self.restitution)*into)[:, None]*normal
+            start[hit] = contact
+            disp[hit] = rest
+            keep_w, keep_o = hit[bw], hit[bo]
+            bw, w, bo, o = bw[keep_w], w[keep_w], bo[keep_o], o[keep_o]
+        else:
+            # Out of iterations; stop bodies that would still hit something
+            t, normal = self.sweep(start, disp, radius, (bw, w, bo, o))
+            stuck = np.isfinite(t)
+            normal = normal[stuck]
+            disp[stuck] = t[stuck, None]*disp[stuck] + CONTACT_SKIN*normal
+            into = np.minimum(_dot(vel[stuck], normal), 0)
+            vel[stuck] -= into[:, None]*normal
+        pos[touched] = start[touched] + disp[touched]
+        return touched
+
+    def resolve(self, bodies, previous):
+        """Resolve contacts for bodies after they have moved.
+
+        Parameters
+        ----------
+        bodies: list of BasePointMass2d
+            Bodies to check; pos and vel are replaced for those in contact,
+            and front/left are realigned with the new velocity.
+        previous: list of Point2d
+            Body positions before this step's move(), as in World.previous.
+
+        Returns
+        -------
+        int:
+            Number of bodies that made contact.
+        """
+        if len(bodies) == 0:
+            return 0
+        start = np.array([p.ntuple() for p in previous], dtype=float)
+        pos = np.array([b.pos.ntuple() for b in bodies], dtype=float)
+        vel = np.array([b.vel.ntuple() for b in bodies], dtype=float)
+        radius = np.array([b.radius for b in bodies], dtype=float)
+        skip = None
+        if self.obstacle_index:
+            skip = np.array([self.obstacle_index.get(id(b), -1) for b in bodies])
+        touched = self.resolve_arrays(start, pos, vel, radius, skip)
+
+        for k in np.flatnonzero(touched).tolist():
+            body = bodies[k]
+            body.pos = Point2d(pos[k, 0], pos[k, 1])
+            newvel = Point2d(vel[k, 0], vel[k, 1])
+            body.vel = newvel
+            if newvel.sqnorm() > SPEED_EPSILON:
+                front = newvel.unit()
+                body.front = front
+                body.left = Point2d(-front[1], front[0])
+        self.contacts = int(touched.sum())
+        return self.contacts
+
+if __name__ == "__main__":
+    print("Continuous collision response for vehicles. Import this elsewhere.")
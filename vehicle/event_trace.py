@@ -0,0 +1,81 @@
+# event_trace.py
+"""Low-overhead structured event trace, for use during profiling runs.
+
+An EventTrace stores (time, source, event, data) tuples in a fixed-size ring
+buffer; nothing is formatted until the trace is dumped. Modules that support
+tracing provide a set_event_trace() function:
+
+* steering.set_event_trace(trace) records behaviour set/pause/resume/stop.
+* fsm_ex.state_machine.set_event_trace(trace) records FSM state changes.
+
+Passing None to these functions turns tracing off again. When no trace is
+installed, the only cost at each call site is a single test against None.
+"""
+
+# for python3 compat
+from __future__ import unicode_literals
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+from timeit import default_timer
+
+#: Default number of events kept by an EventTrace.
+TRACE_CAPACITY = 65536
+
+class EventTrace(object):
+    """Fixed-size ring buffer of structured events.
+
+    Parameters
+    ----------
+    capacity: positive int
+        Maximum number of events kept; older events are overwritten.
+    clock: function, optional
+        Called with no arguments to timestamp each event. Defaults to a
+        wall-clock timer; a simulation tick counter also works well here.
+    """
+
+    def __init__(self, capacity=TRACE_CAPACITY, clock=default_timer):
+        self.capacity = capacity
+        self.clock = clock
+        self.clear()
+
+    def clear(self):
+        """Discard all recorded events."""
+        self.buffer = self.capacity*[None]
+        self.count = 0
+
+    def record(self, source, event, *data):
+        """Add an event to this trace.
+
+        Parameters
+        ----------
+        source: object
+            Whatever generated the event (typically a vehicle or entity); it
+            is stored by reference and only converted to a string on dump.
+        event: string
+            Short event name, such as 'PAUSE' or 'CHANGE_STATE'.
+        data: any
+            Additional event information, stored as a tuple.
+        """
+        self.buffer[self.count % self.capacity] = (self.clock(), source, event, data)
+        self.count += 1
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def events(self):
+        """Get the recorded events (oldest first) as a list of tuples."""
+        if self.count <= self.capacity:
+            return self.buffer[:self.count]
+        start = self.count % self.capacity
+        return self.buffer[start:] + self.buffer[:start]
+
+    def dump(self, outfile):
+        """Write all recorded events to an open text file, one per line."""
+        for (stamp, source, event, data) in self.events():
+            fields = ' '.join(str(item) for item in data)
+            outfile.write('%.6f %s %s %s\n' % (stamp, source, event, fields))
+
+if __name__ == "__main__":
+    print("Structured event trace. Import this elsewhere.")
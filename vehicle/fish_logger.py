@@ -18,6 +18,7 @@ from point2d import Point2d
 import vehicle2d
 import springmass
 import hydro_fish
+from telemetry import TelemetryRecorder
 import matplotlib.pyplot as plt
 
 # Math defauls
@@ -29,8 +30,7 @@ ZERO_VECTOR = Point2d(0,0)
 ## Duck punching...you'll be good at it!
 ##############################################################
 
-# This must be called after hydro_fish import to have any effect
-vehicle2d.set_physics_defaults(MAXSPEED=80.0, MAXFORCE=INF)
+# Fish nodes use hydro_fish.FISH_PROFILE (MAXSPEED=80.0, MAXFORCE=INF)
 
 # Physics constants
 hydro_fish.NODE_RADIUS = 5
@@ -58,7 +58,7 @@ SPRING_DATA = {'HEAD': 360,
                'TAIL': 140}
 
 ##############################################################
-### Swimming parameters (will go into motor control later)
+### Swimming parameters (see hydro_fish.swimming_gait)
 ##############################################################
 
 # Muscles are contracted to this proportion of original length
@@ -79,6 +79,19 @@ BG_COLOR = (111, 145, 192)
 HYDRO_COLOR = (0,90,190)
 NODE_COLOR = (0,0,0)
 
+##############################################################
+# Telemetry (see telemetry.py)
+##############################################################
+# Rows kept for plotting; with LOG_RING, only the most recent ones
+LOG_CAPACITY = 20000
+LOG_RING = True
+# Record every n-th tick
+LOG_DECIMATE = 1
+# Ignore startup jitter (in ticks) when computing average speed
+START_T = 1000
+# All recorded columns are saved here on exit
+LOG_FILE = 'fish_log.npz'
+
 ##########################################################
 ### Additional logging function definitions start here ###
 ##########################################################
@@ -101,8 +114,19 @@ def dm_stats_dynamic(self):
             )
     return info
 
+def dm_stats_fields(self):
+    """Telemetry columns written by stats_write()."""
+    return (('pos', (2,)), ('vel', (2,)))
+
+def dm_stats_write(self, columns, row):
+    """Write dynamic info into telemetry columns (see telemetry.py)."""
+    columns[0][row] = self.pos.ntuple()
+    columns[1][row] = self.vel.ntuple()
+
 DampedMass2d.stats_basic = dm_stats_basic
 DampedMass2d.stats_dynamic = dm_stats_dynamic
+DampedMass2d.stats_fields = dm_stats_fields
+DampedMass2d.stats_write = dm_stats_write
 
 ####################################################################
 ### Logging for springmass.IdealSpring2d
@@ -121,8 +145,18 @@ def is_stats_dynamic(self):
     info = (self.curlength,)
     return info
 
+def is_stats_fields(self):
+    """Telemetry columns written by stats_write()."""
+    return (('curlength', ()),)
+
+def is_stats_write(self, columns, row):
+    """Write dynamic info into telemetry columns (see telemetry.py)."""
+    columns[0][row] = self.curlength
+
 IdealSpring2d.stats_basic = is_stats_basic
 IdealSpring2d.stats_dynamic = is_stats_dynamic
+IdealSpring2d.stats_fields = is_stats_fields
+IdealSpring2d.stats_write = is_stats_write
 
 from hydro_fish import MuscleSpring2d, HydroQuad2d
 
@@ -149,8 +183,19 @@ def ms_stats_dynamic(self):
             )
     return info
 
+def ms_stats_fields(self):
+    """Telemetry columns written by stats_write()."""
+    return (('curlength', ()), ('natlength', ()))
+
+def ms_stats_write(self, columns, row):
+    """Write dynamic info into telemetry columns (see telemetry.py)."""
+    columns[0][row] = self.curlength
+    columns[1][row] = self.natlength
+
 MuscleSpring2d.stats_basic = ms_stats_basic
 MuscleSpring2d.stats_dynamic = ms_stats_dynamic
+MuscleSpring2d.stats_fields = ms_stats_fields
+MuscleSpring2d.stats_write = ms_stats_write
 
 ####################################################################
 ### Logging for hydro_fish.HydroQuad2d
@@ -178,13 +223,30 @@ def hq_stats_dynamic(self):
     info = (area, logged_force, self.pos, self.vel)
     return info
 
+def hq_stats_fields(self):
+    """Telemetry columns written by stats_write()."""
+    return (('area', ()), ('force', (2,)), ('pos', (2,)), ('vel', (2,)))
+
+def hq_stats_write(self, columns, row):
+    """Write dynamic info into telemetry columns (see telemetry.py)."""
+    area, force, pos, vel = columns
+    area[row] = self.avg_h * (self.base_m.pos - self.tip_m.pos).norm()
+    if self.current_force is None:
+        force[row] = 0.0
+    else:
+        force[row] = self.current_force.ntuple()
+    pos[row] = self.pos.ntuple()
+    vel[row] = self.vel.ntuple()
+
 HydroQuad2d.stats_basic = hq_stats_basic
 HydroQuad2d.stats_dynamic = hq_stats_dynamic
+HydroQuad2d.stats_fields = hq_stats_fields
+HydroQuad2d.stats_write = hq_stats_write
 
 ####################################################################
 ### Logging for hydro.fish.SMHFish
 ####################################################################
-from hydro_fish import SMHFish
+from hydro_fish import SMHFish, swimming_gait
 
 def fish_print_anatomy(self):
     # Prints initial location of each node
@@ -261,44 +323,31 @@ if __name__ == "__main__":
     fish = SMHFish(HEAD_DATA, BODY_DATA, TAIL_DATA, SPRING_DATA)
     #fish.print_anatomy()
 
-    ## Stuff below is for swimming muscle updates ###############
-    # This is duplicated from hydro_fish.py for now, but will be
-    # replaced once motor controllers are working.
-    freq = FREQ
-    ticks = 0
-    MID_GROUP = 2
-    fish.signal_muscles(MID_GROUP, 1) # Midsection, right
-    muscles_mid = 1
-
-    ticks2 = freq//2
+    # Swimming muscle schedule
     # Results seemed better without using the rear swim muscles.
-    # To activate them, set REAR_GROUP = 3
-    REAR_GROUP = -1
-    fish.signal_muscles(REAR_GROUP, 0) # Rear muscles, left
-    muscles_rear = 0
-    ## End of swimming muscle updates ###########################
+    # To activate them, use rear_swim=True
+    control = swimming_gait(FREQ, rear_swim=False)
+    ticks = 0
 
     #############################################################
-    # Placeholders for data to be plotted
+    # Telemetry for data to be plotted
     #############################################################
-    mid_r_nat = []
-    mid_r_act = []
-    mid_l_nat = []
-    mid_l_act = []
-    rearswim_r_act = []
-    rearswim_l_act = []
-    tailspring_r_act = []
-    tailspring_l_act = []
-    tailforce_r_x = []
-    tailforce_r_y = []
-    tailforce_l_x = []
-    tailforce_l_y = []
-    tailpos_y = []
+    recorder = TelemetryRecorder(LOG_CAPACITY, LOG_DECIMATE, LOG_RING)
+    recorder.add_source('mid_r', fish.muscles[2])       # Midsection, right
+    recorder.add_source('mid_l', fish.muscles[3])       # Midsection, left
+    recorder.add_source('rearswim_r', fish.muscles[4])  # Rear swim (no signal for now)
+    recorder.add_source('rearswim_l', fish.muscles[5])
+    recorder.add_source('tailspring_r', fish.springs[15])
+    recorder.add_source('tailspring_l', fish.springs[16])
+    recorder.add_source('tailquad_r', fish.hquads[10])
+    recorder.add_source('tailquad_l', fish.hquads[11])
+    recorder.add_source('tail', fish.massnodes[1])
+    # Velocity of center of position (NOT mass!)
+    # Note: This ignores head/tail nodes; too much judder
+    recorder.add_column('xspeed')
     xpos = fish.center_pos()[0]
-    xspeed = []
-    
-    tailquad_r_yvel = []
-    tailquad_l_yvel = []
+    # For the average speed after START_T (early rows may be overwritten)
+    xpos_start = xpos
 
     b_running = True
     ###########################################################
@@ -309,59 +358,18 @@ if __name__ == "__main__":
             if event.type in [QUIT, MOUSEBUTTONDOWN]:
                 b_running = False
 
-        ################## Squeeze Test ###########################
-        # TODO: This is duplicated from hydro_fish.py; will need to
-        # ...update once motor controller code is working
-        if ticks >= freq: # Change direction of midsection
-            ticks = 0
-            muscles_mid = 1 - muscles_mid
-            fish.signal_muscles(MID_GROUP, muscles_mid)
-
-        if ticks2 >= freq: # Change direction of rear swim muscles
-            ticks2 = 0
-            muscles_rear = 1 - muscles_rear
-            fish.signal_muscles(REAR_GROUP, muscles_rear)
-        ###########################################################
+        # Swimming muscle updates
+        control.apply(fish, ticks)
 
         # Update fish spring-mass and hydro physics
         fish.update(UPDATE_SPEED)
 
-        ###########################################################
-        ### Plot data update starts here 
-        ###########################################################
-        # Midsection muscles
-        muscle_info = fish.muscles[2].stats_dynamic()  # Midsection, right
-        mid_r_nat.append(muscle_info[1]) # Natural, right
-        mid_r_act.append(muscle_info[0]) # Actual, right
-        muscle_info = fish.muscles[3].stats_dynamic()  # Midsection, left
-        mid_l_nat.append(muscle_info[1]) # Natural, left
-        mid_l_act.append(muscle_info[0]) # Actual, left
-        # Rear swim muscles (no signal for now)
-        rearswim_r_act.append(fish.muscles[4].stats_dynamic()[0]) # Actual, right
-        rearswim_l_act.append(fish.muscles[5].stats_dynamic()[0]) # Actual, left
-        # Tail springs
-        tailspring_r_act.append(fish.springs[15].stats_dynamic()[0])
-        tailspring_l_act.append(fish.springs[16].stats_dynamic()[0])
-        # Tail hydroquads
-        tailinfo_r = fish.hquads[10].stats_dynamic()
-        tailinfo_l = fish.hquads[11].stats_dynamic()
-        force_r = tailinfo_r[1] # Hydroforce on right side
-        force_l = tailinfo_l[1] # Hydroforce on left side
-        tailforce_r_x.append(force_r[0]) # Right force, x-component
-        tailforce_l_x.append(force_l[0]) # Left force, x-component
-        tailforce_r_y.append(force_r[1]) # Right force, y-component
-        tailforce_l_y.append(force_l[1]) # Left force, y-component
-        # y-velocities of center of area of tail quads
-        tailquad_r_yvel.append(tailinfo_r[3][1])
-        tailquad_l_yvel.append(tailinfo_l[3][1])
-        # y-velocity of tail node
-        tailpos_y.append(fish.massnodes[1].stats_dynamic()[0][1])
-        # Velocity of center of position (NOT mass!)
-        # Note: This ignores head/tail nodes; too much judder
+        # Plot data update
         xposnew = fish.center_pos()[0]
-        xspeed.append((xpos - xposnew)/UPDATE_SPEED)
+        recorder.sample(xspeed=(xpos - xposnew)/UPDATE_SPEED)
         xpos = xposnew
-        ###########################################################
+        if recorder.ticks == START_T:
+            xpos_start = xpos
 
         # Render
         DISPLAYSURF.fill(BG_COLOR)
@@ -375,54 +383,59 @@ if __name__ == "__main__":
 
     # Clean-up pygame and plot results
     pygame.quit()
+    recorder.save_npz(LOG_FILE)
 
     # Ignore startup jitter and compute average speed
-    START_T = 1000
-    try:
-        xavg = sum(xspeed[START_T:])/len(xspeed[START_T:])
-    except ZeroDivisionError:
-        xavg = sum(xspeed)/len(xspeed)
+    if recorder.ticks > START_T:
+        xavg = (xpos_start - xpos)/((recorder.ticks - START_T)*UPDATE_SPEED)
+    else:
+        xavg = (xpos_start - xpos)/(max(recorder.ticks, 1)*UPDATE_SPEED)
     print('Average x velocity of center: %.2f' % xavg)
 
+    t = recorder['tick']
     numplots = 8
     sbase = plt.subplot(numplots, 1, 1)
-    plt.plot(mid_r_nat,'b', mid_r_act,'g',mid_l_act,'r')
+    plt.plot(t, recorder['mid_r_natlength'], 'b', t, recorder['mid_r_curlength'], 'g',
+             t, recorder['mid_l_curlength'], 'r')
     plt.legend(['Signal-R','R','L'])
     plt.ylabel('Midsection')
 
     plt.subplot(numplots, 1, 2, sharex=sbase)
-    plt.plot(rearswim_r_act,'g',rearswim_l_act,'r')
+    plt.plot(t, recorder['rearswim_r_curlength'], 'g', t, recorder['rearswim_l_curlength'], 'r')
     plt.legend(['R','L'])
     plt.ylabel('Rear swim')
 
     plt.subplot(numplots, 1, 3, sharex=sbase)
-    plt.plot(tailspring_r_act,'g',tailspring_l_act,'r')
+    plt.plot(t, recorder['tailspring_r_curlength'], 'g', t, recorder['tailspring_l_curlength'], 'r')
     plt.legend(['R','L'])
     plt.ylabel('Tail spring')
 
+    force_r = recorder['tailquad_r_force'] # Hydroforce on right side
+    force_l = recorder['tailquad_l_force'] # Hydroforce on left side
     plt.subplot(numplots, 1, 4, sharex=sbase)
-    plt.plot(tailforce_r_x,'.g',tailforce_l_x,'.r',ms=1)
+    plt.plot(t, force_r[:, 0], '.g', t, force_l[:, 0], '.r', ms=1)
     plt.legend(['R','L'])
     plt.ylabel('Tail force (x)')
 
     plt.subplot(numplots, 1, 5, sharex=sbase)
-    plt.plot(tailforce_r_y,'.g',tailforce_l_y,'.r',ms=1)
+    plt.plot(t, force_r[:, 1], '.g', t, force_l[:, 1], '.r', ms=1)
     plt.legend(['R','L'])
     plt.ylabel('Tail force (y)')
 
+    # y-velocities of center of area of tail quads
     plt.subplot(numplots, 1, 6, sharex=sbase)
-    plt.plot(tailquad_r_yvel,'.g',tailquad_l_yvel,'.r',ms=1)
+    plt.plot(t, recorder['tailquad_r_vel'][:, 1], '.g', t, recorder['tailquad_l_vel'][:, 1], '.r', ms=1)
     plt.legend(['R','L'])
     plt.ylabel('Tail quad\nvelocity (y)')
     
     plt.subplot(numplots, 1, 7, sharex=sbase)
-    plt.plot(tailpos_y, '.k',ms=1)
+    plt.plot(t, recorder['tail_pos'][:, 1], '.k', ms=1)
     plt.ylabel('Tail node\n(y)')
     
     plt.subplot(numplots, 1, 8, sharex=sbase)
-    plt.plot(xspeed)
+    plt.plot(t, recorder['xspeed'])
     plt.annotate('Average speed starts here\n %.2f pixels per update' % xavg,
-                 (1000,xavg),(1000,xavg/2),arrowprops={'arrowstyle':'->'})
+                 (START_T,xavg),(START_T,xavg/2),arrowprops={'arrowstyle':'->'})
     plt.ylabel('x speed\n of center')
 
     plt.show()
@@ -0,0 +1,228 @@
+# fish_school.py
+"""Schools of spring-mass-hydro fish, simulated together in shared arrays.
+
+SMHFish builds its 12 mass nodes, springs and hydro quads as objects, and
+updates them one at a time. A FishSchool builds one SMHFish as a template,
+copies the template's arrays into a single SpringNetwork once per fish
+(SpringNetwork.add_copies), and steps every fish at once. No per-fish
+objects are created, so schools of hundreds of fish are cheap to build
+and to update.
+
+Each fish is a block of rows in the network; the network indices of fish
+i are nodes[i], springs[i], muscles[i] and quads[i], in the same order as
+the template's massnodes, springs, muscles and hquads. Muscle signals are
+sent to any subset of fish at once, with an index array or boolean mask;
+or all muscles can follow a hydro_fish.MuscleControl schedule.
+
+Usage::
+
+    school = FishSchool(100, integrator='symplectic')
+    school.signal_muscles(MID_GROUP, 1)              # All fish
+    school.signal_muscles(MID_GROUP, 0, fish=[3, 7])  # Just two of them
+    # ...each tick:
+    school.update(UPDATE_SPEED)
+    school.render(surf)
+
+    # Or, instead of signal_muscles(), follow a precomputed schedule:
+    control = hydro_fish.swimming_gait()
+    # ...each tick (offsets: where each fish starts in the cycle):
+    control.apply_network(school.network, school.muscles, tick, offsets)
+"""
+
+# for python3 compat
+from __future__ import unicode_literals
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import numpy as np
+
+import hydro_fish
+from spring_network import SpringNetwork
+
+#: Muscle groups of SMHFish.signal_muscles(), as (right, left) indices into
+#: SMHFish.muscles. Group 1 ("turning" muscles) has no muscles yet.
+MUSCLE_GROUPS = {2: (2, 3), # Midsection
+                 3: (4, 5)} # Rear "swim" muscles
+
+# Muscle group used for swimming
+MID_GROUP = 2
+
+#: Default (x, y) distance between fish, for default_offsets().
+SCHOOL_SPACING = (400, 100)
+
+def default_offsets(count, columns=None, spacing=SCHOOL_SPACING):
+    """Position offsets for a school of fish, in a grid.
+
+    Parameters
+    ----------
+    count: int
+        Number of fish.
+    columns: int, optional
+        Fish per row; defaults to about the square root of count.
+    spacing: (float, float)
+        Distance between columns and between rows.
+
+    Returns
+    -------
+    numpy.ndarray:
+        Array of shape (count, 2). The first fish has no offset; further
+        columns are ahead of it (towards negative x), and the rows are
+        centered on it vertically.
+    """
+    if columns is None:
+        columns = max(1, int(np.ceil(np.sqrt(count))))
+    index = np.arange(count)
+    rows = (count + columns - 1)//columns
+    offsets = np.empty((count, 2))
+    offsets[:, 0] = -(index % columns)*spacing[0]
+    offsets[:, 1] = (index//columns - (rows - 1)//2)*spacing[1]
+    return offsets
+
+class FishSchool(object):
+    """Any number of identical SMHFish, stepped together. See module notes.
+
+    Parameters
+    ----------
+    count: int
+        Number of fish.
+    offsets: array of shape (count, 2), optional
+        Position of each fish, relative to where SMHFish places a single
+        fish; defaults to default_offsets(count).
+    integrator: string
+        Integrator for the underlying SpringNetwork (see INTEGRATORS there).
+    fish_data: (head_data, body_data, tail_data, spring_k), optional
+        Arguments for the template SMHFish; defaults to those in hydro_fish.
+    force_mult: float, optional
+        Fluid force multiplier; defaults to hydro_fish.HYDRO_FORCE_MULT.
+    """
+
+    def __init__(self, count, offsets=None, integrator='euler', fish_data=None, force_mult=None):
+        if fish_data is None:
+            fish_data = (hydro_fish.HEAD_DATA, hydro_fish.BODY_DATA,
+                         hydro_fish.TAIL_DATA, hydro_fish.SPRING_DATA)
+        if offsets is None:
+            offsets = default_offsets(count)
+        self.template = hydro_fish.SMHFish(*fish_data)
+        template = SpringNetwork()
+        template.add_fish(self.template, force_mult)
+
+        self.count = count
+        self.network = SpringNetwork(integrator)
+        self.nodes, self.springs, self.quads = self.network.add_copies(template, count, offsets)
+        self.muscles = self.springs[:, :self.template.num_muscles]
+        # Nodes used by SMHFish.center_pos() (all but head and tail)
+        self._center_nodes = self.nodes[:, 2:]
+
+    def __len__(self):
+        return self.count
+
+    def signal_muscles(self, group, direction, fish=None):
+        """Contract/flex one of the muscle groups, for some or all fish.
+
+        Parameters
+        ----------
+        group: int
+            Muscle group, as in SMHFish.signal_muscles(); see MUSCLE_GROUPS.
+        direction: 0, 1, or array
+            0 (contract left) or 1 (contract right); either for all selected
+            fish, or an array with one value per selected fish.
+        fish: index array or boolean mask, optional
+            The fish to signal; defaults to all of them.
+        """
+        if group not in MUSCLE_GROUPS:
+            return
+        if fish is None:
+            fish = slice(None)
+        right, left = MUSCLE_GROUPS[group]
+        direction = np.asarray(direction, dtype=float)
+        self.network.contract(self.muscles[fish, right], direction)
+        self.network.contract(self.muscles[fish, left], 1 - direction)
+
+    def update(self, delta_t=1.0):
+        """Update spring-mass and hydro physics of all fish."""
+        self.network.step(delta_t)
+
+    def center_pos(self):
+        """Center of position of each fish, as SMHFish.center_pos().
+
+        Returns
+        -------
+        numpy.ndarray:
+            Array of shape (count, 2).
+        """
+        return self.network.pos[self._center_nodes].sum(axis=1)/self.template.numnodes
+
+    def fish_pos(self, index):
+        """Positions of the mass nodes of one fish, as an array of shape (12, 2)."""
+        return self.network.pos[self.nodes[index]]
+
+    def render(self, surf):
+        """Render all fish (on a pygame surface), as SMHFish.render()."""
+        import pygame.draw
+        network = self.network
+        pos = network.pos.tolist()
+
+        # Springs, shaded as in IdealSpring2d.render()
+        displacement = network.pos[network.tip] - network.pos[network.base]
+        scale = network.natlength/np.sqrt(np.einsum('nk,nk->n', displacement, displacement))
+        shade = np.minimum(255, 64*scale).tolist()
+        stretched = (scale > 1).tolist()
+        for base, tip, value, is_stretched in zip(network.base.tolist(), network.tip.tolist(),
+                                                  shade, stretched):
+            spcolor = (value, 0, 0) if is_stretched else (0, value, 0)
+            pygame.draw.line(surf, spcolor, pos[base], pos[tip], 2)
+
+        # Hydro forces, as in HydroQuad2d.renderforce()
+        quad_pos = network.quad_pos.tolist()
+        quad_tip = (network.quad_pos - network.quad_force*hydro_fish.HYDRO_FORCE_SCALE).tolist()
+        for i in np.flatnonzero(network.quad_active).tolist():
+            center = [int(x) for x in quad_pos[i]]
+            pygame.draw.circle(surf, hydro_fish.HYDRO_COLOR, center, 2, 0)
+            pygame.draw.line(surf, hydro_fish.HYDRO_COLOR, center, [int(x) for x in quad_tip[i]], 2)
+
+        # Mass nodes
+        radius, color = self.template.node_radius, self.template.node_color
+        for center in pos:
+            pygame.draw.circle(surf, color, [int(x) for x in center], radius)
+
+if __name__ == "__main__":
+    import pygame
+    from pygame.locals import QUIT, MOUSEBUTTONDOWN
+    pygame.init()
+
+    # Display constants
+    DISPLAYSURF = pygame.display.set_mode(hydro_fish.SCREEN_SIZE)
+    pygame.display.set_caption('Spring-mass-hydro fish school demo')
+    BG_COLOR = (111, 145, 192)
+
+    NUM_FISH = 12
+    school = FishSchool(NUM_FISH, default_offsets(NUM_FISH, columns=2))
+
+    # All fish share one swimming gait, but each starts at a random point
+    # in the cycle.
+    control = hydro_fish.swimming_gait()
+    offsets = np.random.randint(0, control.period, NUM_FISH)
+    ticks = 0
+
+    b_running = True
+    ############  Main Loop  ######################
+    while b_running:
+        for event in pygame.event.get():
+            if event.type in [QUIT, MOUSEBUTTONDOWN]:
+                b_running = False
+
+        # Swimming muscle updates, for all fish at once
+        control.apply_network(school.network, school.muscles, ticks, offsets)
+
+        # Update spring-mass and hydro physics of all fish
+        school.update(hydro_fish.UPDATE_SPEED)
+
+        # Render
+        DISPLAYSURF.fill(BG_COLOR)
+        school.render(DISPLAYSURF)
+        pygame.display.flip()
+        ticks += 1
+
+    # Clean-up pygame
+    pygame.quit()
@@ -0,0 +1,354 @@
+# fish_sweep.py
+"""Headless parameter sweeps for SMHFish swimming gaits.
+
+fish_logger.py measures the average x-speed of one fish, for one choice of
+SPRING_DATA, SQUEEZE, FREQ and HYDRO_FORCE_MULT, in an interactive pygame
+window. This module runs the same measurement for many parameter sets,
+without pygame, in a pool of worker processes:
+
+* param_grid() and param_sample() build the parameter sets, as dicts keyed
+  by PARAM_NAMES; any parameter not given keeps its hydro_fish default.
+* run_sweep() simulates every parameter set and appends one CSV row per
+  set (the parameters, the run settings, and the resulting speed) to the
+  output file as soon as each batch of fish finishes.
+* load_results() reads the output file back.
+
+Swimming follows the fish_logger main loop, with the same
+hydro_fish.swimming_gait(FREQ) controller: the midsection muscles start
+contracted on the right, and switch sides every FREQ ticks. The speed is
+fish_logger's "average x velocity of center", averaged over the ticks
+after START_T; positive speeds are towards the head (negative x).
+
+Each worker puts a batch of fish (CHUNK_SIZE of them) into a single
+SpringNetwork with the 'euler' integrator, which gives the same results as
+SMHFish.update() but steps all of the fish at once.
+
+Sweeps are resumable: when run_sweep() is given an existing output file,
+every parameter set already in it (with the same run settings) is skipped,
+so an interrupted sweep can simply be run again. Random samples should be
+given a seed, so that the same sample is drawn again on resume.
+
+Usage::
+
+    grid = param_grid(SQUEEZE=[0.84, 0.88, 0.92], FREQ=[100, 140, 180])
+    run_sweep(grid, 'gaits.csv', processes=4)
+    best = max(load_results('gaits.csv'), key=lambda row: row['speed'])
+"""
+
+# for python3 compat
+from __future__ import unicode_literals
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import csv
+import io
+import itertools
+import multiprocessing
+import os
+
+import numpy as np
+
+import hydro_fish
+from spring_network import SpringNetwork
+
+#: Spring constants of an SMHFish, as in hydro_fish.SPRING_DATA.
+SPRING_KEYS = ('HEAD', 'MUSCLE', 'SOLID', 'CROSS', 'TAIL')
+
+#: Parameters that can be swept.
+PARAM_NAMES = SPRING_KEYS + ('SQUEEZE', 'FREQ', 'HYDRO_FORCE_MULT')
+
+#: Run settings, also recorded with each result.
+RUN_NAMES = ('TICKS', 'START_T', 'UPDATE_SPEED')
+
+#: Columns of the output file.
+COLUMNS = PARAM_NAMES + RUN_NAMES + ('speed',)
+
+# Default run settings; START_T and UPDATE_SPEED are as in fish_logger.py
+TICKS = 4000
+START_T = 1000
+UPDATE_SPEED = 0.0235
+
+#: Number of fish simulated together by each worker task.
+CHUNK_SIZE = 16
+
+def default_params():
+    """Current hydro_fish values of all parameters in PARAM_NAMES."""
+    params = dict((key, hydro_fish.SPRING_DATA[key]) for key in SPRING_KEYS)
+    params['SQUEEZE'] = hydro_fish.SQUEEZE
+    params['FREQ'] = hydro_fish.FREQ
+    params['HYDRO_FORCE_MULT'] = hydro_fish.HYDRO_FORCE_MULT
+    return params
+
+def _check_names(names):
+    unknown = sorted(set(names) - set(PARAM_NAMES))
+    if unknown:
+        raise ValueError('Unknown parameters %s; use any of %s' % (unknown, PARAM_NAMES))
+
+def param_grid(**axes):
+    """Get all combinations of the given parameter values.
+
+    Parameters
+    ----------
+    axes: lists of values, keyed by parameter name
+        For example, SQUEEZE=[0.84, 0.88], FREQ=[100, 140].
+
+    Returns
+    -------
+    list of dict:
+        One dict of all PARAM_NAMES for each combination; parameters not
+        given keep their default_params() values.
+    """
+    _check_names(axes)
+    names = [name for name in PARAM_NAMES if name in axes]
+    base = default_params()
+    grid = []
+    for values in itertools.product(*[axes[name] for name in names]):
+        params = dict(base)
+        params.update(zip(names, values))
+        grid.append(params)
+    return grid
+
+def param_sample(count, seed=None, **ranges):
+    """Get parameter sets drawn uniformly at random.
+
+    Parameters
+    ----------
+    count: int
+        Number of parameter sets.
+    seed: int, optional
+        Random seed; use the same seed to resume a sweep.
+    ranges: (low, high) pairs, keyed by parameter name
+        For example, SQUEEZE=(0.8, 0.95). FREQ is rounded to whole ticks.
+
+    Returns
+    -------
+    list of dict:
+        As for param_grid().
+    """
+    _check_names(ranges)
+    rng = np.random.RandomState(seed)
+    columns = {}
+    for name in PARAM_NAMES:
+        if name in ranges:
+            low, high = ranges[name]
+            columns[name] = rng.uniform(low, high, count)
+            if name == 'FREQ':
+                columns[name] = np.round(columns[name]).astype(int)
+    base = default_params()
+    sample = []
+    for i in range(count):
+        params = dict(base)
+        params.update((name, values[i].item()) for name, values in columns.items())
+        sample.append(params)
+    return sample
+
+def _row_values(params, ticks, start_t, delta_t):
+    """Values of PARAM_NAMES + RUN_NAMES, as used for resuming."""
+    values = [float(params[name]) for name in PARAM_NAMES]
+    values[PARAM_NAMES.index('FREQ')] = int(params['FREQ'])
+    return tuple(values) + (int(ticks), int(start_t), float(delta_t))
+
+def build_fish(params, fish_data=None):
+    """Create an SMHFish with the given parameters.
+
+    Parameters
+    ----------
+    params: dict
+        Spring constants and SQUEEZE (other parameters are not used here).
+    fish_data: (head_data, body_data, tail_data), optional
+        Fish geometry; defaults to that of hydro_fish.
+    """
+    if fish_data is None:
+        fish_data = (hydro_fish.HEAD_DATA, hydro_fish.BODY_DATA, hydro_fish.TAIL_DATA)
+    head_data, body_data, tail_data = fish_data
+    spring_k = dict((key, params[key]) for key in SPRING_KEYS)
+    # MuscleSpring2d gets its contraction from the module, as in fish_logger
+    squeeze = hydro_fish.SQUEEZE
+    hydro_fish.SQUEEZE = params['SQUEEZE']
+    try:
+        return hydro_fish.SMHFish(head_data, body_data, tail_data, spring_k)
+    finally:
+        hydro_fish.SQUEEZE = squeeze
+
+def swim_speeds(param_list, ticks=TICKS, start_t=START_T, delta_t=UPDATE_SPEED, fish_data=None):
+    """Simulate one fish for each parameter set, and get its average speed.
+
+    Parameters
+    ----------
+    param_list: list of dict
+        Parameter sets, as from param_grid() or param_sample().
+    ticks: int
+        Number of physics updates.
+    start_t: int
+        Ticks ignored (as start-up jitter) before averaging.
+    delta_t: float
+        Time step of each update.
+    fish_data: (head_data, body_data, tail_data), optional
+        Fish geometry; see build_fish().
+
+    Returns
+    -------
+    numpy.ndarray:
+        Average x-speed of the center of each fish (as SMHFish.center_pos),
+        towards negative x, after start_t; or over the whole run if it has
+        no more than start_t ticks. A fish whose simulation blows up gets
+        NaN.
+    """
+    network = SpringNetwork('euler')
+    muscles, centers, numnodes = [], [], []
+    for params in param_list:
+        fish = build_fish(params, fish_data)
+        handle = network.add_fish(fish, params['HYDRO_FORCE_MULT'])
+        # Muscles, and the nodes used by SMHFish.center_pos()
+        muscles.append(handle.muscles)
+        centers.append(handle.nodes[2:])
+        numnodes.append(fish.numnodes)
+    muscles = np.array(muscles, dtype=np.intp).reshape(len(numnodes), -1)
+    centers = np.array(centers, dtype=np.intp).reshape(len(numnodes), -1)
+    numnodes = np.array(numnodes, dtype=float)
+
+    # The demos' swimming gait; one controller for each distinct FREQ
+    freq = np.array([int(params['FREQ']) for params in param_list])
+    gaits = [(hydro_fish.swimming_gait(value), muscles[freq == value])
+             for value in np.unique(freq).tolist()]
+
+    def center_x():
+        return network.pos[centers, 0].sum(axis=1)/numnodes
+
+    start_x = center_x()
+    with np.errstate(all='ignore'):
+        for tick in range(ticks):
+            for control, fish_muscles in gaits:
+                control.apply_network(network, fish_muscles, tick)
+            network.step(delta_t)
+            if tick + 1 == start_t:
+                start_x = center_x()
+        averaged = ticks - start_t if ticks > start_t else ticks
+        return (start_x - center_x())/(averaged*delta_t)
+
+def _run_chunk(task):
+    """Worker task: speeds for one chunk of parameter sets."""
+    param_list, ticks, start_t, delta_t, fish_data = task
+    return param_list, swim_speeds(param_list, ticks, start_t, delta_t, fish_data).tolist()
+
+def _format(value):
+    # repr() keeps every digit, so parameters read back exactly on resume
+    return repr(value) if isinstance(value, float) else str(value)
+
+def _read_rows(path):
+    """Get the complete rows of an output file (partial last line ignored)."""
+    with io.open(path, 'r', newline='') as csvfile:
+        text = csvfile.read()
+    if not text.endswith('\n'):
+        text = text[:text.rfind('\n') + 1]
+    rows = list(csv.reader(text.splitlines()))
+    if rows and tuple(rows[0]) != COLUMNS:
+        raise ValueError('%s is not a fish_sweep output file (columns %s)' % (path, rows[0]))
+    return [row for row in rows[1:] if len(row) == len(COLUMNS)]
+
+def load_results(path):
+    """Read an output file of run_sweep().
+
+    Returns
+    -------
+    list of dict:
+        One dict per completed run, keyed by COLUMNS.
+    """
+    results = []
+    for row in _read_rows(path):
+        result = dict((name, float(value)) for name, value in zip(COLUMNS, row))
+        for name in ('FREQ', 'TICKS', 'START_T'):
+            result[name] = int(result[name])
+        results.append(result)
+    return results
+
+def run_sweep(param_list, path, processes=None, ticks=TICKS, start_t=START_T,
+              delta_t=UPDATE_SPEED, chunk_size=CHUNK_SIZE, fish_data=None):
+    """Simulate every parameter set in a process pool, streaming results to CSV.
+
+    Parameters
+    ----------
+    param_list: list of dict
+        Parameter sets, as from param_grid() or param_sample().
+    path: string
+        Output file. If it already exists, results are appended, and any
+        parameter set already in it (with the same ticks, start_t and
+        delta_t) is skipped.
+    processes: int, optional
+        Number of worker processes; defaults to the number of CPUs.
+    ticks, start_t, delta_t:
+        Run settings; see swim_speeds().
+    chunk_size: int
+        Number of fish simulated together by each worker task.
+    fish_data: (head_data, body_data, tail_data), optional
+        Fish geometry; see build_fish(). This is not recorded in the file,
+        so use a new file for each geometry.
+
+    Notes
+    -----
+    Other hydro_fish constants (MASS_SCALE, DAMPING_COEFF, etc.) are read
+    by the workers; changes made to them at run time are only seen by
+    workers started with fork (the default on Linux).
+
+    Returns
+    -------
+    int:
+        Number of parameter sets simulated by this call.
+    """
+    for params in param_list:
+        _check_names(params)
+    done = set()
+    if os.path.exists(path):
+        rows = _read_rows(path)
+        done = set(tuple(float(value) for value in row[:-1]) for row in rows)
+        # Drop any row cut short by an interruption, before appending
+        with io.open(path, 'r+b') as outfile:
+            data = outfile.read()
+            outfile.truncate(data.rfind(b'\n') + 1)
+
+    todo = []
+    for params in param_list:
+        key = _row_values(params, ticks, start_t, delta_t)
+        if key not in done:
+            done.add(key)
+            todo.append(params)
+    if not todo:
+        return 0
+
+    tasks = [(todo[i:i + chunk_size], ticks, start_t, delta_t, fish_data)
+             for i in range(0, len(todo), chunk_size)]
+    write_header = not os.path.exists(path) or os.path.getsize(path) == 0
+    with io.open(path, 'a', newline='') as outfile:
+        writer = csv.writer(outfile)
+        if write_header:
+            writer.writerow(COLUMNS)
+            outfile.flush()
+        pool = multiprocessing.Pool(processes)
+        try:
+            for chunk, speeds in pool.imap_unordered(_run_chunk, tasks):
+                for params, speed in zip(chunk, speeds):
+                    values = _row_values(params, ticks, start_t, delta_t) + (speed,)
+                    writer.writerow([_format(value) for value in values])
+                outfile.flush()
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+    return len(todo)
+
+if __name__ == "__main__":
+    import sys
+    from timeit import default_timer
+    path = sys.argv[1] if len(sys.argv) > 1 else 'fish_sweep.csv'
+    grid = param_grid(SQUEEZE=[0.84, 0.88, 0.92], FREQ=[100, 140, 180],
+                      HYDRO_FORCE_MULT=[6.0, 8.0])
+    start = default_timer()
+    count = run_sweep(grid, path)
+    print('Ran %d of %d parameter sets in %.1f s; results in %s'
+          % (count, len(grid), default_timer() - start, path))
+    results = [row for row in load_results(path) if np.isfinite(row['speed'])]
+    results.sort(key=lambda row: row['speed'], reverse=True)
+    for row in results[:5]:
+        print('speed %7.2f: SQUEEZE %.2f, FREQ %d, HYDRO_FORCE_MULT %.1f'
+              % (row['speed'], row['SQUEEZE'], row['FREQ'], row['HYDRO_FORCE_MULT']))
@@ -0,0 +1,165 @@
+# formations.py
+"""Formation manager for leader-following with many vehicles.
+
+A Formation owns a leader and a table of slot offsets (in the leader's local
+coordinates, front = +x). Once per tick, update() transforms every slot into
+world coordinates in a single vectorized pass, using the leader's front/left
+vectors only once. Followers using the FORMATION steering behaviour then look
+up their own slot in constant time.
+
+Usage::
+
+    formation = Formation(leader, [(-40,20), (-40,-20), (-80,0)])
+    for follower in followers:
+        formation.add_follower(follower)  # Also activates FORMATION
+    # ...in the main loop, after moving the leader:
+    formation.update()
+
+For large formations, reassign() matches followers to slots by proximity,
+which avoids followers crossing the whole formation to reach their slot
+after the formation turns or changes shape.
+"""
+
+# for python3 compat
+from __future__ import unicode_literals
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import numpy as np
+
+from point2d import Point2d
+
+class Formation(object):
+    """Leader and slot table for the FORMATION steering behaviour.
+
+    Parameters
+    ----------
+    leader: BasePointMass2d
+        The lead vehicle; slot offsets are relative to its position/heading.
+    offsets: list of Point2d or 2-tuple
+        Slot offsets in the leader's local coordinates (front = +x).
+    """
+
+    def __init__(self, leader, offsets):
+        self.leader = leader
+        self.offsets = np.array([(off[0], off[1]) for off in offsets], dtype=float).reshape(-1, 2)
+        self.slot_owner = len(self.offsets)*[None]
+        self.assignment = dict()
+        self.update()
+
+    def update(self):
+        """Recompute world positions of all slots; call once per tick."""
+        leader = self.leader
+        self.leader_front = leader.front
+        self.leader_left = leader.left
+        self.leader_vel = leader.vel
+        self.leader_speed = leader.vel.norm()
+        front = np.array(leader.front.ntuple())
+        left = np.array(leader.left.ntuple())
+        world = (np.array(leader.pos.ntuple())
+                 + self.offsets[:, 0:1]*front + self.offsets[:, 1:2]*left)
+        self.positions = world
+        self._slot_points = [Point2d(x, y) for (x, y) in world.tolist()]
+
+    def slot_position(self, follower):
+        """World position (as of the last update) of a follower's slot."""
+        return self._slot_points[self.assignment[follower]]
+
+    def free_slots(self):
+        """Get a list of slot indices that have no follower."""
+        return [i for i, owner in enumerate(self.slot_owner) if owner is None]
+
+    def add_slot(self, offset):
+        """Add a new (empty) slot to this formation; returns its index."""
+        self.offsets = np.vstack((self.offsets, (offset[0], offset[1])))
+        self.slot_owner.append(None)
+        self.update()
+        return len(self.slot_owner) - 1
+
+    def add_follower(self, follower, slot=None):
+        """Assign a follower to a slot and activate its FORMATION behaviour.
+
+        Parameters
+        ----------
+        follower: SimpleVehicle2d
+            Vehicle to be added to this formation.
+        slot: int, optional
+            Slot index; if unspecified, use the nearest free slot.
+
+        Returns
+        -------
+        int:
+            Index of the assigned slot.
+
+        Raises
+        ------
+        ValueError: If there are no free slots (or the given slot is taken).
+        """
+        if slot is None:
+            free = self.free_slots()
+            if not free:
+                raise ValueError("Formation has no free slots for %s" % follower)
+            pos = np.array(follower.pos.ntuple())
+            dsq = ((self.positions[free] - pos)**2).sum(axis=1)
+            slot = free[int(np.argmin(dsq))]
+        elif self.slot_owner[slot] is not None:
+            raise ValueError("Formation slot %d is already taken" % slot)
+        self.remove_follower(follower)
+        self.slot_owner[slot] = follower
+        self.assignment[follower] = slot
+        follower.steering.set_target(FORMATION=self)
+        return slot
+
+    def remove_follower(self, follower):
+        """Remove a follower from its slot and stop its FORMATION behaviour.
+
+        A paused FORMATION behaviour (for this formation) is also discarded,
+        so that it can't be resumed without a slot.
+        """
+        slot = self.assignment.pop(follower, None)
+        if slot is None:
+            return
+        self.slot_owner[slot] = None
+        steering = follower.steering
+        if steering.targets.get('FORMATION') == (self,):
+            steering.stop('FORMATION')
+        if steering.inactive_targets.get('FORMATION') == (self,):
+            del steering.inactive_targets['FORMATION']
+
+    def reassign(self):
+        """Reassign all current followers to slots by nearest distance.
+
+        Notes
+        -----
+        This is a greedy matching: all (follower, slot) distances are computed
+        in one pass, then pairs are taken in order of increasing distance,
+        skipping any follower or slot that is already matched. This is not
+        always the optimal assignment, but is fast for hundreds of followers
+        and avoids most crossing paths.
+        """
+        followers = list(self.assignment)
+        if not followers:
+            return
+        self.update()
+        pos = np.array([f.pos.ntuple() for f in followers], dtype=float)
+        diff = pos[:, np.newaxis, :] - self.positions[np.newaxis, :, :]
+        dsq = np.einsum('fsk,fsk->fs', diff, diff)
+
+        n_slots = len(self.slot_owner)
+        self.slot_owner = n_slots*[None]
+        self.assignment = dict()
+        matched = 0
+        for flat in np.argsort(dsq, axis=None, kind='stable'):
+            fi, si = divmod(int(flat), n_slots)
+            follower = followers[fi]
+            if follower in self.assignment or self.slot_owner[si] is not None:
+                continue
+            self.slot_owner[si] = follower
+            self.assignment[follower] = si
+            matched += 1
+            if matched == len(followers):
+                break
+
+if __name__ == "__main__":
+    print("Formation manager for FORMATION steering. Import this elsewhere.")
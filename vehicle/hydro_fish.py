@@ -7,8 +7,7 @@ from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import division
 
-import sys, pygame
-from pygame.locals import QUIT, MOUSEBUTTONDOWN
+import sys
 
 # TODO: Adjust this depending on where this file ends up.
 sys.path.extend(['../vpoints', '../vehicle'])
@@ -21,10 +20,11 @@ from springmass import DampedMass2d, IdealSpring2d
 
 # Math defauls
 from math import sqrt
+import numpy as np
 INF = float('inf')
 
-# This must be called after springmass imports to have any effect
-vehicle2d.set_physics_defaults(MAXSPEED=80.0, MAXFORCE=INF)
+#: Physics profile for fish nodes
+FISH_PROFILE = vehicle2d.PhysicsProfile(mass=1.0, maxspeed=80.0, maxforce=INF)
 
 # Physics constants
 NODE_RADIUS = 5
@@ -108,9 +108,127 @@ class MuscleSpring2d(IdealSpring2d):
 
 
 class MuscleControl(object):
-    """TODO: Helper class for controlling muscle movements over time."""
-    def __init__(self):
-        raise NotImplementedError
+    """Central pattern generator: periodic contraction schedules for muscles.
+
+    Parameters
+    ----------
+    period: positive int
+        Length of one swimming cycle, in ticks.
+    phases: sequence of float
+        For each controlled muscle, the point in the cycle (as a fraction
+        of the period) at which it starts contracting.
+    duty: float or sequence of float
+        Fraction of the period during which each muscle is contracted.
+    amplitude: float or sequence of float
+        Squeeze factor of each muscle while contracted (0 to 1, as for
+        MuscleSpring2d.contract); it is zero otherwise.
+    muscles: sequence of int, optional
+        Indices into SMHFish.muscles of the controlled muscles; defaults
+        to the first len(phases) muscles.
+
+    Notes
+    -----
+    The whole cycle is precomputed once, as schedule[tick, muscle]: the
+    squeeze factor of each muscle at each tick of the period. Each update
+    is then a single table lookup, with no per-muscle logic.
+
+    apply() drives one SMHFish (through its muscle objects). For fish in a
+    SpringNetwork (or a FishSchool), apply_network() contracts all of their
+    muscles in one call; each fish may start at its own point in the cycle
+    (given as a tick offset), so a whole school can swim out of step.
+
+    See swimming_gait() for the gait used in the demos.
+    """
+    def __init__(self, period, phases, duty=0.5, amplitude=1.0, muscles=None):
+        period = int(period)
+        if period < 1:
+            raise ValueError('period must be a positive number of ticks')
+        phases = np.asarray(phases, dtype=float)
+        count = len(phases)
+        if muscles is None:
+            muscles = range(count)
+        self.period = period
+        self.muscles = np.asarray(muscles, dtype=np.intp)
+        if len(self.muscles) != count:
+            raise ValueError('Need one phase for each controlled muscle')
+
+        # Phase and duty in whole ticks, so that schedules are exact
+        start = np.round(phases*period).astype(int)
+        on_ticks = np.round(np.broadcast_to(duty, (count,))*period).astype(int)
+        ticks = np.arange(period)[:, np.newaxis]
+        contracted = (ticks - start) % period < on_ticks
+        self.schedule = contracted*np.broadcast_to(np.asarray(amplitude, dtype=float), (count,))
+
+    def activation(self, tick, offsets=0):
+        """Squeeze factors for the given tick.
+
+        Parameters
+        ----------
+        tick: int
+            Number of ticks since the start of the schedule.
+        offsets: int or array of int
+            Point in the cycle (in ticks) at which each fish started.
+
+        Returns
+        -------
+        numpy.ndarray:
+            One squeeze factor per controlled muscle; with an array of
+            offsets, one row of these per fish.
+        """
+        return self.schedule[(tick + np.asarray(offsets)) % self.period]
+
+    def apply(self, fish, tick):
+        """Contract the controlled muscles of an SMHFish for the given tick."""
+        muscles = fish.muscles
+        for index, squeeze in zip(self.muscles.tolist(), self.activation(tick).tolist()):
+            muscles[index].contract(squeeze)
+
+    def apply_network(self, network, muscles, tick, offsets=0):
+        """Contract the controlled muscles of fish in a SpringNetwork.
+
+        Parameters
+        ----------
+        network: spring_network.SpringNetwork
+            The network holding the fish.
+        muscles: array of int
+            Network indices of all muscles of one fish (as in the handle
+            from SpringNetwork.add_fish), or an array of these with one
+            row per fish (as FishSchool.muscles).
+        tick: int
+            Number of ticks since the start of the schedule.
+        offsets: int or array of int
+            Point in the cycle (in ticks) at which each fish started.
+        """
+        muscles = np.asarray(muscles)
+        controlled = muscles[..., self.muscles]
+        squeeze = np.broadcast_to(self.activation(tick, offsets), controlled.shape)
+        network.contract(controlled.ravel(), squeeze.ravel())
+
+def swimming_gait(freq=None, rear_swim=False):
+    """MuscleControl for the swimming gait used in the demos.
+
+    The midsection muscles start contracted on the right, and switch sides
+    every freq ticks; this is the same as calling signal_muscles(2, 1), then
+    switching direction every freq ticks.
+
+    Parameters
+    ----------
+    freq: int, optional
+        Ticks between switches; defaults to FREQ.
+    rear_swim: boolean
+        If True, also use the rear "swim" muscles, starting contracted on
+        the left and a quarter cycle out of step with the midsection.
+    """
+    if freq is None:
+        freq = FREQ
+    period = 2*freq
+    muscles = [2, 3]
+    start = [0, freq]
+    if rear_swim:
+        rear_start = freq - freq//2
+        muscles.extend([4, 5])
+        start.extend([rear_start, rear_start + freq])
+    return MuscleControl(period, np.array(start)/period, muscles=muscles)
 
 
 class HydroQuad2d(object):
@@ -187,6 +305,7 @@ class HydroQuad2d(object):
 
     def renderforce(self, surf):
         """Draw (on a pygame surface) the hydro force exerted by this quad."""
+        import pygame.draw
         if self.current_force is not None:
             center = [int(x) for x in self.pos.ntuple()]
             pygame.draw.circle(surf, HYDRO_COLOR, center, 2, 0)
@@ -210,7 +329,7 @@ class SMHFish(object):
         ### Set up nodemasses ################################################
         # Head node (NOTE: No spritedata)
         head_mass = head_data[0]*MASS_SCALE
-        massnodes[0] = DampedMass2d(offset, NODE_RADIUS, Point2d(0,0), head_mass, damping)
+        massnodes[0] = DampedMass2d(offset, NODE_RADIUS, Point2d(0,0), head_mass, damping, profile=FISH_PROFILE)
 
         # Body segment nodes
         x_local = 0
@@ -221,17 +340,17 @@ class SMHFish(object):
             x_local += xlen
             # Right node (even index)
             nodepos = offset + Point2d(x_local, ywid).scm(SIZE_SCALE)
-            massnodes[index_right] = DampedMass2d(nodepos, NODE_RADIUS, Point2d(0,0), nmass*MASS_SCALE, damping)
+            massnodes[index_right] = DampedMass2d(nodepos, NODE_RADIUS, Point2d(0,0), nmass*MASS_SCALE, damping, profile=FISH_PROFILE)
             # Left node (odd index)
             nodepos = offset + Point2d(x_local, -ywid).scm(SIZE_SCALE)
-            massnodes[1 + index_right] = DampedMass2d(nodepos, NODE_RADIUS, Point2d(0,0), nmass*MASS_SCALE, damping)
+            massnodes[1 + index_right] = DampedMass2d(nodepos, NODE_RADIUS, Point2d(0,0), nmass*MASS_SCALE, damping, profile=FISH_PROFILE)
             # Quad heights (needed later)
             quad_h.append(zhi*SIZE_SCALE)
 
         # Tail
         nodepos = offset + Point2d(x_local + tail_data[0], 0).scm(SIZE_SCALE)
         nmass = tail_data[1]
-        massnodes[1] = DampedMass2d(nodepos, NODE_RADIUS, Point2d(0,0), nmass, damping)
+        massnodes[1] = DampedMass2d(nodepos, NODE_RADIUS, Point2d(0,0), nmass, damping, profile=FISH_PROFILE)
         quad_h.append(tail_data[2]*SIZE_SCALE)
 
         self.massnodes = tuple(massnodes)
@@ -359,7 +478,8 @@ class SMHFish(object):
             node.move(delta_t)
 
     def render(self, surf):
-        """Render this fish."""
+        """Render this fish (on a pygame surface)."""
+        import pygame.draw
         # Manually render each spring
         for spring in self.springs:
             spring.render(surf)
@@ -384,6 +504,8 @@ class SMHFish(object):
         return result.scm(1.0/self.numnodes)
 
 if __name__ == "__main__":
+    import pygame
+    from pygame.locals import QUIT, MOUSEBUTTONDOWN
     pygame.init()
 
     # Display constants
@@ -393,21 +515,11 @@ if __name__ == "__main__":
 
     fish = SMHFish(HEAD_DATA, BODY_DATA, TAIL_DATA, SPRING_DATA)
 
-    ## Stuff below is for swimming muscle updates ###############
-    # TODO: Move this into the motor controller class
-    freq = FREQ
-    ticks = 0
-    MID_GROUP = 2
-    fish.signal_muscles(MID_GROUP, 1) # Midsection, right
-    muscles_mid = 1
-
-    ticks2 = freq//2
+    # Swimming muscle schedule
     # Results seemed better without using the rear swim muscles.
-    # To activate them, set REAR_GROUP = 3
-    REAR_GROUP = -1
-    fish.signal_muscles(REAR_GROUP, 0) # Rear muscles, left
-    muscles_rear = 0
-    ## End of swimming muscle updates ###########################
+    # To activate them, use rear_swim=True
+    control = swimming_gait(FREQ, rear_swim=False)
+    ticks = 0
 
     xpos = fish.center_pos().ntuple()[0]
     t = 0
@@ -418,18 +530,8 @@ if __name__ == "__main__":
             if event.type in [QUIT, MOUSEBUTTONDOWN]:
                 b_running = False
 
-        ################## Squeeze Test ###########################
-        # TODO: Move this into the motor controller class
-        if ticks >= freq: # Change direction of midsection
-            ticks = 0
-            muscles_mid = 1 - muscles_mid
-            fish.signal_muscles(MID_GROUP, muscles_mid)
-
-        if ticks2 >= freq: # Change direction of rear swim muscles
-            ticks2 = 0
-            muscles_rear = 1 - muscles_rear
-            fish.signal_muscles(REAR_GROUP, muscles_rear)
-        ###########################################################
+        # Swimming muscle updates
+        control.apply(fish, ticks)
 
         # Update fish spring-mass and hydro physics
         fish.update(UPDATE_SPEED)
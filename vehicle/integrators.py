@@ -0,0 +1,336 @@
+# integrators.py
+"""Vectorized physics updates for many bodies at once.
+
+move_arrays() performs the same update as BasePointMass2d.move() for every
+row of a set of arrays in one call:
+
+* Position is updated using the current velocity.
+* Force is truncated to maxforce, then applied as acceleration.
+* Velocity is truncated to maxspeed.
+* Heading (front/left) is aligned with velocity, unless the squared speed
+  is below vehicle2d.SPEED_EPSILON.
+
+move_store() applies this to every body in a vehicle_store.VehicleStore,
+using (and then zeroing) the accumulated force unless forces are given.
+move_grouped() does the same for an ordinary list of bodies, in one batch
+for each vehicle2d.PhysicsProfile.
+
+RigidBodyBatch does the same for SimpleRigidBody2d (linear and angular
+motion), with headings stored as an array of angles; see tread_controls()
+for the NewTank2d controls from tank_demo.py.
+
+Run this module directly for a benchmark against looping move().
+"""
+
+# for python3 compat
+from __future__ import unicode_literals
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import numpy as np
+
+from vehicle2d import SPEED_EPSILON
+from point2d import Point2d
+
+def truncate_rows(vec, maxlength):
+    """Rescale rows of vec (in place) whose length exceeds maxlength."""
+    sq = np.einsum('nk,nk->n', vec, vec)
+    maxlength = np.broadcast_to(maxlength, sq.shape)
+    over = sq > maxlength*maxlength
+    if over.any():
+        vec[over] *= (maxlength[over]/np.sqrt(sq[over]))[:, np.newaxis]
+
+def move_arrays(pos, vel, front, left, force, mass, maxspeed, maxforce, delta_t=1.0):
+    """Update point-mass state arrays in place, as BasePointMass2d.move().
+
+    Parameters
+    ----------
+    pos, vel, front, left: array of shape (N,2)
+        Body state; all are modified in place.
+    force: array of shape (N,2)
+        Force to apply to each body; truncated in place to maxforce.
+    mass, maxspeed, maxforce: array of shape (N,), or float
+        Physics parameters of each body (or a single value for all).
+    delta_t: float
+        Time increment for this update.
+    """
+    # Update position using current velocity
+    pos += vel*delta_t
+
+    # Don't exceed our maximum force; compute acceleration
+    truncate_rows(force, maxforce)
+    vel += force*np.reshape(delta_t/np.asarray(mass, dtype=float), (-1, 1))
+
+    # Don't exceed maximum speed
+    truncate_rows(vel, maxspeed)
+    align_heading(vel, front, left)
+
+def align_heading(vel, front, left):
+    """Align front/left (in place) with vel, unless speed is very small."""
+    sq = np.einsum('nk,nk->n', vel, vel)
+    align = sq > SPEED_EPSILON
+    front[align] = vel[align]*(1.0/np.sqrt(sq[align]))[:, np.newaxis]
+    left[align, 0] = -front[align, 1]
+    left[align, 1] = front[align, 0]
+
+def move_store(store, delta_t=1.0, forces=None):
+    """Move every body in a VehicleStore with a single vectorized update.
+
+    Parameters
+    ----------
+    store: vehicle_store.VehicleStore
+        Bodies to be updated.
+    delta_t: float
+        Time increment for this update.
+    forces: array of shape (N,2), optional
+        Force to apply to each body. If None (the default), use the forces
+        accumulated in the store, and then zero them; see Notes.
+
+    Notes
+    -----
+    As with BasePointMass2d.move(), given forces are applied as-is and the
+    accumulated forces are left unchanged.
+
+    This applies point-mass physics to every stored body, so stored static
+    obstacles (zero velocity, no forces) stay put, but rigid bodies should
+    not be placed in a store that is updated this way.
+    """
+    n = store.count
+    if forces is None:
+        accumulated = store.accumulated_force[:n]
+        forces = accumulated.copy()
+        accumulated[:] = 0.0
+    else:
+        forces = np.array(forces, dtype=float)
+    move_arrays(store.pos[:n], store.vel[:n], store.front[:n], store.left[:n],
+                forces, store.mass[:n], store.maxspeed[:n], store.maxforce[:n], delta_t)
+
+def group_by_profile(bodies):
+    """Group bodies by physics profile.
+
+    Returns
+    -------
+    dict:
+        Maps each vehicle2d.PhysicsProfile to a list of bodies using it.
+    """
+    groups = dict()
+    for body in bodies:
+        groups.setdefault(body.profile, []).append(body)
+    return groups
+
+def move_grouped(bodies, delta_t=1.0, groups=None):
+    """Move a list of bodies using accumulated forces, one batch per profile.
+
+    Parameters
+    ----------
+    bodies: list of BasePointMass2d
+        Bodies to be updated; the accumulated force of each is zeroed.
+    delta_t: float
+        Time increment for this update.
+    groups: dict, optional
+        Result of group_by_profile(bodies); pass this to avoid regrouping
+        each update when the set of bodies doesn't change.
+
+    Notes
+    -----
+    Mass, maxspeed and maxforce are taken from each body rather than from
+    its profile, since these are often changed for single bodies (as with
+    springmass.DampedMass2d nodes, or a faster sheepdog).
+
+    This applies BasePointMass2d.move() physics only; any extra forces from
+    an overridden move() (such as damping) must be accumulated beforehand.
+    """
+    if groups is None:
+        groups = group_by_profile(bodies)
+    for profile, group in groups.items():
+        pos = np.array([b.pos.ntuple() for b in group], dtype=float).reshape(-1, 2)
+        vel = np.array([b.vel.ntuple() for b in group], dtype=float).reshape(-1, 2)
+        front = np.array([b.front.ntuple() for b in group], dtype=float).reshape(-1, 2)
+        force = np.array([b.accumulated_force.ntuple() for b in group], dtype=float).reshape(-1, 2)
+        left = np.array([b.left.ntuple() for b in group], dtype=float).reshape(-1, 2)
+        mass = np.array([b.mass for b in group], dtype=float)
+        maxspeed = np.array([b.maxspeed for b in group], dtype=float)
+        maxforce = np.array([b.maxforce for b in group], dtype=float)
+        move_arrays(pos, vel, front, left, force, mass, maxspeed, maxforce, delta_t)
+        for body, p, v, f, l in zip(group, pos.tolist(), vel.tolist(), front.tolist(), left.tolist()):
+            body.pos = Point2d(*p)
+            body.vel = Point2d(*v)
+            body.front = Point2d(*f)
+            body.left = Point2d(*l)
+            body.accumulated_force = Point2d(0,0)
+    return groups
+
+def steering_forces(vehicles):
+    """Compute the steering force of each vehicle, as an (N,2) array.
+
+    Use this with move_store(store, delta_t, forces) to replace a loop over
+    SimpleVehicle2d.move() calls; vehicles must be in store order.
+    """
+    return np.array([veh.steering.compute_force().ntuple() for veh in vehicles],
+                    dtype=float).reshape(-1, 2)
+
+def _clamp(values, limit):
+    """Clamp values (in place) to [-limit, limit]."""
+    np.clip(values, -limit, limit, out=values)
+
+class RigidBodyBatch(object):
+    """Array-based state of many SimpleRigidBody2d objects.
+
+    Parameters
+    ----------
+    bodies: list of SimpleRigidBody2d
+        Bodies whose state is copied into the arrays below.
+
+    Notes
+    -----
+    Linear state is stored as (N,2) arrays pos and vel, and heading as the
+    array angle (radians, anticlockwise from the x-axis); front and left are
+    computed from this with one cos/sin call for all bodies. Angular state
+    and physics parameters (omega, inertia, maxomega, maxtorque, mass,
+    maxspeed, maxforce) are (N,) arrays.
+
+    Use step() in place of calling move() and rotate() for each body, and
+    write_back() to copy results back to the bodies (e.g. before rendering).
+    """
+
+    def __init__(self, bodies):
+        self.bodies = list(bodies)
+        get = lambda attr: np.array([getattr(b, attr) for b in self.bodies], dtype=float)
+        self.pos = np.array([b.pos.ntuple() for b in self.bodies], dtype=float).reshape(-1, 2)
+        self.vel = np.array([b.vel.ntuple() for b in self.bodies], dtype=float).reshape(-1, 2)
+        front = np.array([b.front.ntuple() for b in self.bodies], dtype=float).reshape(-1, 2)
+        self.angle = np.arctan2(front[:, 1], front[:, 0])
+        self.omega = get('omega')
+        self.inertia = get('inertia')
+        self.maxomega = get('maxomega')
+        self.maxtorque = get('maxtorque')
+        self.mass = get('mass')
+        self.maxspeed = get('maxspeed')
+        self.maxforce = get('maxforce')
+
+    def __len__(self):
+        return len(self.bodies)
+
+    def front(self):
+        """Get the (N,2) array of front vectors."""
+        return np.column_stack((np.cos(self.angle), np.sin(self.angle)))
+
+    def left(self):
+        """Get the (N,2) array of left vectors."""
+        return np.column_stack((-np.sin(self.angle), np.cos(self.angle)))
+
+    def step(self, delta_t=1.0, forces=None, torques=None):
+        """Update linear and angular motion of all bodies.
+
+        Parameters
+        ----------
+        delta_t: float
+            Time increment for this update.
+        forces: array of shape (N,2), optional
+            Force on each body; truncated in place to maxforce.
+        torques: array of shape (N,), optional
+            Torque on each body; clamped in place to maxtorque.
+
+        Notes
+        -----
+        This matches SimpleRigidBody2d.move() followed by rotate(). As with
+        rotate(), heading changes by omega (not omega*delta_t) each update.
+        """
+        # Linear motion: as SimpleRigidBody2d.move()
+        self.pos += self.vel*delta_t
+        if forces is not None:
+            truncate_rows(forces, self.maxforce)
+            self.vel += forces*(delta_t/self.mass)[:, np.newaxis]
+        truncate_rows(self.vel, self.maxspeed)
+
+        # Angular motion: as SimpleRigidBody2d.rotate()
+        self.angle += self.omega
+        if torques is not None:
+            _clamp(torques, self.maxtorque)
+            self.omega += torques*delta_t/self.inertia
+        _clamp(self.omega, self.maxomega)
+
+    def write_back(self):
+        """Copy array state back to each body."""
+        front = self.front()
+        for body, p, v, f, omega in zip(self.bodies, self.pos.tolist(), self.vel.tolist(),
+                                        front.tolist(), self.omega.tolist()):
+            body.pos = Point2d(*p)
+            body.vel = Point2d(*v)
+            body.front = Point2d(*f)
+            body.left = Point2d(-f[1], f[0])
+            body.omega = omega
+
+#: Constants used by tank_demo.NewTank2d.update(); see tread_controls().
+TANK_TRACTIVE_TORQUE = 0.2
+TANK_DAMPING_TORQUE = 0.6
+TANK_DRAG = 0.5
+
+def tread_controls(batch, radius, tread_l, tread_r):
+    """Forces and torques on tanks, as in tank_demo.NewTank2d.update().
+
+    Parameters
+    ----------
+    batch: RigidBodyBatch
+        Current state of the tanks.
+    radius: array of shape (N,) or float
+        Tank radii.
+    tread_l, tread_r: array of shape (N,) or float
+        Left and right tread inputs.
+
+    Returns
+    -------
+    (forces, torques): tuple of numpy.ndarray
+        Arrays of shape (N,2) and (N,), for use with batch.step().
+    """
+    # Note: NewTank2d swaps the left/right tread inputs; we do the same
+    vr = np.asarray(tread_l, dtype=float)
+    vl = np.asarray(tread_r, dtype=float)
+    torques = TANK_TRACTIVE_TORQUE*(vl - vr)/radius - TANK_DAMPING_TORQUE*batch.omega
+    forces = batch.front()*np.reshape(vr + vl, (-1, 1)) - TANK_DRAG*batch.vel
+    return forces, np.broadcast_to(torques, batch.omega.shape).copy()
+
+def _benchmark(sizes=(1000, 10000, 100000), steps=5, delta_t=0.2):
+    """Compare move_store() against looping BasePointMass2d.move()."""
+    from timeit import default_timer as timer
+    from random import Random
+    from point2d import Point2d
+    from vehicle2d import BasePointMass2d
+    from vehicle_store import VehicleStore, stored_class
+
+    StoredPointMass2d = stored_class(BasePointMass2d)
+    rand = Random(0)
+    print('%10s %14s %14s %10s' % ('BODIES', 'LOOP(ms/step)', 'BATCH(ms/step)', 'SPEEDUP'))
+    for n in sizes:
+        data = [(Point2d(rand.uniform(0, 1000), rand.uniform(0, 1000)),
+                 Point2d(rand.uniform(-5, 5), rand.uniform(-5, 5)),
+                 Point2d(rand.uniform(-5, 5), rand.uniform(-5, 5))) for i in range(n)]
+
+        # Looping move() over ordinary objects
+        bodies = [BasePointMass2d(pos, 5, vel) for (pos, vel, force) in data]
+        start = timer()
+        for step in range(steps):
+            for (body, (pos, vel, force)) in zip(bodies, data):
+                body.accumulate_force(force)
+                body.move(delta_t)
+        t_loop = (timer() - start)/steps
+
+        # Single vectorized update over a VehicleStore
+        store = VehicleStore(n)
+        for (pos, vel, force) in data:
+            StoredPointMass2d(store, pos, 5, vel)
+        forces = np.array([force.ntuple() for (pos, vel, force) in data])
+        start = timer()
+        for step in range(steps):
+            store.accumulated_force[:n] += forces
+            move_store(store, delta_t)
+        t_batch = (timer() - start)/steps
+
+        # Sanity check: both methods should give the same results
+        err = abs(np.array([b.pos.ntuple() for b in bodies]) - store.pos[:n]).max()
+        print('%10d %14.3f %14.3f %9.1fx   (max diff %.2g)' % (n, 1000*t_loop, 1000*t_batch, t_loop/t_batch, err))
+
+if __name__ == "__main__":
+    print("Vectorized physics integrators. Benchmarking move_store()...")
+    _benchmark()
@@ -0,0 +1,354 @@
+# intercept.py
+"""Batch interception solver for PURSUE/EVADE and target selection.
+
+Given arrays of pursuers and targets, the functions here compute times to
+intercept and lead points for every (pursuer, target) pair at once, using
+NumPy instead of one Python-level force_pursue() call per pair.
+
+Two estimates of the time to intercept are available:
+
+* The default is the same estimate used by steering.force_pursue() and
+  steering.force_evade(): distance divided by the sum of the pursuer's max
+  speed and the target's current speed. This is always finite.
+* With exact=True, we solve for the earliest time at which a pursuer moving
+  at max speed can meet a target moving at constant velocity. This is INF if
+  the target can never be caught.
+
+Positions and velocities are (N,2) arrays; use vehicle_arrays() to get these
+from a list of BasePointMass2d (or anything with pos, vel, front, maxspeed).
+
+Steering
+--------
+An InterceptSolver can also supply PURSUE and EVADE forces to the usual
+steering loop. Give it as the second item of the target, and call update()
+once per tick (for example with World.add_update); force_pursue() and
+force_evade() then return the forces computed for all pursuers at once by
+the last update(), instead of solving one pair at a time::
+
+    solver = InterceptSolver(sheep, [dog])
+    for veh in sheep:
+        veh.steering.set_target(EVADE=(dog, solver))
+    world.add_update(solver.update)
+
+These forces are the same as those from force_pursue() and force_evade()
+(with exact=False), but use the positions at the time of update().
+"""
+
+# for python3 compat
+from __future__ import unicode_literals
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import numpy as np
+
+import steering
+from point2d import Point2d
+
+INF = float('inf')
+
+#: PURSUE will SEEK directly to prey moving towards the pursuer within this
+#: angle; the value is cos(10 degrees), as in steering.force_pursue().
+PURSUE_HEADON_COS = 0.966
+
+def vehicle_arrays(vehicles):
+    """Pack vehicle state into arrays.
+
+    Parameters
+    ----------
+    vehicles: list of BasePointMass2d
+        Vehicles to pack.
+
+    Returns
+    -------
+    (pos, vel, front, maxspeed): tuple of numpy.ndarray
+        Arrays of shape (N,2), (N,2), (N,2) and (N,) respectively.
+    """
+    pos = np.array([veh.pos.ntuple() for veh in vehicles], dtype=float).reshape(-1, 2)
+    vel = np.array([veh.vel.ntuple() for veh in vehicles], dtype=float).reshape(-1, 2)
+    front = np.array([veh.front.ntuple() for veh in vehicles], dtype=float).reshape(-1, 2)
+    maxspeed = np.array([veh.maxspeed for veh in vehicles], dtype=float)
+    return pos, vel, front, maxspeed
+
+def intercept_times(p_pos, p_speed, t_pos, t_vel, exact=False):
+    """Times to intercept for every (pursuer, target) pair.
+
+    Parameters
+    ----------
+    p_pos: array of shape (P,2)
+        Pursuer positions.
+    p_speed: array of shape (P,)
+        Pursuer (maximum) speeds.
+    t_pos: array of shape (Q,2)
+        Target positions.
+    t_vel: array of shape (Q,2)
+        Target velocities.
+    exact: boolean
+        If True, solve for the true interception time; see module notes.
+
+    Returns
+    -------
+    numpy.ndarray:
+        Array of shape (P,Q); entry [i,j] is the time for pursuer i to
+        intercept target j.
+    """
+    offset = t_pos[np.newaxis, :, :] - p_pos[:, np.newaxis, :]
+    dsq = np.einsum('pqk,pqk->pq', offset, offset)
+    speed = np.asarray(p_speed, dtype=float)[:, np.newaxis]
+
+    if not exact:
+        denom = speed + np.sqrt(np.einsum('qk,qk->q', t_vel, t_vel))[np.newaxis, :]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            times = np.sqrt(dsq)/denom
+        return np.where(dsq > 0, times, 0.0)
+
+    # Solve |offset + t_vel*t| = speed*t for the smallest t >= 0:
+    # (v.v - s^2) t^2 + 2 (offset.v) t + offset.offset = 0
+    a = np.einsum('qk,qk->q', t_vel, t_vel)[np.newaxis, :] - speed*speed
+    b = 2*np.einsum('pqk,qk->pq', offset, t_vel)
+    c = dsq
+    times = np.full(dsq.shape, INF)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Linear case (pursuer speed equals target speed)
+        lin = np.isclose(a, 0.0)
+        t_lin = np.where(b < 0, -c/b, INF)
+        times = np.where(lin, t_lin, times)
+        # Quadratic case; take the smallest non-negative root
+        disc = b*b - 4*a*c
+        root = np.sqrt(np.where(disc >= 0, disc, np.nan))
+        t1 = (-b - root)/(2*a)
+        t2 = (-b + root)/(2*a)
+        t1 = np.where(t1 >= 0, t1, INF)
+        t2 = np.where(t2 >= 0, t2, INF)
+        t_quad = np.fmin(t1, t2)
+        times = np.where(~lin & (disc >= 0), t_quad, times)
+    return np.where(dsq > 0, times, 0.0)
+
+def lead_points(t_pos, t_vel, times):
+    """Predicted target positions for each (pursuer, target) pair.
+
+    Parameters
+    ----------
+    t_pos: array of shape (Q,2)
+        Target positions.
+    t_vel: array of shape (Q,2)
+        Target velocities.
+    times: array of shape (P,Q)
+        Prediction times, as from intercept_times(). Infinite times give the
+        target's current position instead.
+
+    Returns
+    -------
+    numpy.ndarray:
+        Array of shape (P,Q,2) of lead points.
+    """
+    finite = np.where(np.isfinite(times), times, 0.0)
+    return t_pos[np.newaxis, :, :] + finite[:, :, np.newaxis]*t_vel[np.newaxis, :, :]
+
+def _seek_forces(pos, vel, maxspeed, target):
+    """Vectorized steering.force_seek() for matched rows."""
+    offset = target - pos
+    dist = np.sqrt(np.einsum('nk,nk->n', offset, offset))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        desired = offset*(maxspeed/dist)[:, np.newaxis]
+    return np.nan_to_num(desired) - vel
+
+def _pursue_rows(p_pos, p_vel, p_speed, t_pos, t_vel, t_front):
+    """Vectorized steering.force_pursue() for matched rows of arrays."""
+    offset = t_pos - p_pos
+    dist = np.sqrt(np.einsum('nk,nk->n', offset, offset))
+    t_speed = np.sqrt(np.einsum('nk,nk->n', t_vel, t_vel))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ptime = np.nan_to_num(dist/(p_speed + t_speed))
+    target = t_pos + ptime[:, np.newaxis]*t_vel
+
+    # If prey is in front and moving our way, SEEK to prey's position
+    headon = np.einsum('nk,nk->n', offset, t_front) < -PURSUE_HEADON_COS*dist
+    target[headon] = t_pos[headon]
+    return _seek_forces(p_pos, p_vel, p_speed, target)
+
+def _evade_rows(e_pos, e_vel, e_speed, t_pos, t_vel, t_front):
+    """Vectorized steering.force_evade() for matched rows of arrays."""
+    offset = t_pos - e_pos
+    dist = np.sqrt(np.einsum('nk,nk->n', offset, offset))
+    t_speed = np.sqrt(np.einsum('nk,nk->n', t_vel, t_vel))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ptime = np.nan_to_num(dist/(e_speed + t_speed))
+    target = t_pos + ptime[:, np.newaxis]*t_vel
+
+    # FLEE from the predicted position, but only within the panic distance
+    away = e_pos - target
+    dsq = np.einsum('nk,nk->n', away, away)
+    panic = (1 < dsq) & (dsq < steering.EVADE_PANIC_SQ)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        desired = away*(e_speed/np.sqrt(dsq))[:, np.newaxis]
+    forces = np.nan_to_num(desired) - e_vel
+    forces[~panic] = 0.0
+    return forces
+
+#: Batch force functions used by InterceptSolver, by behaviour.
+_ROWS_FNC = {'PURSUE': _pursue_rows, 'EVADE': _evade_rows}
+
+def pursue_forces(pursuers, preys):
+    """PURSUE steering forces for matched lists of pursuers and prey.
+
+    Parameters
+    ----------
+    pursuers: list of SimpleVehicle2d
+        Vehicles doing the pursuing.
+    preys: list of BasePointMass2d
+        preys[i] is the vehicle pursued by pursuers[i].
+
+    Returns
+    -------
+    numpy.ndarray:
+        Array of shape (N,2); row i is the same force that
+        steering.force_pursue(pursuers[i], preys[i]) would give.
+    """
+    p_pos, p_vel, _, p_speed = vehicle_arrays(pursuers)
+    t_pos, t_vel, t_front, _ = vehicle_arrays(preys)
+    return _pursue_rows(p_pos, p_vel, p_speed, t_pos, t_vel, t_front)
+
+def evade_forces(evaders, predators):
+    """EVADE steering forces for matched lists of evaders and predators.
+
+    Parameters
+    ----------
+    evaders: list of SimpleVehicle2d
+        Vehicles doing the evading.
+    predators: list of BasePointMass2d
+        predators[i] is the vehicle evaded by evaders[i].
+
+    Returns
+    -------
+    numpy.ndarray:
+        Array of shape (N,2); row i is the same force that
+        steering.force_evade(evaders[i], predators[i]) would give.
+    """
+    e_pos, e_vel, _, e_speed = vehicle_arrays(evaders)
+    t_pos, t_vel, t_front, _ = vehicle_arrays(predators)
+    return _evade_rows(e_pos, e_vel, e_speed, t_pos, t_vel, t_front)
+
+def best_targets(pursuers, targets, max_range_sq=INF, exact=False):
+    """Choose the quickest target to intercept for each pursuer.
+
+    Parameters
+    ----------
+    pursuers: list of BasePointMass2d
+        Vehicles choosing a target.
+    targets: list of BasePointMass2d
+        Candidate targets (shared by all pursuers).
+    max_range_sq: float
+        Targets with squared distance at least this large are ignored.
+    exact: boolean
+        Passed to intercept_times(); see module notes.
+
+    Returns
+    -------
+    list of (BasePointMass2d, float):
+        For each pursuer, the chosen target and its time to intercept; the
+        target is None (and time INF) if no target is eligible.
+    """
+    if len(pursuers) == 0:
+        return []
+    if len(targets) == 0:
+        return len(pursuers)*[(None, INF)]
+    p_pos, _, _, p_speed = vehicle_arrays(pursuers)
+    t_pos, t_vel, _, _ = vehicle_arrays(targets)
+    times = intercept_times(p_pos, p_speed, t_pos, t_vel, exact)
+
+    offset = t_pos[np.newaxis, :, :] - p_pos[:, np.newaxis, :]
+    dsq = np.einsum('pqk,pqk->pq', offset, offset)
+    times = np.where(dsq < max_range_sq, times, INF)
+
+    best = np.argmin(times, axis=1)
+    results = []
+    for i, j in enumerate(best):
+        time = times[i, j]
+        if np.isfinite(time):
+            results.append((targets[j], float(time)))
+        else:
+            results.append((None, INF))
+    return results
+
+class InterceptSolver(object):
+    """Per-tick cache of lead points for all (pursuer, target) pairs.
+
+    Parameters
+    ----------
+    pursuers: list of BasePointMass2d
+        Vehicles doing the pursuing (or evading).
+    targets: list of BasePointMass2d
+        Vehicles being pursued (or evaded).
+    exact: boolean
+        Passed to intercept_times(); see module notes.
+
+    Notes
+    -----
+    Call update() once per tick, after vehicles have moved; lead() and
+    time() then look up cached results without further computation.
+
+    Pursuers whose PURSUE or EVADE target is (target, solver) also get their
+    steering forces from update(); see the module notes.
+    """
+
+    def __init__(self, pursuers, targets, exact=False):
+        self.pursuers = list(pursuers)
+        self.targets = list(targets)
+        self.exact = exact
+        self.p_index = {id(veh): i for i, veh in enumerate(self.pursuers)}
+        self.t_index = {id(veh): j for j, veh in enumerate(self.targets)}
+        self.update()
+
+    def update(self):
+        """Recompute times, lead points and steering forces in one call."""
+        p_pos, p_vel, _, p_speed = vehicle_arrays(self.pursuers)
+        t_pos, t_vel, t_front, _ = vehicle_arrays(self.targets)
+        self.times = intercept_times(p_pos, p_speed, t_pos, t_vel, self.exact)
+        self.leads = lead_points(t_pos, t_vel, self.times)
+
+        # Forces for pursuers whose PURSUE/EVADE targets use this solver,
+        # as {id(pursuer): (target, force)} for each behaviour
+        self.forces = dict()
+        for behaviour, rows_fnc in _ROWS_FNC.items():
+            owners, rows, cols = [], [], []
+            for i, veh in enumerate(self.pursuers):
+                steer = getattr(veh, 'steering', None)
+                target = steer.targets.get(behaviour) if steer is not None else None
+                if target is not None and len(target) > 1 and target[1] is self:
+                    j = self.t_index.get(id(target[0]))
+                    if j is not None:
+                        owners.append(veh)
+                        rows.append(i)
+                        cols.append(j)
+            forces = rows_fnc(p_pos[rows], p_vel[rows], p_speed[rows],
+                              t_pos[cols], t_vel[cols], t_front[cols])
+            self.forces[behaviour] = {id(veh): (self.targets[j], Point2d(x, y))
+                                      for veh, j, (x, y) in zip(owners, cols, forces.tolist())}
+
+    def force(self, behaviour, owner, target):
+        """Steering force for PURSUE or EVADE, as computed by update().
+
+        Used by steering.force_pursue() and force_evade(). If owner was not
+        given this solver and target at the last update(), the force is
+        computed directly instead.
+        """
+        try:
+            cached_target, force = self.forces[behaviour][id(owner)]
+        except KeyError:
+            cached_target = None
+        if cached_target is not target:
+            return steering.FORCE_FNC[behaviour](owner, target)
+        return force
+
+    def time(self, pursuer, target):
+        """Cached time for pursuer to intercept target."""
+        return float(self.times[self.p_index[id(pursuer)], self.t_index[id(target)]])
+
+    def lead(self, pursuer, target):
+        """Cached lead point (as a Point2d) for pursuer chasing target."""
+        i, j = self.p_index[id(pursuer)], self.t_index[id(target)]
+        return Point2d(*self.leads[i, j])
+
+if __name__ == "__main__":
+    print("Batch interception solver. Import this elsewhere.")
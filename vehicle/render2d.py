@@ -0,0 +1,165 @@
+# render2d.py
+"""Dirty-rectangle pygame renderer for vehicle demos.
+
+Instead of filling the whole screen, drawing every sprite and flipping the
+full display each frame, DirtyRenderer:
+
+* Pre-blits static sprites (obstacles, walls) onto a cached background.
+* Each frame, erases moving sprites using the cached background, redraws
+  them, and updates only the changed screen regions.
+
+Frame times are collected in a FrameStats object, so the dirty and full
+redraw paths can be compared (pass dirty=False for the latter).
+
+Usage::
+
+    renderer = DirtyRenderer(screen, bgcolor, static=[wall.sprite for wall in walls])
+    renderer.add(*[veh.sprite for veh in vehicles])
+    # ...in the main loop, once per frame:
+    renderer.update()   # Calls update() for each moving sprite
+    renderer.render()
+    # ...or with a World, to draw at interpolated positions:
+    renderer.render(world.interpolated(alpha))
+"""
+
+# for python3 compat
+from __future__ import unicode_literals
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import pygame
+from timeit import default_timer
+
+class FrameStats(object):
+    """Running statistics of frame render times and updated screen area."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Discard all statistics."""
+        self.frames = 0
+        self.total = 0.0
+        self.worst = 0.0
+        self.last = 0.0
+        self.area = 0
+
+    def record(self, elapsed, area):
+        """Record one frame, given its render time and updated pixel area."""
+        self.frames += 1
+        self.total += elapsed
+        self.last = elapsed
+        self.worst = max(self.worst, elapsed)
+        self.area += area
+
+    def mean(self):
+        """Mean render time per frame, in seconds."""
+        if self.frames == 0:
+            return 0.0
+        return self.total/self.frames
+
+    def report(self, screen_area=None):
+        """Get a one-line summary of these statistics.
+
+        Parameters
+        ----------
+        screen_area: int, optional
+            Total screen area in pixels; if given, also report the mean
+            fraction of the screen updated per frame.
+        """
+        line = '%d frames, mean %.3f ms, worst %.3f ms' % (self.frames, 1000*self.mean(), 1000*self.worst)
+        if screen_area and self.frames:
+            line += ', %.1f%% of screen updated' % (100.0*self.area/(screen_area*self.frames))
+        return line
+
+class DirtyRenderer(object):
+    """Renders moving sprites over a cached background of static sprites.
+
+    Parameters
+    ----------
+    screen: pygame.Surface
+        The display surface.
+    bgcolor: pygame.Color or 3-tuple
+        Background fill color.
+    static: list of pygame.sprite.Sprite, optional
+        Sprites that never move; these are drawn once onto the background.
+    dirty: boolean
+        If True (default), update only changed regions of the display.
+        Otherwise, redraw and flip the full screen each frame (this is what
+        the demos originally did; useful for comparing FrameStats).
+    """
+
+    def __init__(self, screen, bgcolor, static=(), dirty=True):
+        self.screen = screen
+        self.bgcolor = bgcolor
+        self.dirty = dirty
+        self.static = pygame.sprite.Group(static)
+        self.group = pygame.sprite.RenderUpdates()
+        self.stats = FrameStats()
+        self.redraw_background()
+
+    def redraw_background(self):
+        """Rebuild the cached background and redraw the whole display."""
+        # Screen area is cached, so that report() works after pygame.quit()
+        self.screen_area = self.screen.get_width()*self.screen.get_height()
+        background = pygame.Surface(self.screen.get_size()).convert()
+        background.fill(self.bgcolor)
+        self.static.draw(background)
+        self.background = background
+        self.screen.blit(background, (0,0))
+        pygame.display.flip()
+
+    def add(self, *sprites):
+        """Add moving sprites, redrawn each frame."""
+        self.group.add(*sprites)
+
+    def add_static(self, *sprites):
+        """Add static sprites; this rebuilds the background."""
+        self.static.add(*sprites)
+        self.redraw_background()
+
+    def remove(self, *sprites):
+        """Remove sprites (moving or static)."""
+        if self.static.has(*sprites):
+            self.static.remove(*sprites)
+            self.redraw_background()
+        self.group.remove(*sprites)
+
+    def update(self, *args):
+        """Call update() for all moving sprites."""
+        self.group.update(*args)
+
+    def render(self, interpolated=None):
+        """Draw one frame.
+
+        Parameters
+        ----------
+        interpolated: list of (body, Point2d), optional
+            If given (for example, from World.interpolated()), each body's
+            sprite is drawn centered at the given position.
+        """
+        start = default_timer()
+        if interpolated is not None:
+            for body, pos in interpolated:
+                body.sprite.rect.center = pos[0], pos[1]
+
+        screen = self.screen
+        if self.dirty:
+            self.group.clear(screen, self.background)
+            rects = self.group.draw(screen)
+            pygame.display.update(rects)
+            area = sum(rect.width*rect.height for rect in rects)
+        else:
+            screen.blit(self.background, (0,0))
+            self.group.draw(screen)
+            pygame.display.flip()
+            area = self.screen_area
+        self.stats.record(default_timer() - start, area)
+
+    def report(self):
+        """Get a one-line summary of frame statistics."""
+        return self.stats.report(self.screen_area)
+
+if __name__ == "__main__":
+    print("Dirty-rectangle renderer for vehicle demos. Import this elsewhere.")
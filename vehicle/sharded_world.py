@@ -0,0 +1,467 @@
+# sharded_world.py
+"""Multi-process simulation of vehicles, with space split into shards.
+
+The world is divided along the x-axis into vertical strips (shards), each
+owned by one worker process. Each tick, every worker:
+
+1. Publishes its border vehicles (those within ghost_width of a shard edge)
+   to its own block of a shared-memory array.
+2. Reads its neighbors' blocks, and builds read-only GhostAgent copies of
+   the nearby vehicles from adjacent shards.
+3. Steps its own vehicles with their usual SteeringBehavior and move();
+   flocking vehicles flock with local vehicles and ghosts.
+4. Migrates any vehicles that left its strip to the shard that now owns
+   them; migration counts are exchanged through shared memory, and the
+   vehicles themselves are pickled through a per-worker queue.
+
+Workers synchronize with a barrier twice per tick, so all shards always
+agree on the current tick.
+
+Notes
+-----
+Vehicles are copied into the worker processes, so they must be picklable:
+create them without sprites. Behaviours may use static targets (points,
+obstacles, walls, paths), which are copied along with each vehicle, but
+not other vehicles (e.g. PURSUE or FOLLOW). For flocking behaviours, the
+flockmates given on activation are replaced by all vehicles in reach.
+
+Use gather() or state() to get results back; the original vehicle objects
+are not updated.
+
+Usage::
+
+    with ShardedWorld(width=2000, workers=4, delta_t=1.0) as world:
+        world.add(*vehicles)
+        world.start()
+        world.step(100)
+        pos, vel = world.state()
+"""
+
+# for python3 compat
+from __future__ import unicode_literals
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import multiprocessing, pickle, traceback
+from timeit import default_timer
+
+try:
+    from queue import Empty
+except ImportError:
+    from Queue import Empty
+
+import numpy as np
+
+import steering
+from point2d import Point2d
+
+#: Maximum number of border vehicles published by each shard per tick.
+GHOST_CAPACITY = 4096
+
+#: Values stored per ghost: pos (x,y), vel (x,y), front (x,y) and radius.
+GHOST_FIELDS = 7
+
+#: Seconds between checks that all workers are still alive.
+POLL_INTERVAL = 1.0
+
+def shard_context():
+    """Multiprocessing context for workers; fork if available."""
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork')
+    return multiprocessing.get_context()
+
+class GhostAgent(object):
+    """Read-only copy of a vehicle owned by a neighboring shard.
+
+    This has just enough of the BasePointMass2d interface for flocking.
+    """
+    __slots__ = ('pos', 'vel', 'front', 'radius')
+
+    def __init__(self, pos, vel, front, radius):
+        self.pos = pos
+        self.vel = vel
+        self.front = front
+        self.radius = radius
+
+def _detach(agent):
+    """Drop references to other vehicles before pickling agent."""
+    agent.steering.flockmates = []
+    if hasattr(agent, 'neighbor_list'):
+        agent.neighbor_list = []
+
+class _Shard(object):
+    """Vehicles and per-tick logic of a single worker; see ShardedWorld."""
+
+    def __init__(self, index, edges, agents, ghost_buf, count_buf, migrate_buf,
+                 inboxes, barrier, ghost_width, delta_t):
+        self.index = index
+        self.n_shards = len(edges) - 1
+        self.inner_edges = np.array(edges[1:-1], dtype=float)
+        self.lo = edges[index]
+        self.hi = edges[index + 1]
+        self.agents = list(agents)
+        self.ghosts = []
+        self.ghost_out = np.frombuffer(ghost_buf).reshape(self.n_shards, -1, GHOST_FIELDS)
+        self.ghost_count = np.frombuffer(count_buf, dtype=np.intc)
+        self.migrate_count = np.frombuffer(migrate_buf, dtype=np.intc).reshape(self.n_shards, self.n_shards)
+        self.inboxes = inboxes
+        self.barrier = barrier
+        self.ghost_width = ghost_width
+        self.delta_t = delta_t
+        # Statistics
+        self.ticks = 0
+        self.migrated = 0
+        self.overflow = 0
+        self.busy = 0.0
+        self.wait = 0.0
+
+    def owner(self, x):
+        """Index of the shard owning the given x-coordinate."""
+        return int(np.searchsorted(self.inner_edges, x, side='right'))
+
+    def publish(self):
+        """Write our border vehicles to our block of the ghost array."""
+        index = self.index
+        left = self.lo + self.ghost_width if index > 0 else -np.inf
+        right = self.hi - self.ghost_width if index < self.n_shards - 1 else np.inf
+        border = [a for a in self.agents if a.pos[0] < left or a.pos[0] >= right]
+        capacity = self.ghost_out.shape[1]
+        if len(border) > capacity:
+            self.overflow += len(border) - capacity
+            border = border[:capacity]
+        if border:
+            self.ghost_out[index, :len(border)] = [(a.pos[0], a.pos[1], a.vel[0], a.vel[1],
+                                                    a.front[0], a.front[1], a.radius)
+                                                   for a in border]
+        self.ghost_count[index] = len(border)
+
+    def read_ghosts(self):
+        """Build GhostAgents from our neighbors' border vehicles."""
+        ghosts = []
+        for other, near in ((self.index - 1, self.lo - self.ghost_width),
+                            (self.index + 1, self.hi + self.ghost_width)):
+            if not 0 <= other < self.n_shards:
+                continue
+            rows = self.ghost_out[other, :self.ghost_count[other]]
+            if other < self.index:
+                rows = rows[rows[:, 0] >= near]
+            else:
+                rows = rows[rows[:, 0] < near]
+            for (px, py, vx, vy, fx, fy, radius) in rows.tolist():
+                ghosts.append(GhostAgent(Point2d(px, py), Point2d(vx, vy), Point2d(fx, fy), radius))
+        self.ghosts = ghosts
+
+    def migrate(self):
+        """Send vehicles that left our strip to their new owners."""
+        row = self.migrate_count[self.index]
+        row[:] = 0
+        staying = []
+        for agent in self.agents:
+            dest = self.owner(agent.pos[0])
+            if dest == self.index:
+                staying.append(agent)
+            else:
+                _detach(agent)
+                self.inboxes[dest].put(pickle.dumps(agent, pickle.HIGHEST_PROTOCOL))
+                row[dest] += 1
+                self.migrated += 1
+        self.agents = staying
+
+    def receive(self):
+        """Add vehicles migrated to us this tick."""
+        incoming = int(self.migrate_count[:, self.index].sum())
+        inbox = self.inboxes[self.index]
+        for i in range(incoming):
+            self.agents.append(pickle.loads(inbox.get()))
+
+    def sync(self):
+        start = default_timer()
+        self.barrier.wait()
+        self.wait += default_timer() - start
+
+    def tick(self):
+        """Run one synchronized tick; see ShardedWorld for details."""
+        start = default_timer()
+        self.publish()
+        self.busy += default_timer() - start
+        self.sync()
+
+        start = default_timer()
+        self.read_ghosts()
+        neighbors = self.agents + self.ghosts
+        for agent in self.agents:
+            if agent.steering.flocking is True:
+                agent.steering.flockmates = neighbors
+        delta_t = self.delta_t
+        for agent in self.agents:
+            agent.move(delta_t)
+        self.migrate()
+        self.busy += default_timer() - start
+        self.sync()
+
+        start = default_timer()
+        self.receive()
+        self.busy += default_timer() - start
+        self.ticks += 1
+
+    def stats(self):
+        return {'shard': self.index,
+                'agents': len(self.agents),
+                'ghosts': len(self.ghosts),
+                'migrated': self.migrated,
+                'overflow': self.overflow,
+                'busy': self.busy,
+                'wait': self.wait}
+
+def _shard_worker(index, commands, results, seed, shard_args):
+    """Worker process main loop."""
+    try:
+        if seed is None:
+            steering.rand_gen.seed()
+        else:
+            steering.rand_gen.seed(seed + index)
+        shard = _Shard(index, *shard_args)
+        while True:
+            command, arg = commands.get()
+            if command == 'step':
+                for i in range(arg):
+                    shard.tick()
+                results.put(('step', index, shard.stats()))
+            elif command == 'gather':
+                for agent in shard.agents:
+                    _detach(agent)
+                results.put(('gather', index, pickle.dumps(shard.agents, pickle.HIGHEST_PROTOCOL)))
+            elif command == 'state':
+                ids = [agent.shard_id for agent in shard.agents]
+                pos = [agent.pos.ntuple() for agent in shard.agents]
+                vel = [agent.vel.ntuple() for agent in shard.agents]
+                results.put(('state', index, (ids, pos, vel)))
+            else:
+                break
+    except Exception:
+        shard_args[6].abort()  # The barrier; release the other workers
+        results.put(('error', index, traceback.format_exc()))
+
+class ShardedWorld(object):
+    """Vehicle simulation split across worker processes by x-coordinate.
+
+    Parameters
+    ----------
+    width: positive float
+        Width of the world; the range [x_min, x_min + width) is split into
+        equal strips, one per worker. Vehicles outside this range belong to
+        the first or last shard.
+    workers: positive int, optional
+        Number of worker processes; defaults to the number of CPUs.
+    delta_t: float
+        Simulation time per tick; this is passed to move().
+    ghost_width: positive float, optional
+        Vehicles this close to a shard edge are shared with the neighboring
+        shard. Defaults to the flocking range of the largest vehicle.
+    ghost_capacity: positive int
+        Maximum number of border vehicles each shard can share per tick;
+        any beyond this are counted in the 'overflow' statistic.
+    x_min: float
+        Left edge of the world.
+    seed: int, optional
+        If given, worker i seeds its random steering (e.g. WANDER) with
+        seed + i, for repeatable runs.
+    """
+
+    def __init__(self, width, workers=None, delta_t=1.0, ghost_width=None,
+                 ghost_capacity=GHOST_CAPACITY, x_min=0.0, seed=None):
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+        if workers < 1:
+            raise ValueError('Need at least one worker, got %d' % workers)
+        self.workers = workers
+        self.edges = [x_min + width*i/workers for i in range(workers + 1)]
+        self.delta_t = delta_t
+        self.ghost_width = ghost_width
+        self.ghost_capacity = ghost_capacity
+        self.seed = seed
+        self.agents = []
+        self.processes = []
+        self.stats = []
+        self.ticks = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add(self, *agents):
+        """Add vehicles; this must be done before start()."""
+        if self.processes:
+            raise RuntimeError('Cannot add vehicles to a running ShardedWorld')
+        self.agents.extend(agents)
+
+    def start(self):
+        """Distribute vehicles to shards and start the worker processes."""
+        n = self.workers
+        if self.ghost_width is None:
+            max_radius = max([agent.radius for agent in self.agents] + [0.0])
+            self.ghost_width = max_radius*(steering.FLOCKING_RADIUS_MULTIPLIER + 1)
+
+        ctx = shard_context()
+        ghost_buf = ctx.RawArray('d', n*self.ghost_capacity*GHOST_FIELDS)
+        count_buf = ctx.RawArray('i', n)
+        migrate_buf = ctx.RawArray('i', n*n)
+        inboxes = [ctx.Queue() for i in range(n)]
+        self.barrier = ctx.Barrier(n)
+        self.results = ctx.Queue()
+        self.commands = [ctx.Queue() for i in range(n)]
+
+        inner_edges = np.array(self.edges[1:-1])
+        shares = [[] for i in range(n)]
+        for shard_id, agent in enumerate(self.agents):
+            agent.shard_id = shard_id
+            shares[int(np.searchsorted(inner_edges, agent.pos[0], side='right'))].append(agent)
+
+        for index in range(n):
+            for agent in shares[index]:
+                _detach(agent)
+            shard_args = (self.edges, shares[index], ghost_buf, count_buf, migrate_buf,
+                          inboxes, self.barrier, self.ghost_width, self.delta_t)
+            process = ctx.Process(target=_shard_worker,
+                                  args=(index, self.commands[index], self.results, self.seed, shard_args))
+            process.daemon = True
+            process.start()
+            self.processes.append(process)
+
+    def _collect(self, kind):
+        """Get one result of the given kind from each worker, by worker index."""
+        found = [None]*self.workers
+        remaining = self.workers
+        while remaining > 0:
+            try:
+                result_kind, index, value = self.results.get(timeout=POLL_INTERVAL)
+            except Empty:
+                if not all(process.is_alive() for process in self.processes):
+                    self.barrier.abort()
+                    self.close()
+                    raise RuntimeError('A ShardedWorld worker exited unexpectedly')
+                continue
+            if result_kind == 'error':
+                self._raise_error(index, value)
+            found[index] = value
+            remaining -= 1
+        return found
+
+    def _raise_error(self, index, message):
+        """Stop all workers and raise the original error from a worker.
+
+        When one worker fails, the others fail at the (aborted) barrier;
+        their errors are skipped in favour of the one that caused them.
+        """
+        errors = {index: message}
+        while len(errors) < self.workers:
+            try:
+                result_kind, index, value = self.results.get(timeout=POLL_INTERVAL)
+            except Empty:
+                break
+            if result_kind == 'error':
+                errors[index] = value
+        self.close()
+        for index in sorted(errors):
+            if 'BrokenBarrierError' not in errors[index]:
+                break
+        raise RuntimeError('ShardedWorld worker %d failed:\n%s' % (index, errors[index]))
+
+    def _command(self, command, arg=None):
+        if not self.processes:
+            raise RuntimeError('ShardedWorld has not been started')
+        for queue in self.commands:
+            queue.put((command, arg))
+        return self._collect(command)
+
+    def step(self, ticks=1):
+        """Run some number of ticks in all shards.
+
+        Returns
+        -------
+        float:
+            Throughput, in ticks per second of real time.
+        """
+        start = default_timer()
+        self.stats = self._command('step', ticks)
+        elapsed = default_timer() - start
+        self.ticks += ticks
+        if elapsed > 0:
+            return ticks/elapsed
+        return float('inf')
+
+    def state(self):
+        """Get (pos, vel) arrays of shape (N,2), in the order vehicles were added."""
+        pos = np.zeros((len(self.agents), 2))
+        vel = np.zeros((len(self.agents), 2))
+        for (ids, shard_pos, shard_vel) in self._command('state'):
+            if ids:
+                pos[ids] = shard_pos
+                vel[ids] = shard_vel
+        return pos, vel
+
+    def gather(self):
+        """Get copies of all vehicles, in the order they were added."""
+        agents = []
+        for data in self._command('gather'):
+            agents.extend(pickle.loads(data))
+        agents.sort(key=lambda agent: agent.shard_id)
+        return agents
+
+    def close(self):
+        """Stop all worker processes."""
+        for process, queue in zip(self.processes, self.commands):
+            if process.is_alive():
+                queue.put(('stop', None))
+        for process in self.processes:
+            process.join(POLL_INTERVAL)
+            if process.is_alive():
+                process.terminate()
+        self.processes = []
+
+def benchmark(n_agents=1000, worker_counts=(1, 2, 4, 8), ticks=20, seed=0):
+    """Print throughput of a flocking simulation for several worker counts.
+
+    Each vehicle wanders and flocks within a walled box four times as wide
+    as it is tall, so that work divides evenly between shards.
+
+    Since flocking checks every pair of vehicles within a shard, the work
+    per shard also shrinks with more shards; so some speedup is seen even
+    with fewer CPUs than workers.
+    """
+    from vehicle2d import SimpleVehicle2d, BaseWall2d
+    height = 20.0*np.sqrt(n_agents/4.0)
+    width = 4*height
+    walls = (BaseWall2d((width/2, 0), width, 4, Point2d(0,1)),
+             BaseWall2d((width/2, height), width, 4, Point2d(0,-1)),
+             BaseWall2d((0, height/2), height, 4, Point2d(1,0)),
+             BaseWall2d((width, height/2), height, 4, Point2d(-1,0)))
+
+    base = None
+    print('%d vehicles, %d ticks, %d CPUs' % (n_agents, ticks, multiprocessing.cpu_count()))
+    for workers in worker_counts:
+        rng = np.random.RandomState(seed)
+        agents = []
+        for (x, y), angle in zip(rng.uniform(0.05, 0.95, (n_agents, 2))*(width, height),
+                                 rng.uniform(0, 2*np.pi, n_agents)):
+            agent = SimpleVehicle2d(Point2d(x, y), 5, Point2d(np.cos(angle), np.sin(angle)))
+            agent.steering.set_target(WANDER=(40, 30, 5), WALLAVOID=[30, walls],
+                                      SEPARATE=[], ALIGN=[], COHESION=[])
+            agents.append(agent)
+        with ShardedWorld(width, workers, seed=seed) as world:
+            world.add(*agents)
+            world.start()
+            world.step(1)
+            rate = world.step(ticks)
+            migrated = sum(s['migrated'] for s in world.stats)
+            balance = max(s['busy'] for s in world.stats)/max(np.mean([s['busy'] for s in world.stats]), 1e-9)
+        if base is None:
+            base = rate
+        print('%2d workers: %8.2f ticks/sec, speedup %5.2fx, %d migrations, load imbalance %.2f'
+              % (workers, rate, rate/base, migrated, balance))
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,529 @@
+# snapshot.py
+"""Binary snapshot and restore of simulation state.
+
+A snapshot is an uncompressed NumPy .npz archive (no pickled objects) with:
+
+* Body state as (N,2)/(N,) arrays: pos, vel, front, left, accumulated_force,
+  radius, mass, maxspeed, maxforce; and for rigid bodies only, inertia,
+  omega, maxomega, maxtorque.
+* SteeringBehavior configuration of each body (status, targets, paused
+  targets, priority order, flockmates, WANDER state and WaypointCursor
+  positions); see Steering below.
+* State of the random generator used by WANDER, so that restored runs
+  are reproducible.
+* Geometry of all WaypointPaths referenced by any steering behaviour.
+
+Snapshots are restored *into* an existing set of bodies, built the same way
+as the ones that were saved (same classes, same order), such as a freshly
+set-up demo or benchmark. This keeps the format compact and avoids pickling
+arbitrary object graphs:
+
+* Bodies and walls in steering targets are stored by index, and must be in
+  the same order when restoring.
+* Any other objects in steering targets (FLOWFOLLOW velocity fields,
+  Formations) must be given in the externals list, and are also stored by
+  index; the externals themselves are not saved.
+
+If bodies are given as a vehicle_store.VehicleStore, body state is saved and
+restored by copying whole arrays, which takes only milliseconds even for
+100k bodies; this is useful as a warm start for benchmarks. A world.World
+may also be given, in which case its ticks and sim_time are also saved.
+
+Steering
+--------
+Vehicles are grouped by the layout of their steering configuration: the
+compute_force method, active and paused behaviours, priority order, and the
+kind of each value in their targets (points, numbers, bodies, walls, lists
+of bodies or walls, waypoint paths and cursors, etc.). Each layout is
+stored once (as JSON text), and the numbers in the values of all vehicles
+with that layout are stored as two NumPy columns (floats and ints; bodies,
+walls, externals and WaypointPaths are stored as indices). Lists of bodies
+or walls (such as a WALLAVOID wall list, or flockmates) and WaypointPaths
+are stored once each in a table, and are shared again after restoring, as
+they were when saved.
+
+Loading the arrays takes milliseconds, but the configuration itself lives
+in Python objects, so restoring it still sets the attributes of each
+steered vehicle (and builds its points and target tuples) in Python. This
+is done one group and one column at a time, but takes about a second for
+100k steered vehicles; only body state loads in milliseconds.
+"""
+
+# for python3 compat
+from __future__ import unicode_literals
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import gc
+import json
+from contextlib import contextmanager
+from numbers import Integral, Real
+
+import numpy as np
+
+import steering
+from point2d import Point2d
+from vehicle_store import VehicleStore, VECTOR_FIELDS, SCALAR_FIELDS
+
+#: Format version stored in each snapshot.
+SNAPSHOT_VERSION = 1
+
+#: Rigid body attributes; saved only for bodies that have them.
+ROTATION_FIELDS = ('inertia', 'omega', 'maxomega', 'maxtorque')
+
+class _Encoder(object):
+    """Writes steering configuration as NumPy columns, grouped by layout.
+
+    Each value is flattened into a signature (its structure, as nested
+    tuples of one-letter codes) and its numbers, appended to floats or ints.
+    Vehicles with the same layout (signature of every value, plus the
+    behaviours and priority order) share a group.
+    """
+
+    def __init__(self, refs, externals):
+        self.ref_index = {id(obj): i for i, obj in enumerate(refs)}
+        self.ext_index = {id(obj): i for i, obj in enumerate(externals)}
+        self.layouts = dict()
+        self.groups = []
+        # Lists of refs, stored once each (None: not all refs)
+        self.table_index = dict()
+        self.tables = []
+        self.paths = []
+        self.path_index = dict()
+        self.orders = []
+        self.order_index = dict()
+        self.status_keys = dict()
+
+    def table(self, val):
+        """Index of a (non-empty) list of refs in the table, or None."""
+        ref_index = self.ref_index
+        if id(val[0]) not in ref_index:
+            return None
+        key = id(val)
+        try:
+            return self.table_index[key]
+        except KeyError:
+            pass
+        items = [ref_index.get(id(item)) for item in val]
+        if None in items:
+            self.table_index[key] = None
+            return None
+        self.table_index[key] = len(self.tables)
+        self.tables.append(items)
+        return len(self.tables) - 1
+
+    def path(self, waypath):
+        """Index of a WaypointPath, adding it to the path table if needed."""
+        try:
+            return self.path_index[id(waypath)]
+        except KeyError:
+            self.path_index[id(waypath)] = len(self.paths)
+            self.paths.append(waypath)
+            return len(self.paths) - 1
+
+    def flatten(self, val, owner, floats, ints):
+        """Get the signature of a value; its numbers are appended to floats/ints."""
+        # Externals (which may be shared points or lists) are kept by identity
+        ext_index = self.ext_index
+        if ext_index and id(val) in ext_index:
+            ints.append(ext_index[id(val)])
+            return 'x'
+        # Then exact types, as isinstance() is slow for the numbers ABCs
+        kind = type(val)
+        if kind is float:
+            floats.append(val)
+            return 'f'
+        if kind is int:
+            ints.append(val)
+            return 'i'
+        if kind is Point2d:
+            floats.extend(val.ntuple())
+            return 'p'
+        if kind is tuple or kind is list:
+            return self.container(val, owner, floats, ints)
+        if val is None:
+            return 'n'
+        if val is True:
+            return 'T'
+        if val is False:
+            return 'F'
+        if val is owner:
+            return 's'
+        key = id(val)
+        if key in self.ref_index:
+            ints.append(self.ref_index[key])
+            return 'r'
+        if isinstance(val, Point2d):
+            floats.extend(val.ntuple())
+            return 'p'
+        if isinstance(val, Integral):
+            ints.append(int(val))
+            return 'i'
+        if isinstance(val, Real):
+            floats.append(float(val))
+            return 'f'
+        if isinstance(val, (tuple, list)):
+            return self.container(val, owner, floats, ints)
+        if isinstance(val, steering.WaypointPath):
+            ints.append(self.path(val))
+            return 'w'
+        if isinstance(val, steering.WaypointCursor):
+            ints.extend((self.path(val.path), int(val.wpindex)))
+            floats.append(val.edgelength)
+            return ('c',) + tuple([self.flatten(item, owner, floats, ints)
+                                   for item in (val.newway, val.edgevector,
+                                                val.return_pos, val.return_edges)])
+        raise ValueError('Cannot snapshot %r; add it to externals.' % (val,))
+
+    def container(self, val, owner, floats, ints):
+        """Signature of a list or tuple; see flatten()."""
+        is_list = isinstance(val, list)
+        if not val:
+            return 'e' if is_list else 'E'
+        if is_list:
+            # Lists of bodies/walls (e.g. obstacles) may be shared by vehicles
+            index = self.table(val)
+            if index is not None:
+                ints.append(index)
+                return 'g'
+        return ('l' if is_list else 't',) + tuple([self.flatten(item, owner, floats, ints) for item in val])
+
+    def priority(self, steer):
+        """Index of the vehicle's priority order in the table, or -1."""
+        order = getattr(steer, 'priority_order', None)
+        if not order:
+            return -1
+        try:
+            return self.order_index[id(order)]
+        except KeyError:
+            self.order_index[id(order)] = len(self.orders)
+            self.orders.append(order)
+            return len(self.orders) - 1
+
+    def add(self, index, steer):
+        """Add the configuration of the SteeringBehavior of body index."""
+        floats, ints = [], []
+        flatten = self.flatten
+        targets = tuple((name, flatten(target, steer, floats, ints))
+                        for name, target in steer.targets.items())
+        inactive = tuple((name, flatten(target, steer, floats, ints))
+                         for name, target in steer.inactive_targets.items())
+        flockmates = flatten(steer.flockmates, steer, floats, ints)
+        wander = tuple(flatten(getattr(steer, attr, None), steer, floats, ints)
+                       for attr in ('wander_params', 'wander_target'))
+        status_key = tuple(steer.status.items())
+        try:
+            status = self.status_keys[status_key]
+        except KeyError:
+            status = self.status_keys[status_key] = tuple(beh for beh, on in status_key if on)
+        layout = (steer.compute_force == steer.compute_force_budgeted, status,
+                  self.priority(steer), targets, inactive, flockmates, wander)
+        try:
+            group = self.groups[self.layouts[layout]]
+        except KeyError:
+            self.layouts[layout] = len(self.groups)
+            group = ([], [], [])
+            self.groups.append(group)
+        group[0].append(index)
+        group[1].append(floats)
+        group[2].append(ints)
+
+    def save(self, arrays):
+        """Add all groups and tables to the snapshot arrays."""
+        layouts = sorted(self.layouts, key=self.layouts.get)
+        arrays['steering_layouts'] = np.array([json.dumps(layout) for layout in layouts])
+        for k, (rows, floats, ints) in enumerate(self.groups):
+            arrays['steering_rows_%d' % k] = np.array(rows, dtype=np.int64)
+            arrays['steering_floats_%d' % k] = np.array(floats, dtype=float).reshape(len(rows), -1)
+            arrays['steering_ints_%d' % k] = np.array(ints, dtype=np.int64).reshape(len(rows), -1)
+        arrays['steering_tables'] = np.array([i for items in self.tables for i in items], dtype=np.int64)
+        arrays['steering_table_offsets'] = np.cumsum([0] + [len(items) for items in self.tables])
+        arrays['priority_names'] = np.array([name for order in self.orders for name in order])
+        arrays['priority_offsets'] = np.cumsum([0] + [len(order) for order in self.orders])
+
+        points = [[p.start.ntuple()] + [wp.ntuple() for wp in p.waypoints] for p in self.paths]
+        arrays['path_points'] = np.array([pt for pts in points for pt in pts], dtype=float).reshape(-1, 2)
+        arrays['path_offsets'] = np.cumsum([0] + [len(pts) for pts in points])
+        arrays['path_cyclic'] = np.array([p.is_cyclic for p in self.paths], dtype=bool)
+
+class _Decoder(object):
+    """Rebuilds the values of one group of vehicles, one column at a time."""
+
+    def __init__(self, floats, ints, steers, refs, externals, tables, paths):
+        self.floats = floats
+        self.ints = ints
+        self.fpos = 0
+        self.ipos = 0
+        self.steers = steers
+        self.refs = refs
+        self.externals = externals
+        self.tables = tables
+        self.paths = paths
+        self.count = len(steers)
+
+    def float_column(self):
+        self.fpos += 1
+        return self.floats[:, self.fpos - 1].tolist()
+
+    def int_column(self):
+        self.ipos += 1
+        return self.ints[:, self.ipos - 1].tolist()
+
+    def values(self, sig):
+        """List of this value for every vehicle in the group, from its signature."""
+        if isinstance(sig, list):
+            if sig[0] == 'c':
+                return self.cursors(sig)
+            columns = [self.values(item) for item in sig[1:]]
+            if sig[0] == 't':
+                return list(zip(*columns))
+            return [list(items) for items in zip(*columns)]
+        count = self.count
+        if sig == 'p':
+            return [Point2d(x, y) for x, y in zip(self.float_column(), self.float_column())]
+        if sig == 'f':
+            return self.float_column()
+        if sig == 'i':
+            return self.int_column()
+        if sig == 'r':
+            refs = self.refs
+            return [refs[i] for i in self.int_column()]
+        if sig == 'g':
+            tables = self.tables
+            return [tables[i] for i in self.int_column()]
+        if sig == 'x':
+            externals = self.externals
+            return [externals[i] for i in self.int_column()]
+        if sig == 'w':
+            paths = self.paths
+            return [paths[i] for i in self.int_column()]
+        if sig == 's':
+            return self.steers
+        if sig == 'e':
+            return [[] for i in range(count)]
+        constants = {'n': None, 'T': True, 'F': False, 'E': ()}
+        if sig in constants:
+            return [constants[sig]]*count
+        raise ValueError('Corrupt snapshot: unknown signature %r' % (sig,))
+
+    def cursors(self, sig):
+        """WaypointCursors for every vehicle in the group; see values()."""
+        paths = self.paths
+        path_ids, wpindex, edgelength = self.int_column(), self.int_column(), self.float_column()
+        newway, edgevector, return_pos, return_edges = [self.values(item) for item in sig[1:]]
+        cursors = []
+        for values in zip(path_ids, wpindex, edgelength, newway, edgevector, return_pos, return_edges):
+            cursor = steering.WaypointCursor(paths[values[0]])
+            (cursor.wpindex, cursor.edgelength, cursor.newway, cursor.edgevector,
+             cursor.return_pos, cursor.return_edges) = values[1:]
+            cursors.append(cursor)
+        return cursors
+
+def _restore_steering(arrays, bodylist, refs, externals, paths):
+    """Restore the steering configuration saved by _Encoder."""
+    flat = arrays['steering_tables'].tolist()
+    offsets = arrays['steering_table_offsets'].tolist()
+    tables = [[refs[i] for i in flat[offsets[k]:offsets[k+1]]] for k in range(len(offsets) - 1)]
+    names = [str(name) for name in arrays['priority_names']]
+    offsets = arrays['priority_offsets'].tolist()
+    orders = []
+    for k in range(len(offsets) - 1):
+        order = names[offsets[k]:offsets[k+1]]
+        if order == steering.SteeringBehavior.PRIORITY_DEFAULTS:
+            order = steering.SteeringBehavior.PRIORITY_DEFAULTS
+        orders.append(order)
+
+    for k, text in enumerate(arrays['steering_layouts'].tolist()):
+        budget, status, priority, targets, inactive, flockmates, wander = json.loads(text)
+        steers = [bodylist[i].steering for i in arrays['steering_rows_%d' % k].tolist()]
+        decoder = _Decoder(arrays['steering_floats_%d' % k], arrays['steering_ints_%d' % k],
+                           steers, refs, externals, tables, paths)
+        # Same order as _Encoder.add()
+        target_names = [name for name, sig in targets]
+        target_rows = list(zip(*[decoder.values(sig) for name, sig in targets])) or [()]*len(steers)
+        inactive_names = [name for name, sig in inactive]
+        inactive_rows = list(zip(*[decoder.values(sig) for name, sig in inactive])) or [()]*len(steers)
+        flockmate_values = decoder.values(flockmates)
+        wander_params, wander_targets = [decoder.values(sig) for sig in wander]
+
+        status_template = {beh: (beh in status) for beh in steering.BEHAVIOUR_LIST}
+        flocking = any(status_template.get(beh) is True for beh in steering.FLOCKING_LIST)
+        order = orders[priority] if priority >= 0 else None
+        if order is not None:
+            # As set_priorities(); the same for every vehicle in the group
+            priority_names = sorted(target_names, key=order.index)
+            permutation = [target_names.index(name) for name in priority_names]
+        for steer, target_vals, inactive_vals, mates, params, wander_target in zip(
+                steers, target_rows, inactive_rows, flockmate_values, wander_params, wander_targets):
+            steer.compute_force = steer.compute_force_budgeted if budget else steer.compute_force_simple
+            steer.status = dict(status_template)
+            steer.targets = dict(zip(target_names, target_vals))
+            steer.inactive_targets = dict(zip(inactive_names, inactive_vals))
+            steer.flockmates = mates
+            if params is not None:
+                steer.wander_params = params
+            if wander_target is not None:
+                steer.wander_target = wander_target
+            if order is not None:
+                steer.priority_order = order
+                steer.priorities = [(name, target_vals[j]) for name, j in zip(priority_names, permutation)]
+            steer.flocking = flocking
+
+@contextmanager
+def _gc_paused():
+    """Pause garbage collection, which otherwise rescans every vehicle
+    repeatedly while steering configuration for many vehicles is built."""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+def _indices_with(bodylist, attr):
+    """Indices of bodies with a given attribute (not None).
+
+    Only the first body of each class is checked, since bodies of the same
+    class always have the same attributes (steering, rotation, etc.).
+    """
+    has_attr = dict()
+    result = []
+    for i, body in enumerate(bodylist):
+        cls = body.__class__
+        try:
+            flag = has_attr[cls]
+        except KeyError:
+            flag = has_attr[cls] = getattr(body, attr, None) is not None
+        if flag:
+            result.append(i)
+    return result
+
+def _unpack_bodies(bodies):
+    """Get (list of bodies, VehicleStore or None, World or None)."""
+    if isinstance(bodies, VehicleStore):
+        return bodies.bodies[:bodies.count], bodies, None
+    if hasattr(bodies, 'step') and hasattr(bodies, 'bodies'):
+        return list(bodies.bodies), None, bodies
+    return list(bodies), None, None
+
+def save_snapshot(outfile, bodies, walls=(), externals=()):
+    """Save a binary snapshot of bodies and their steering configuration.
+
+    Parameters
+    ----------
+    outfile: string or file
+        Output file name or binary file object.
+    bodies: list of BasePointMass2d, VehicleStore, or World
+        Bodies to be saved; see module notes.
+    walls: list of BaseWall2d, optional
+        Walls (or other static objects) referenced by steering targets.
+    externals: list, optional
+        Any other objects referenced by steering targets.
+
+    Raises
+    ------
+    ValueError: If a steering target can't be saved (not in externals).
+    """
+    bodylist, store, world = _unpack_bodies(bodies)
+    n = len(bodylist)
+    arrays = dict(version=np.array([SNAPSHOT_VERSION]))
+
+    # Body state
+    if store is not None:
+        for field in VECTOR_FIELDS + SCALAR_FIELDS:
+            arrays[field] = store.active(field).copy()
+    else:
+        for field in VECTOR_FIELDS:
+            arrays[field] = np.array([getattr(b, field).ntuple() for b in bodylist], dtype=float).reshape(-1, 2)
+        for field in SCALAR_FIELDS:
+            arrays[field] = np.array([getattr(b, field) for b in bodylist], dtype=float)
+    if world is not None:
+        arrays['world'] = np.array([world.ticks, world.sim_time])
+
+    # Rigid body and steering data are saved only for bodies that have them
+    rigid = _indices_with(bodylist, 'omega')
+    arrays['rigid_index'] = np.array(rigid, dtype=np.int64)
+    for field in ROTATION_FIELDS:
+        arrays[field] = np.array([getattr(bodylist[i], field) for i in rigid], dtype=float)
+
+    # Steering configuration, and waypoint paths referenced by it
+    encoder = _Encoder(bodylist + list(walls), externals)
+    with _gc_paused():
+        for i in _indices_with(bodylist, 'steering'):
+            encoder.add(i, bodylist[i].steering)
+        encoder.save(arrays)
+    rng_version, rng_state, rng_gauss = steering.rand_gen.getstate()
+    arrays['rng_state'] = np.array(rng_state, dtype=np.uint32)
+    arrays['rng_gauss'] = np.array([np.nan if rng_gauss is None else rng_gauss])
+
+    np.savez(outfile, **arrays)
+
+def restore_snapshot(infile, bodies, walls=(), externals=()):
+    """Restore a snapshot into an existing set of bodies.
+
+    Parameters
+    ----------
+    infile: string or file
+        Snapshot file name or binary file object, from save_snapshot().
+    bodies: list of BasePointMass2d, VehicleStore, or World
+        Bodies to be restored; these must be the same number, classes and
+        order as when the snapshot was saved.
+    walls: list of BaseWall2d, optional
+        Walls referenced by steering targets, in the original order.
+    externals: list, optional
+        Other objects referenced by steering targets, in the original order.
+
+    Raises
+    ------
+    ValueError: If the snapshot does not match the given bodies.
+    """
+    bodylist, store, world = _unpack_bodies(bodies)
+    n = len(bodylist)
+    with np.load(infile, allow_pickle=False) as data:
+        arrays = {key: data[key] for key in data.files}
+    if int(arrays['version'][0]) != SNAPSHOT_VERSION:
+        raise ValueError('Unsupported snapshot version %d' % arrays['version'][0])
+    if len(arrays['pos']) != n:
+        raise ValueError('Snapshot has %d bodies, but %d were given' % (len(arrays['pos']), n))
+
+    # Body state
+    if store is not None:
+        for field in VECTOR_FIELDS + SCALAR_FIELDS:
+            store.active(field)[:] = arrays[field]
+    else:
+        for field in VECTOR_FIELDS:
+            for body, (x, y) in zip(bodylist, arrays[field].tolist()):
+                setattr(body, field, Point2d(x, y))
+        for field in SCALAR_FIELDS:
+            for body, val in zip(bodylist, arrays[field].tolist()):
+                setattr(body, field, val)
+    rigid = arrays['rigid_index'].tolist()
+    for field in ROTATION_FIELDS:
+        for i, val in zip(rigid, arrays[field].tolist()):
+            setattr(bodylist[i], field, val)
+    if world is not None and 'world' in arrays:
+        world.ticks = int(arrays['world'][0])
+        world.sim_time = float(arrays['world'][1])
+        world.previous = [body.pos for body in bodylist]
+        world.reset_clock()
+
+    # Waypoint paths
+    points = arrays['path_points'].tolist()
+    path_offsets = arrays['path_offsets'].tolist()
+    paths = []
+    for i, is_cyclic in enumerate(arrays['path_cyclic'].tolist()):
+        waypoints = [Point2d(x, y) for (x, y) in points[path_offsets[i]:path_offsets[i+1]]]
+        paths.append(steering.WaypointPath(waypoints, is_cyclic))
+
+    # Steering configuration
+    with _gc_paused():
+        _restore_steering(arrays, bodylist, bodylist + list(walls), externals, paths)
+    rng_gauss = float(arrays['rng_gauss'][0])
+    steering.rand_gen.setstate((steering.rand_gen.VERSION,
+                                tuple(int(x) for x in arrays['rng_state']),
+                                None if rng_gauss != rng_gauss else rng_gauss))
+
+if __name__ == "__main__":
+    print("Binary snapshot/restore of simulation state. Import this elsewhere.")
@@ -0,0 +1,718 @@
+# spring_network.py
+"""Vectorized spring-mass networks, for many SMHFish (or other systems).
+
+SMHFish.update() loops over its springs, then its hydro quads, then its
+mass nodes, with several Point2d operations each. SpringNetwork stores the
+same system as arrays:
+
+* Masses: pos, vel, front, left, force, mass, damping, maxspeed, maxforce.
+* Springs: an edge index (base, tip) into the masses, with spring constant
+  k and natural length for each edge.
+* Muscles: every spring also has a flexed length and a contraction slope;
+  contract() changes the natural length of any set of springs at once, as
+  MuscleSpring2d.contract() does. For ordinary springs the slope is zero.
+* Hydro quads: an edge index (quad_base, quad_tip) with the average height,
+  center_t and force multiplier of each HydroQuad2d; fluid_forces() does
+  the work of HydroQuad2d.exert_fluid_force() for all quads at once.
+
+Spring forces for every edge are computed at once and scatter-added onto
+the masses; all masses are then moved in a single vectorized step. Any
+number of separate systems (e.g. many fish) can share one network, since
+they are just more rows and edges; add_copies() adds many copies of one
+system at once (see fish_school.py).
+
+Integrators
+-----------
+Stiff springs (such as SPRING_DATA in hydro_fish.py) make the explicit
+Euler update of DampedMass2d.move() unstable unless the time step is very
+small. The integrator used by step() can be chosen from INTEGRATORS:
+
+* 'euler': Same as DampedMass2d.move() (position is updated with the old
+  velocity, then velocity with the force); results match the objects.
+* 'symplectic': Semi-implicit Euler; velocity is updated first, and the new
+  velocity is used to update position. Same cost as 'euler', but stable
+  for larger time steps.
+* 'verlet': Velocity Verlet; spring forces are evaluated at both ends of
+  the step. Twice the cost per step, but second-order accurate.
+* 'implicit': Linearized backward Euler. Each step solves
+  (M + dt*C - dt^2*K) dv = dt*(F + dt*K*v) for the velocity change, where
+  K is the stiffness matrix of the springs; this is sparse (one 2x2 block
+  per spring) and solved matrix-free with preconditioned conjugate
+  gradients over the edge index. Unconditionally stable, but it damps
+  fast oscillations.
+
+'symplectic' and 'verlet' treat damping implicitly (v -> v/(1 + dt*damping/mass)),
+since light nodes with strong damping, such as the SMHFish tail, would
+otherwise limit the time step by themselves.
+
+Usage::
+
+    network = SpringNetwork()
+    handles = [network.add_fish(fish) for fish in school]
+    # ...each tick:
+    network.contract(handles[0].muscles[2:4], (1, 0))
+    network.step(delta_t)
+    network.write_back()   # Only needed to render or inspect the objects
+
+Run this module directly for a regression check and a benchmark against
+SMHFish.update(), and a comparison of integrator accuracy for larger time
+steps.
+"""
+
+# for python3 compat
+from __future__ import unicode_literals
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import numpy as np
+
+from integrators import move_arrays, truncate_rows, align_heading
+from point2d import Point2d
+
+#: Integration methods available for SpringNetwork.step().
+INTEGRATORS = ('euler', 'symplectic', 'verlet', 'implicit')
+
+#: The implicit solver stops once the residual norm is this fraction of the
+#: right-hand side norm.
+CG_TOLERANCE = 1e-8
+
+#: Maximum number of conjugate gradient iterations per implicit step.
+CG_MAX_ITERATIONS = 200
+
+def scatter_add(force, index, values):
+    """Add rows of values (shape (M,2)) to force[index], repeats included.
+
+    This is equivalent to np.add.at(force, index, values), but faster.
+    """
+    n = len(force)
+    force[:, 0] += np.bincount(index, values[:, 0], minlength=n)
+    force[:, 1] += np.bincount(index, values[:, 1], minlength=n)
+
+def _conjugate_gradient(apply_matrix, rhs, precond, tol=CG_TOLERANCE, maxiter=CG_MAX_ITERATIONS):
+    """Solve A*x = rhs, for symmetric positive definite A, by Jacobi-PCG.
+
+    Parameters
+    ----------
+    apply_matrix: function
+        Returns A*x for an array x of the same shape as rhs.
+    rhs: numpy.ndarray
+        Right-hand side.
+    precond: numpy.ndarray
+        Diagonal of A, of the same shape as rhs.
+
+    Returns
+    -------
+    (x, iterations): numpy.ndarray, int
+    """
+    x = np.zeros_like(rhs)
+    r = rhs.copy()
+    z = r/precond
+    p = z.copy()
+    rz = np.vdot(r, z)
+    limit = (tol*np.sqrt(np.vdot(rhs, rhs)))**2
+    for i in range(maxiter):
+        if np.vdot(r, r) <= limit:
+            return x, i
+        ap = apply_matrix(p)
+        alpha = rz/np.vdot(p, ap)
+        x += alpha*p
+        r -= alpha*ap
+        z = r/precond
+        rz_new = np.vdot(r, z)
+        p = z + (rz_new/rz)*p
+        rz = rz_new
+    return x, maxiter
+
+class NetworkHandle(object):
+    """Indices of one system (e.g. a fish) within a SpringNetwork.
+
+    Attributes
+    ----------
+    nodes: numpy.ndarray
+        Network indices of the system's masses, in their original order.
+    springs: numpy.ndarray
+        Network indices of the system's springs, in their original order.
+    muscles: numpy.ndarray
+        Network indices of the system's muscles (a subset of springs).
+    quads: numpy.ndarray
+        Network indices of the system's hydro quads.
+    """
+
+    def __init__(self, nodes, springs, muscles, quads=()):
+        self.nodes = nodes
+        self.springs = springs
+        self.muscles = muscles
+        self.quads = np.asarray(quads, dtype=np.intp)
+
+class SpringNetwork(object):
+    """Arrays of damped point masses connected by ideal springs.
+
+    Parameters
+    ----------
+    integrator: string
+        Integration method used by step(); one of INTEGRATORS.
+
+    Notes
+    -----
+    Masses and springs are added with add_masses() and add_springs() (or
+    add_fish() for a whole SMHFish); the original objects are kept so that
+    write_back() can copy the results to them.
+    """
+
+    MASS_FIELDS = ('mass', 'damping', 'maxspeed', 'maxforce')
+    VECTOR_FIELDS = ('pos', 'vel', 'front', 'left', 'force')
+    SPRING_FIELDS = ('k', 'natlength', 'flexlength', 'conslope', 'contracted')
+    QUAD_FIELDS = ('quad_avg_h', 'quad_center_t', 'quad_mult')
+
+    def __init__(self, integrator='euler'):
+        if integrator not in INTEGRATORS:
+            raise ValueError('Unknown integrator %r; use one of %s' % (integrator, INTEGRATORS))
+        self.integrator = integrator
+        # Iterations used by the last implicit step
+        self.cg_iterations = 0
+        self.nodes = []
+        self.springs = []
+        self.node_index = {}
+        for name in self.VECTOR_FIELDS:
+            setattr(self, name, np.zeros((0, 2)))
+        for name in self.MASS_FIELDS + self.SPRING_FIELDS:
+            setattr(self, name, np.zeros(0))
+        self.base = np.zeros(0, dtype=np.intp)
+        self.tip = np.zeros(0, dtype=np.intp)
+        # Per-spring results of the last spring_forces(), as in IdealSpring2d
+        self.displacement = np.zeros((0, 2))
+        self.curlength = np.zeros(0)
+        # Hydro quads
+        self.quads = []
+        self.quad_base = np.zeros(0, dtype=np.intp)
+        self.quad_tip = np.zeros(0, dtype=np.intp)
+        for name in self.QUAD_FIELDS:
+            setattr(self, name, np.zeros(0))
+        # Per-quad results of the last fluid_forces(), as in HydroQuad2d
+        self.quad_pos = np.zeros((0, 2))
+        self.quad_vel = np.zeros((0, 2))
+        self.quad_force = np.zeros((0, 2))
+        self.quad_active = np.zeros(0, dtype=bool)
+
+    @property
+    def count(self):
+        """Number of masses in this network."""
+        return len(self.nodes)
+
+    def add_masses(self, nodes):
+        """Add point masses (e.g. DampedMass2d) to the network.
+
+        Parameters
+        ----------
+        nodes: list of BasePointMass2d
+            Masses to add; a damping attribute is used if present.
+
+        Returns
+        -------
+        numpy.ndarray:
+            Network indices of the new masses.
+        """
+        start = len(self.nodes)
+        nodes = list(nodes)
+        for i, node in enumerate(nodes):
+            self.node_index[id(node)] = start + i
+        self.nodes.extend(nodes)
+
+        new = {'pos': [node.pos.ntuple() for node in nodes],
+               'vel': [node.vel.ntuple() for node in nodes],
+               'front': [node.front.ntuple() for node in nodes],
+               'left': [node.left.ntuple() for node in nodes],
+               'force': [node.accumulated_force.ntuple() for node in nodes]}
+        for name in self.VECTOR_FIELDS:
+            values = np.array(new[name], dtype=float).reshape(-1, 2)
+            setattr(self, name, np.concatenate((getattr(self, name), values)))
+        for name in self.MASS_FIELDS:
+            values = np.array([getattr(node, name, 0.0) for node in nodes], dtype=float)
+            setattr(self, name, np.concatenate((getattr(self, name), values)))
+        return np.arange(start, len(self.nodes))
+
+    def add_springs(self, springs):
+        """Add springs (IdealSpring2d or MuscleSpring2d) to the network.
+
+        Both end masses of each spring must already have been added.
+
+        Returns
+        -------
+        numpy.ndarray:
+            Network indices of the new springs.
+        """
+        start = len(self.springs)
+        springs = list(springs)
+        self.springs.extend(springs)
+        base = [self.node_index[id(spring.mass_base)] for spring in springs]
+        tip = [self.node_index[id(spring.mass_tip)] for spring in springs]
+        self.base = np.concatenate((self.base, np.array(base, dtype=np.intp)))
+        self.tip = np.concatenate((self.tip, np.array(tip, dtype=np.intp)))
+
+        new = {'k': [spring.k for spring in springs],
+               'natlength': [spring.natlength for spring in springs],
+               # Ordinary springs act as muscles that never change length
+               'flexlength': [getattr(spring, 'flexlength', spring.natlength) for spring in springs],
+               'conslope': [getattr(spring, 'conslope', 0.0) for spring in springs],
+               'contracted': [getattr(spring, 'contracted', 0.0) for spring in springs]}
+        for name in self.SPRING_FIELDS:
+            values = np.array(new[name], dtype=float)
+            setattr(self, name, np.concatenate((getattr(self, name), values)))
+        self.displacement = np.zeros((len(self.springs), 2))
+        self.curlength = np.zeros(len(self.springs))
+        return np.arange(start, len(self.springs))
+
+    def add_quads(self, quads, force_mult):
+        """Add hydro quads (HydroQuad2d) to the network.
+
+        Both end masses of each quad must already have been added.
+
+        Parameters
+        ----------
+        quads: list of HydroQuad2d
+            Quads to add.
+        force_mult: float
+            Fluid force multiplier (hydro_fish.HYDRO_FORCE_MULT for SMHFish).
+
+        Returns
+        -------
+        numpy.ndarray:
+            Network indices of the new quads.
+        """
+        start = len(self.quads)
+        quads = list(quads)
+        self.quads.extend(quads)
+        base = [self.node_index[id(quad.base_m)] for quad in quads]
+        tip = [self.node_index[id(quad.tip_m)] for quad in quads]
+        self.quad_base = np.concatenate((self.quad_base, np.array(base, dtype=np.intp)))
+        self.quad_tip = np.concatenate((self.quad_tip, np.array(tip, dtype=np.intp)))
+
+        new = {'quad_avg_h': [quad.avg_h for quad in quads],
+               'quad_center_t': [quad.center_t for quad in quads],
+               'quad_mult': [force_mult]*len(quads)}
+        for name in self.QUAD_FIELDS:
+            values = np.array(new[name], dtype=float)
+            setattr(self, name, np.concatenate((getattr(self, name), values)))
+        n = len(self.quads)
+        self.quad_pos = np.zeros((n, 2))
+        self.quad_vel = np.zeros((n, 2))
+        self.quad_force = np.zeros((n, 2))
+        self.quad_active = np.zeros(n, dtype=bool)
+        return np.arange(start, n)
+
+    def add_fish(self, fish, force_mult=None):
+        """Add all mass nodes, springs and hydro quads of an SMHFish.
+
+        Parameters
+        ----------
+        fish: hydro_fish.SMHFish
+            The fish to add.
+        force_mult: float, optional
+            Fluid force multiplier; defaults to hydro_fish.HYDRO_FORCE_MULT.
+
+        Returns
+        -------
+        NetworkHandle:
+            Network indices of the fish's nodes, springs, muscles and quads.
+        """
+        nodes = self.add_masses(fish.massnodes)
+        springs = self.add_springs(fish.springs)
+        quads = ()
+        if fish.hquads:
+            if force_mult is None:
+                import hydro_fish
+                force_mult = hydro_fish.HYDRO_FORCE_MULT
+            quads = self.add_quads(fish.hquads, force_mult)
+        # Muscles are the first springs of each fish
+        return NetworkHandle(nodes, springs, springs[:len(fish.muscles)], quads)
+
+    def add_copies(self, template, count, offsets=None):
+        """Add many copies of all masses, springs and quads of another network.
+
+        Parameters
+        ----------
+        template: SpringNetwork
+            Network to copy (e.g. one with a single fish).
+        count: int
+            Number of copies.
+        offsets: array of shape (count, 2), optional
+            Position offset of each copy; defaults to no offset.
+
+        Returns
+        -------
+        (nodes, springs, quads): tuple of numpy.ndarray
+            Network indices of the copies, each of shape (count, n) with
+            n the number of masses, springs or quads in the template; row i
+            is copy i, in the same order as the template.
+
+        Notes
+        -----
+        Copies are made directly from the template arrays, without creating
+        any mass, spring or quad objects, so write_back() skips them.
+        """
+        n_nodes, n_springs, n_quads = template.count, len(template.springs), len(template.quads)
+        node_start = self.count
+        node_shift = (node_start + n_nodes*np.arange(count))[:, np.newaxis]
+        for name in self.VECTOR_FIELDS + self.MASS_FIELDS:
+            values = getattr(template, name)
+            values = np.tile(values, (count,) + (1,)*(values.ndim - 1))
+            setattr(self, name, np.concatenate((getattr(self, name), values)))
+        if offsets is not None:
+            offsets = np.asarray(offsets, dtype=float).reshape(count, 2)
+            self.pos[node_start:] += np.repeat(offsets, n_nodes, axis=0)
+        self.nodes.extend([None]*(n_nodes*count))
+
+        spring_start = len(self.springs)
+        self.base = np.concatenate((self.base, (template.base + node_shift).ravel()))
+        self.tip = np.concatenate((self.tip, (template.tip + node_shift).ravel()))
+        for name in self.SPRING_FIELDS:
+            values = np.tile(getattr(template, name), count)
+            setattr(self, name, np.concatenate((getattr(self, name), values)))
+        self.springs.extend([None]*(n_springs*count))
+        self.displacement = np.zeros((len(self.springs), 2))
+        self.curlength = np.zeros(len(self.springs))
+
+        quad_start = len(self.quads)
+        self.quad_base = np.concatenate((self.quad_base, (template.quad_base + node_shift).ravel()))
+        self.quad_tip = np.concatenate((self.quad_tip, (template.quad_tip + node_shift).ravel()))
+        for name in self.QUAD_FIELDS:
+            values = np.tile(getattr(template, name), count)
+            setattr(self, name, np.concatenate((getattr(self, name), values)))
+        self.quads.extend([None]*(n_quads*count))
+        n = len(self.quads)
+        self.quad_pos = np.zeros((n, 2))
+        self.quad_vel = np.zeros((n, 2))
+        self.quad_force = np.zeros((n, 2))
+        self.quad_active = np.zeros(n, dtype=bool)
+
+        return (np.arange(node_start, self.count).reshape(count, n_nodes),
+                np.arange(spring_start, len(self.springs)).reshape(count, n_springs),
+                np.arange(quad_start, n).reshape(count, n_quads))
+
+    def contract(self, springs, squeeze_factor):
+        """Contract muscles, as MuscleSpring2d.contract().
+
+        Parameters
+        ----------
+        springs: array of int
+            Network indices of the muscles.
+        squeeze_factor: float or array of float
+            From 0 (no contraction) to 1 (fully contracted), for all given
+            muscles or for each of them.
+        """
+        self.natlength[springs] = self.flexlength[springs] - squeeze_factor*self.conslope[springs]
+        self.contracted[springs] = squeeze_factor
+
+    def _add_spring_forces(self, force, pos):
+        """Add spring forces for the given positions to force."""
+        displacement = pos[self.tip] - pos[self.base]
+        curlength = np.sqrt(np.einsum('nk,nk->n', displacement, displacement))
+        magnitude = self.k*(1 - self.natlength/curlength)
+        spring_force = displacement*magnitude[:, np.newaxis]
+        scatter_add(force, np.concatenate((self.base, self.tip)),
+                    np.concatenate((spring_force, -spring_force)))
+        self.displacement = displacement
+        self.curlength = curlength
+
+    def spring_forces(self):
+        """Compute all spring forces and add them to the accumulated force."""
+        self._add_spring_forces(self.force, self.pos)
+
+    def fluid_forces(self, delta_t=1.0):
+        """Compute all hydro quad forces and add them to the accumulated force.
+
+        Notes
+        -----
+        As in HydroQuad2d.exert_fluid_force(), each quad only exerts force
+        when its center of area moves outward from the body (the body is
+        to the left of each quad, from base to tip). The force is normal to
+        the quad, proportional to its normal velocity and to the fluid
+        volume displaced during delta_t, and is split between the end
+        masses according to center_t.
+        """
+        if not self.quads:
+            return
+        base, tip = self.quad_base, self.quad_tip
+        center_t = self.quad_center_t[:, np.newaxis]
+        self.quad_pos = self.pos[base]*(1 - center_t) + self.pos[tip]*center_t
+        self.quad_vel = self.vel[base]*(1 - center_t) + self.vel[tip]*center_t
+
+        contour = self.pos[tip] - self.pos[base]
+        normal_in = np.empty_like(contour)
+        normal_in[:, 0] = -contour[:, 1]
+        normal_in[:, 1] = contour[:, 0]
+        dotp = np.einsum('nk,nk->n', self.quad_vel, normal_in)
+        self.quad_active = dotp < 0
+
+        # Force is proportional to the volume of fluid displaced this step
+        length_sq = np.einsum('nk,nk->n', contour, contour)
+        volume = delta_t*self.quad_avg_h*np.sqrt(length_sq)
+        scale = np.where(self.quad_active, -dotp*volume*self.quad_mult/length_sq, 0.0)
+        total_force = normal_in*scale[:, np.newaxis]
+        scatter_add(self.force, np.concatenate((base, tip)),
+                    np.concatenate((total_force*(1 - center_t), total_force*center_t)))
+        self.quad_force = total_force
+
+    def total_force(self, pos, vel, external, damped=True):
+        """Spring, external and (unless damped is False) damping force."""
+        force = external.copy()
+        if damped:
+            force -= vel*self.damping[:, np.newaxis]
+        self._add_spring_forces(force, pos)
+        truncate_rows(force, self.maxforce)
+        return force
+
+    def _stiffness_product(self, vec):
+        """Compute -K*vec, where K is the spring stiffness matrix.
+
+        Uses the spring directions and lengths from the last force update.
+        For compressed springs the (destabilizing) transverse stiffness is
+        dropped, so that -K is positive semi-definite.
+        """
+        diff = vec[self.base] - vec[self.tip]
+        along = np.einsum('nk,nk->n', diff, self._unit)
+        block = (self._transverse[:, np.newaxis]*diff
+                 + ((1 - self._transverse)*along)[:, np.newaxis]*self._unit)
+        block *= self.k[:, np.newaxis]
+        result = np.zeros_like(vec)
+        scatter_add(result, np.concatenate((self.base, self.tip)),
+                    np.concatenate((block, -block)))
+        return result
+
+    def move(self, delta_t=1.0):
+        """Move all masses using (then zeroing) the accumulated force.
+
+        As in DampedMass2d.move(), a damping force proportional to velocity
+        is added to the accumulated force first.
+        """
+        force = self.force
+        force -= self.vel*self.damping[:, np.newaxis]
+        move_arrays(self.pos, self.vel, self.front, self.left, force,
+                    self.mass, self.maxspeed, self.maxforce, delta_t)
+        force[:] = 0
+
+    def step(self, delta_t=1.0):
+        """Advance the network by one step, using self.integrator.
+
+        Notes
+        -----
+        Fluid forces from any hydro quads are computed first, at the current
+        state (as in SMHFish.update). These, and any other force already
+        accumulated in self.force, are applied as a constant external force
+        during this step, and then zeroed.
+        """
+        self.fluid_forces(delta_t)
+        if self.integrator == 'euler':
+            self.spring_forces()
+            self.move(delta_t)
+        elif self.integrator == 'symplectic':
+            self._step_symplectic(delta_t)
+        elif self.integrator == 'verlet':
+            self._step_verlet(delta_t)
+        elif self.integrator == 'implicit':
+            self._step_implicit(delta_t)
+        else:
+            raise ValueError('Unknown integrator %r; use one of %s' % (self.integrator, INTEGRATORS))
+
+    def _finish_step(self):
+        """Limit speeds, align headings and clear the external force."""
+        truncate_rows(self.vel, self.maxspeed)
+        align_heading(self.vel, self.front, self.left)
+        self.force[:] = 0
+
+    def _damping_factor(self, delta_t):
+        """Velocity scale for damping over delta_t, treated implicitly."""
+        return (1.0/(1 + delta_t*self.damping/self.mass))[:, np.newaxis]
+
+    def _step_symplectic(self, delta_t):
+        force = self.total_force(self.pos, self.vel, self.force, damped=False)
+        self.vel += force*(delta_t/self.mass)[:, np.newaxis]
+        self.vel *= self._damping_factor(delta_t)
+        truncate_rows(self.vel, self.maxspeed)
+        self.pos += self.vel*delta_t
+        self._finish_step()
+
+    def _step_verlet(self, delta_t):
+        inv_mass = (1.0/self.mass)[:, np.newaxis]
+        half_damping = self._damping_factor(delta_t/2)
+        accel = self.total_force(self.pos, self.vel, self.force, damped=False)*inv_mass
+        self.vel = (self.vel + accel*(delta_t/2))*half_damping
+        self.pos += self.vel*delta_t
+        accel = self.total_force(self.pos, self.vel, self.force, damped=False)*inv_mass
+        self.vel = (self.vel + accel*(delta_t/2))*half_damping
+        self._finish_step()
+
+    def _step_implicit(self, delta_t):
+        force = self.total_force(self.pos, self.vel, self.force)
+        # Spring directions and transverse stiffness, for _stiffness_product
+        self._unit = self.displacement/self.curlength[:, np.newaxis]
+        self._transverse = np.maximum(1 - self.natlength/self.curlength, 0)
+
+        dt_sq = delta_t*delta_t
+        mass_diag = (self.mass + delta_t*self.damping)[:, np.newaxis]
+        def apply_matrix(vec):
+            return mass_diag*vec + dt_sq*self._stiffness_product(vec)
+        rhs = delta_t*(force - delta_t*self._stiffness_product(self.vel))
+
+        # Jacobi preconditioner: diagonal of the system matrix
+        unit_sq = self._unit*self._unit
+        stiff_diag = self.k[:, np.newaxis]*(self._transverse[:, np.newaxis]
+                                            + (1 - self._transverse)[:, np.newaxis]*unit_sq)
+        precond = mass_diag + np.zeros_like(rhs)
+        scatter_add(precond, np.concatenate((self.base, self.tip)),
+                    dt_sq*np.concatenate((stiff_diag, stiff_diag)))
+
+        delta_vel, self.cg_iterations = _conjugate_gradient(apply_matrix, rhs, precond)
+        self.vel += delta_vel
+        truncate_rows(self.vel, self.maxspeed)
+        self.pos += self.vel*delta_t
+        self._finish_step()
+
+    def write_back(self):
+        """Copy state back to the original mass and spring objects.
+
+        Rows without objects (see add_copies) are skipped.
+        """
+        pos, vel = self.pos.tolist(), self.vel.tolist()
+        front, left = self.front.tolist(), self.left.tolist()
+        for i, node in enumerate(self.nodes):
+            if node is None:
+                continue
+            node.pos = Point2d(*pos[i])
+            node.vel = Point2d(*vel[i])
+            node.front = Point2d(*front[i])
+            node.left = Point2d(*left[i])
+            node.accumulated_force = Point2d(0,0)
+        natlength, contracted = self.natlength.tolist(), self.contracted.tolist()
+        for i, spring in enumerate(self.springs):
+            if spring is None:
+                continue
+            spring.natlength = natlength[i]
+            if hasattr(spring, 'contracted'):
+                spring.contracted = contracted[i]
+        # Quad results, as used by HydroQuad2d.renderforce()
+        quad_pos, quad_vel = self.quad_pos.tolist(), self.quad_vel.tolist()
+        quad_force, active = self.quad_force.tolist(), self.quad_active.tolist()
+        for i, quad in enumerate(self.quads):
+            if quad is None:
+                continue
+            quad.pos = Point2d(*quad_pos[i])
+            quad.vel = Point2d(*quad_vel[i])
+            quad.current_force = Point2d(*quad_force[i]) if active[i] else None
+
+#: Largest node position difference allowed by _check().
+CHECK_TOLERANCE = 1e-9
+
+def _check(count=3, steps=500, freq=40, delta_t=0.0235):
+    """Regression check of the 'euler' integrator against SMHFish.update().
+
+    Swims count fish (each at its own point in the swimming gait, so that
+    muscles switch sides at different ticks) as objects, in a network built
+    with add_fish(), and in one built with add_copies() (as FishSchool), and
+    raises AssertionError unless all three agree after steps updates.
+    """
+    import hydro_fish
+
+    def new_fish():
+        return hydro_fish.SMHFish(hydro_fish.HEAD_DATA, hydro_fish.BODY_DATA,
+                                  hydro_fish.TAIL_DATA, hydro_fish.SPRING_DATA)
+
+    control = hydro_fish.swimming_gait(freq)
+    offsets = np.arange(count)*control.period//count
+    school = [new_fish() for i in range(count)]
+    network = SpringNetwork('euler')
+    muscles = np.array([network.add_fish(new_fish()).muscles for i in range(count)])
+    template = SpringNetwork()
+    template.add_fish(new_fish())
+    copies = SpringNetwork('euler')
+    copy_muscles = copies.add_copies(template, count)[1][:, :muscles.shape[1]]
+
+    for tick in range(steps):
+        for fish, offset in zip(school, offsets.tolist()):
+            control.apply(fish, tick + offset)
+            fish.update(delta_t)
+        control.apply_network(network, muscles, tick, offsets)
+        network.step(delta_t)
+        control.apply_network(copies, copy_muscles, tick, offsets)
+        copies.step(delta_t)
+
+    objects = np.array([node.pos.ntuple() for fish in school for node in fish.massnodes])
+    network_error = np.abs(network.pos - objects).max()
+    copies_error = np.abs(copies.pos - objects).max()
+    # Only rounding differences are allowed (forces are summed in a
+    # different order); any change in the physics is far larger than this
+    assert network_error < CHECK_TOLERANCE, 'add_fish() network differs by %.2e' % network_error
+    assert copies_error < CHECK_TOLERANCE, 'add_copies() network differs by %.2e' % copies_error
+    print('Check passed: %d fish, %d steps; max difference %.2e (add_fish), %.2e (add_copies)'
+          % (count, steps, network_error, copies_error))
+
+def _benchmark(fish_counts=(1, 10, 100, 1000), steps=50, delta_t=0.0235):
+    """Compare SMHFish.update() with a SpringNetwork."""
+    from timeit import default_timer
+    import hydro_fish
+    for count in fish_counts:
+        school = [hydro_fish.SMHFish(hydro_fish.HEAD_DATA, hydro_fish.BODY_DATA,
+                                     hydro_fish.TAIL_DATA, hydro_fish.SPRING_DATA)
+                  for i in range(count)]
+        for fish in school:
+            fish.signal_muscles(2, 1)
+        network = SpringNetwork()
+        for fish in school:
+            network.add_fish(fish)
+
+        start = default_timer()
+        for i in range(steps):
+            for fish in school:
+                fish.update(delta_t)
+        loop_time = default_timer() - start
+
+        start = default_timer()
+        for i in range(steps):
+            network.step(delta_t)
+        array_time = default_timer() - start
+
+        error = np.abs(network.pos - [node.pos.ntuple() for node in network.nodes]).max()
+        print('%5d fish: loop %8.3f ms/step, network %7.3f ms/step (%.1fx), max difference %.2e'
+              % (count, 1000*loop_time/steps, 1000*array_time/steps, loop_time/array_time, error))
+
+def _stability(time_steps=(0.0235, 0.05, 0.1, 0.15, 0.2, 0.3), sim_time=28.0, period=3.29):
+    """Compare integrators on a swimming SMHFish (without fluid forces).
+
+    For each integrator and time step, print the largest node position
+    error after sim_time, against a Verlet run with a very small step.
+    Fluid forces are left out, since HydroQuad2d forces depend on the
+    time step by design (through the volume displaced in each step).
+    """
+    import hydro_fish
+
+    def swim(integrator, delta_t):
+        network = SpringNetwork(integrator)
+        fish = hydro_fish.SMHFish(hydro_fish.HEAD_DATA, hydro_fish.BODY_DATA,
+                                  hydro_fish.TAIL_DATA, hydro_fish.SPRING_DATA)
+        fish.hquads = ()
+        muscles = network.add_fish(fish).muscles[2:4]
+        direction = 1
+        network.contract(muscles, np.array([direction, 1 - direction]))
+        next_flip = period
+        with np.errstate(all='ignore'):
+            for i in range(int(round(sim_time/delta_t))):
+                if (i + 1)*delta_t >= next_flip:
+                    direction = 1 - direction
+                    network.contract(muscles, np.array([direction, 1 - direction]))
+                    next_flip += period
+                network.step(delta_t)
+        return network.pos
+
+    reference = swim('verlet', 0.0005)
+    print('Max position error after %.1f time units:' % sim_time)
+    print('%10s ' % 'delta_t' + ' '.join('%8.4f' % delta_t for delta_t in time_steps))
+    for integrator in INTEGRATORS:
+        errors = [np.abs(swim(integrator, delta_t) - reference).max() for delta_t in time_steps]
+        print('%10s ' % integrator + ' '.join('%8.2f' % error if np.isfinite(error) else '  (fail)'
+                                              for error in errors))
+
+if __name__ == "__main__":
+    _check()
+    _benchmark()
+    _stability()
@@ -14,9 +14,10 @@ import point2d
 
 INF = float('inf')
 
-# BasePointMass2d defaults
 import vehicle2d
-vehicle2d.set_physics_defaults(MASS=1.0, MAXSPEED=INF, MAXFORCE=INF)
+
+#: Physics profile for spring-mass nodes (no speed or force limits)
+SPRINGMASS_PROFILE = vehicle2d.PhysicsProfile(mass=1.0, maxspeed=INF, maxforce=INF)
 
 # Physics constants
 NODE_RADIUS = 5
@@ -25,8 +26,9 @@ DAMPING_COEFF = 1.0
 SPRING_CONST = 15.0
 UPDATE_SPEED = 0.005
 
-# Needed for Spring rendering
-import pygame.draw
+#: Integration methods available for DampedMass2d.move(). For the Verlet and
+#: implicit methods, which need the whole spring system, see spring_network.py.
+MASS_INTEGRATORS = ('euler', 'symplectic')
 
 class DampedMass2d(vehicle2d.BasePointMass2d):
     """A pointmass with linearly-damped velocity.
@@ -45,6 +47,13 @@ class DampedMass2d(vehicle2d.BasePointMass2d):
         Proportionality constant: damping force = -damping * velocity
     spritedata: list or tuple, optional
         Extra sprite data; see BasePointMass2d for details.
+    profile: vehicle2d.PhysicsProfile, optional
+        Movement limits; defaults to SPRINGMASS_PROFILE. Mass is always
+        given by the mass parameter above.
+    integrator: string
+        Either 'euler' (default; as BasePointMass2d.move) or 'symplectic'
+        (semi-implicit Euler with implicit damping; see move_symplectic),
+        which stays stable with stiffer springs or larger time steps.
 
     Notes
     -----
@@ -54,10 +63,14 @@ class DampedMass2d(vehicle2d.BasePointMass2d):
     TODO: Positional parameters are in a different order thatn hydro_fish.py
     """
     def __init__(self, position, radius, velocity,
-                 mass=NODE_MASS, damping=DAMPING_COEFF, spritedata=None):
-        vehicle2d.BasePointMass2d.__init__(self, position, radius, velocity, spritedata)
+                 mass=NODE_MASS, damping=DAMPING_COEFF, spritedata=None,
+                 profile=SPRINGMASS_PROFILE, integrator='euler'):
+        vehicle2d.BasePointMass2d.__init__(self, position, radius, velocity, spritedata, profile)
         self.mass = mass
         self.damping = damping
+        if integrator not in MASS_INTEGRATORS:
+            raise ValueError('Unknown integrator %r; use one of %s' % (integrator, MASS_INTEGRATORS))
+        self.integrator = integrator
 
     def move(self, delta_t=1.0, force=None):
         """Updates position, velocity, and acceleration (with damping).
@@ -74,12 +87,36 @@ class DampedMass2d(vehicle2d.BasePointMass2d):
         Applied force behaves as in BasePointMass2d.move(); see notes there.
         This class adds a damping force, proportional to velocity, each update.
         """
+        if self.integrator == 'symplectic':
+            self.move_symplectic(delta_t, force)
+            return
         if force is not None:
             force = force - self.vel.scm(self.damping)
         else:
             self.accumulate_force(-self.vel.scm(self.damping))
         vehicle2d.BasePointMass2d.move(self, delta_t, force)
 
+    def move_symplectic(self, delta_t=1.0, force=None):
+        """As move(), but with velocity updated first and implicit damping.
+
+        The new velocity is (vel + delta_t*force/mass)/(1 + delta_t*damping/mass),
+        which stays stable however strong the damping is.
+        """
+        if force is None:
+            force = self.accumulated_force
+            self.accumulated_force = point2d.Point2d(0,0)
+        force.truncate(self.maxforce)
+        vel = self.vel + force.scm(delta_t/self.mass)
+        vel = vel.scm(1.0/(1 + delta_t*self.damping/self.mass))
+        vel.truncate(self.maxspeed)
+        self.vel = vel
+        self.pos = self.pos + vel.scm(delta_t)
+
+        if vel.sqnorm() > vehicle2d.SPEED_EPSILON:
+            front = vel.unit()
+            self.front = front
+            self.left = point2d.Point2d(-front[1], front[0])
+
 class IdealSpring2d(object):
     """An ideal (massless, stiff) spring attaching two point masses.
 
@@ -135,7 +172,10 @@ class IdealSpring2d(object):
         -----
         Springs are green when stretched, red when compressed. In either case,
         a brighter color means further deviation from natural length.
+
+        This imports pygame, so physics-only uses never need it.
         """
+        import pygame.draw
         self.displacement = self.mass_tip.pos - self.mass_base.pos
         self.curlength = self.displacement.norm()
         scale = self.natlength/self.curlength
@@ -0,0 +1,192 @@
+# sprites2d.py
+"""Pygame rendering adapters for the classes in vehicle2d.py.
+
+This is the only module in the vehicle package (apart from the demos) that
+needs pygame for vehicles and walls. It is imported automatically the first
+time a sprite is requested, either by passing spritedata to a BasePointMass2d
+or by accessing BaseWall2d.sprite. Headless simulations that never ask for a
+sprite never import pygame at all.
+"""
+
+# for python3 compat
+from __future__ import unicode_literals
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import os, pygame
+from collections import OrderedDict
+from pygame.locals import RLEACCEL
+
+# Point2d functions return radians, but pygame wants degrees. The negative
+# is needed since y coordinates increase downwards on screen. Multiply a
+# math radians result by SCREEN_DEG to get pygame screen-appropriate degrees.
+SCREEN_DEG = -57.2957795131
+
+#: Angular resolution (in degrees) of cached sprite rotations.
+ROTATION_RESOLUTION = 2.0
+
+#: Maximum number of rotated images kept by the default cache.
+ROTATION_CACHE_SIZE = 4096
+
+def load_pygame_image(name, colorkey=None):
+    """Loads image from current working directory for use in pygame.
+
+    Parameters
+    ----------
+    name: string
+        Image file to load (must be pygame-compatible format)
+    colorkey: pygame.Color
+        Used to set a background color for this image that will be ignored
+        during blitting. If set to -1, the upper-left pixel color will be
+        used as the background color. See pygame.Surface.set_colorkey() for
+        further details.
+
+    Returns
+    -------
+    (pygame.Surface, pygame.rect):
+        For performance reasons, the returned Surface is the same format as
+        the pygame display. The alpha channel is removed.
+    """
+    imagefile = os.path.join(os.getcwd(), name)
+    try:
+        image_surf = pygame.image.load(imagefile)
+    except pygame.error as message:
+        print('Error: Cannot load image file: %s' % name)
+        print('Current working directory is: %s' % os.getcwd())
+        raise SystemExit(message)
+
+    # This converts the surface for maximum blitting performance,
+    # including removal of any alpha channel:
+    image_surf = image_surf.convert()
+
+    # This sets the background (ignored during blit) color:
+    if colorkey is not None:
+        if colorkey == -1:
+            colorkey = image_surf.get_at((0,0))
+        image_surf.set_colorkey(colorkey, RLEACCEL)
+    return image_surf, image_surf.get_rect()
+
+class RotationCache(object):
+    """LRU cache of rotated images, keyed by (image, quantized angle).
+
+    Parameters
+    ----------
+    resolution: positive float
+        Rotation angles are rounded to a multiple of this (in degrees).
+    maxsize: positive int
+        Maximum number of rotated images kept; the least recently used
+        image is discarded when this is exceeded.
+
+    Notes
+    -----
+    Sprites sharing the same source Surface share cached rotations. Keys
+    hold a reference to the source image, so images are never freed while
+    they have cached rotations; use clear() if source images are discarded.
+    """
+
+    def __init__(self, resolution=ROTATION_RESOLUTION, maxsize=ROTATION_CACHE_SIZE):
+        self.resolution = resolution
+        self.maxsize = maxsize
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.cache)
+
+    def quantize(self, theta):
+        """Get the cache step (int) for a rotation angle in degrees."""
+        return int(round(theta/self.resolution)) % int(round(360/self.resolution))
+
+    def rotated(self, image, step):
+        """Get image rotated by step*resolution degrees, from cache if possible."""
+        key = (image, step)
+        try:
+            surf = self.cache.pop(key)
+            self.hits += 1
+        except KeyError:
+            surf = pygame.transform.rotate(image, step*self.resolution)
+            self.misses += 1
+            if len(self.cache) >= self.maxsize:
+                self.cache.popitem(last=False)
+        # Most recently used items are kept at the end
+        self.cache[key] = surf
+        return surf
+
+    def clear(self):
+        """Discard all cached rotations and reset statistics."""
+        self.cache.clear()
+        self.hits = 0
+        self.misses = 0
+
+#: Rotation cache shared by all PointMass2dSprite objects by default.
+ROTATION_CACHE = RotationCache()
+
+class Wall2dSprite(pygame.sprite.Sprite):
+    """Pygame Sprite for rendering BaseWall2d objects."""
+
+    def __init__(self, owner, color=None):
+        # Must call pygame's Sprite.__init__ first!
+        pygame.sprite.Sprite.__init__(self)
+
+        # Set-up sprite image
+        self.image = pygame.Surface((owner.length, owner.thick))
+        self.image.set_colorkey((255,0,255))
+        if color is None:
+            color = (0,0,0)
+        self.color = color
+        self.image.fill(self.color)
+        self.rect = self.image.get_rect()
+
+        # Put into place for rendering
+        theta = owner.front.angle()*SCREEN_DEG - 90
+        self.image = pygame.transform.rotate(self.image, theta)
+        self.rect = self.image.get_rect()
+        self.rect.center = owner.pos[0], owner.pos[1]
+
+    def update(self, delta_t=1.0):
+        """Update placeholder for pygame.Sprite parent class. Does nothing."""
+        pass
+
+class PointMass2dSprite(pygame.sprite.Sprite):
+    """A Pygame sprite used to display a BasePointMass2d object."""
+
+    def __init__(self, owner, img_surf, img_rect, rotation_cache=None):
+        # Must call pygame's Sprite.__init__ first!
+        pygame.sprite.Sprite.__init__(self)
+
+        self.owner = owner
+        if rotation_cache is None:
+            rotation_cache = ROTATION_CACHE
+        self.rotation_cache = rotation_cache
+        # Quantized angle of the current image (None until first update)
+        self.rotation_step = None
+
+        # Pygame image information for blitting
+        self.orig = img_surf
+        self.image = img_surf
+        # This lets us share image sources!
+        self.rect = img_rect.copy()
+        self.rect.center = owner.pos[0], owner.pos[1]
+        # Only needed if we're use pygame Sprite collision
+        self.radius = owner.radius
+
+    def update(self, delta_t=1.0):
+        """Called by pygame.Group.update() to redraw this sprite."""
+        owner = self.owner
+        # Update position
+        self.rect.center = owner.pos[0], owner.pos[1]
+        # Rotate for blitting, unless heading is unchanged (to within the
+        # cache resolution); rotated images are shared via the cache.
+        cache = self.rotation_cache
+        step = cache.quantize(owner.front.angle()*SCREEN_DEG)
+        if step != self.rotation_step:
+            self.rotation_step = step
+            center = self.rect.center
+            self.image = cache.rotated(self.orig, step)
+            self.rect = self.image.get_rect()
+            self.rect.center = center
+
+if __name__ == "__main__":
+    print("Pygame sprites for vehicle2d objects. Import this elsewhere.")
@@ -29,6 +29,11 @@ TODO: set/pause/resume/stop behaviour functions always call set_priorities()
 regardless of whether budgeted force is actually used. Since we're currently
 using budgeted force all the time, this issue is pretty much unimportant.
 
+Debug messages from SteeringBehavior are only produced if the root logger was
+enabled for DEBUG when this module was imported; call refresh_logging() after
+changing the logging configuration. For profiling runs, set_event_trace() can
+be used to record behaviour changes with much less overhead.
+
 TODO: Updates to self.flocking are handled through set_priorities(), which is
 a sensible thing, since set_priorities() is the function that gets called when
 there is any kind of behaviour change. Make up our minds whether this is truly
@@ -47,6 +52,23 @@ from point2d import Point2d
 
 import logging
 
+#: Cached check of whether debug messages will be logged; formatting of these
+#: messages is skipped entirely when False. Use refresh_logging() to update.
+LOG_DEBUG = logging.getLogger().isEnabledFor(logging.DEBUG)
+
+def refresh_logging():
+    """Re-check the logging level after the logging configuration changes."""
+    global LOG_DEBUG
+    LOG_DEBUG = logging.getLogger().isEnabledFor(logging.DEBUG)
+
+#: Optional event_trace.EventTrace for behaviour changes; None disables.
+EVENT_TRACE = None
+
+def set_event_trace(trace):
+    """Record behaviour set/pause/resume/stop events in trace (None to stop)."""
+    global EVENT_TRACE
+    EVENT_TRACE = trace
+
 # Default constants for the various steering behaviours
 from steering_constants import STEERING_DEFAULTS
 FLEE_PANIC_SQ = STEERING_DEFAULTS['FLEE_PANIC_SQ']
@@ -167,7 +189,7 @@ def activate_arrive(steering, target):
         steering.targets['ARRIVE'] = (Point2d(target[0], target[1]), target[2])
     return True
 
-def force_pursue(owner, prey):
+def force_pursue(owner, prey, solver=None):
     """Steering force for PURSUE behaviour.
 
     Similar to SEEK, but lead the prey by estimating its future location,
@@ -179,7 +201,12 @@ def force_pursue(owner, prey):
         The vehicle computing this force.
     prey: BasePointMass2d
         The vehicle that owner will pursue.
+    solver: intercept.InterceptSolver, optional
+        If given, use the force computed (for all its pursuers at once) by
+        the solver's last update().
     """
+    if solver is not None:
+        return solver.force('PURSUE', owner, prey)
     prey_offset = prey.pos - owner.pos
     # If prey is in front and moving our way, SEEK to prey's position
     # Compute this using dot products; constant below is cos(10 degrees)
@@ -194,12 +221,15 @@ def force_pursue(owner, prey):
     return force_seek(owner, prey.vel.scm(ptime) + prey.pos)
 
 def activate_pursue(steering, prey):
-    """Activate PURSUE behaviour."""
+    """Activate PURSUE behaviour; prey is a vehicle or (vehicle, solver)."""
     # TODO: Error checking here.
-    steering.targets['PURSUE'] = (prey,)
+    if isinstance(prey, tuple):
+        steering.targets['PURSUE'] = prey
+    else:
+        steering.targets['PURSUE'] = (prey,)
     return True
 
-def force_evade(owner, predator):
+def force_evade(owner, predator, solver=None):
     """Steering force for EVADE behaviour.
 
     Similar to FLEE, but try to get away from the predicted future position
@@ -212,7 +242,12 @@ def force_evade(owner, predator):
         The vehicle computing this force.
     predator: BasePointMass2d
         The vehicle that owner will pursue.
+    solver: intercept.InterceptSolver, optional
+        If given, use the force computed (for all its evaders at once) by
+        the solver's last update().
     """
+    if solver is not None:
+        return solver.force('EVADE', owner, predator)
     predator_offset = predator.pos - owner.pos
     # Predict the future position of predator, assuming it has a constant
     # velocity. Prediction time is the distance to predator divided
@@ -221,9 +256,12 @@ def force_evade(owner, predator):
     return force_flee(owner, predator.vel.scm(ptime) + predator.pos, EVADE_PANIC_SQ)
 
 def activate_evade(steering, predator):
-    """Activate EVADE behaviour."""
+    """Activate EVADE behaviour; predator is a vehicle or (vehicle, solver)."""
     # TODO: Error checking here.
-    steering.targets['EVADE'] = (predator,)
+    if isinstance(predator, tuple):
+        steering.targets['EVADE'] = predator
+    else:
+        steering.targets['EVADE'] = (predator,)
     return True
 
 def force_wander(owner, steering):
@@ -517,6 +555,34 @@ def activate_follow(steering, target):
     # TODO: Check for errors
     return True
 
+def force_formation(owner, formation):
+    """Steering force for FORMATION, following the leader in a shared slot.
+
+    Parameters
+    ----------
+    owner: SimpleVehicle2d
+        The vehicle computing this force.
+    formation: formations.Formation
+        Formation containing owner; see Notes.
+
+    Notes
+    -----
+    This works like FOLLOW, except the owner's slot position has already been
+    transformed into world coordinates by the Formation (once per tick, for
+    all slots at once), so we only need to lead by the leader's velocity.
+    """
+    target_pos = formation.slot_position(owner)
+    diff = target_pos - owner.pos
+    ptime = diff.norm() / (owner.maxspeed + formation.leader_speed)
+    target_pos = target_pos + formation.leader_vel.scm(ptime)
+    return force_arrive(owner, target_pos, FOLLOW_ARRIVE_HESITANCE)
+
+def activate_formation(steering, formation):
+    """Activate FORMATION behaviour."""
+    # Slot assignment is managed by the Formation itself; see add_follower()
+    steering.targets['FORMATION'] = (formation,)
+    return True
+
 def force_brake(owner, decay=0.5):
     """Steering force oppoisite of current forward velocity.
 
@@ -543,8 +609,14 @@ def activate_brake(steering, target):
 ### Path-related behaviours start here     ###
 ##############################################
 
+def _edge_data(oldway, newway):
+    """Length and unit vector of the path edge from oldway to newway."""
+    offset = newway - oldway
+    length = offset.norm()
+    return (length, offset.scm(1/length))
+
 class WaypointPath(object):
-    """Helper class for managing path-related behaviour, using waypoints.
+    """Immutable waypoint geometry, shared by any number of vehicles.
 
     Parameters
     ----------
@@ -555,41 +627,86 @@ class WaypointPath(object):
 
     Notes
     -----
-    Instances of WaypointPath should be owned by a SteeringBehaviour, but all
-    path-management code is controlled from within this class.
+    This class stores only the geometry of a path (waypoints and edge data),
+    and is never modified after __init__(). Traversal state is kept by a
+    WaypointCursor instead, one for each vehicle using the path, so that a
+    convoy following a common route needs only a single WaypointPath.
 
     When using this for vehicle steering, the first waypoint is intended as the
     starting point of some owner vehicle. The vehicle will *not* automatically
     return to this point even if is_cyclic is set to True, so add it manually
     to the end of waypoints if a return trip is needed.
-
-    TODO: It may be helpful to rewrite this class as a generator.
     """
 
     def __init__(self, waypoints, is_cyclic=False):
-        self.oldway = waypoints[0]
-        self.waypoints = []
-        prev_wp = self.oldway
+        self.start = waypoints[0]
+        kept = []
+        prev_wp = self.start
 
         # Include only consecutive waypoints that are far enough apart
         for wp in waypoints[1:]:
             if (prev_wp - wp).sqnorm() >= PATH_EPSILON_SQ:
-                self.waypoints.append(wp)
+                kept.append(wp)
                 prev_wp = wp
+        self.waypoints = tuple(kept)
+        self.is_cyclic = is_cyclic
 
-        # Compute initial segment, see Notes on returning to first waypoint
-        self.newway = self.waypoints[0]
-        self.wpindex = 0
+        # edges[i] is (length, unit vector) of the edge ending at waypoints[i];
+        # the first edge starts from self.start.
+        edges = [_edge_data(self.start, kept[0])]
+        for i in range(1, len(kept)):
+            edges.append(_edge_data(kept[i-1], kept[i]))
+        self.edges = tuple(edges)
 
-        # Length of this edge and unit vector (oldway to newway)
-        offset = self.newway - self.oldway
-        self.edgelength = offset.norm()
-        self.edgevector = offset.scm(1/self.edgelength)
+        # Edge used when a cyclic path wraps from its last to first waypoint
+        if is_cyclic and len(kept) > 1:
+            self.wrap_edge = _edge_data(kept[-1], kept[0])
+        else:
+            self.wrap_edge = None
 
-        self.is_cyclic = is_cyclic
+    def __len__(self):
+        return len(self.waypoints)
+
+class WaypointCursor(object):
+    """Per-vehicle traversal state for a shared WaypointPath.
+
+    Parameters
+    ----------
+    path: WaypointPath
+        The (shared) path to be traversed.
+
+    Notes
+    -----
+    Instances of WaypointCursor should be owned by a SteeringBehaviour; the
+    WAYPATHTRAVERSE and WAYPATHRESUME behaviours create one automatically
+    when activated with a WaypointPath.
+
+    Edge data is referenced from the underlying path rather than copied, so
+    each cursor uses a constant amount of memory regardless of path length.
+    The only exception is the optional return waypoint (see the method
+    reset_from_position), whose two edges are stored here.
+    """
+
+    __slots__ = ('path', 'wpindex', 'newway', 'edgelength', 'edgevector',
+                 'return_pos', 'return_edges')
+
+    def __init__(self, path):
+        self.path = path
+        self.return_pos = None
+        self.return_edges = None
+        self.wpindex = 0
+        self.newway = path.waypoints[0]
+        self.edgelength, self.edgevector = path.edges[0]
+
+    def num_waypoints(self):
+        """Total number of waypoints, including the return point (if any)."""
+        if self.return_pos is None:
+            return len(self.path.waypoints)
+        else:
+            return len(self.path.waypoints) + 1
 
     def reset_from_position(self, start_pos, do_return=False):
-        """Reset the next waypoint to the start of this path.
+        """Reset the next waypoint to the start of the path.
 
         Parameters
         ----------
@@ -600,23 +717,34 @@ class WaypointPath(object):
 
         Notes
         -----
-        As with the __init__() method, start_pos is intended as the current
+        As with WaypointPath.__init__(), start_pos is intended as the current
         location of some vehicle, and is not explicitly added as the first
-        waypoint. If the path was previously cyclic, we will not return to
-        start_pos by default (but the previous waypoints will still continue
-        to cycle). To override this, set do_return=True. However, start_pos
-        will not be added explicitly is it is within the threshold given by
-        PATH_EPSILON_SQ, because it is close enough to an actual waypoint.
+        waypoint. If the path is cyclic, we will not return to start_pos by
+        default (but the path waypoints will still continue to cycle). To
+        override this, set do_return=True. However, start_pos will not be
+        added if it is within the threshold given by PATH_EPSILON_SQ of the
+        last waypoint, because it is close enough to an actual waypoint.
+
+        The shared WaypointPath is never modified; the return point is
+        stored in this cursor only.
         """
-        self.newway = self.waypoints[0]
+        waypoints = self.path.waypoints
+        self.return_pos = None
+        self.return_edges = None
+        if do_return and (start_pos - waypoints[-1]).sqnorm() >= PATH_EPSILON_SQ:
+            self.return_pos = start_pos
+            self.return_edges = (_edge_data(waypoints[-1], start_pos),
+                                 _edge_data(start_pos, waypoints[0]))
+
         self.wpindex = 0
+        self.newway = waypoints[0]
         # TODO: Make sure this works for single edges and start_pos close to
         # the first or last waypoint in a cyclic path.
         # If we're close to the first waypoint, use that wp as start_pos
         if (start_pos - self.newway).sqnorm() < PATH_EPSILON_SQ:
             self.advance()
-        if do_return and (start_pos - self.waypoints[-1]).sqnorm() >= PATH_EPSILON_SQ:
-            self.waypoints.append(start_pos)
+        else:
+            self.edgelength, self.edgevector = _edge_data(start_pos, self.newway)
 
     def advance(self):
         """Update our waypoint to the next one in the path.
@@ -626,29 +754,30 @@ class WaypointPath(object):
         When we advance() from the last waypoint in a non-cyclic path, the
         value of self.newway is set to None. This can be used elsewhere??
         """
-        self.oldway = self.newway
-        self.wpindex = self.wpindex + 1
-
-        try:
-            self.newway = self.waypoints[self.wpindex]
-            # Compute new length and unit vector
-            offset = self.newway - self.oldway
-            self.edgelength = offset.norm()
-            self.edgevector = offset.scm(1/self.edgelength)
-
-        # This throws if we are at the last waypoint in the list.
-        except IndexError:
-            if self.is_cyclic:
-                # If cyclic, go back to the first waypoint
-                self.wpindex = 0
-                self.newway = self.waypoints[0]
-                offset = self.newway - self.oldway
-                self.edgelength = offset.norm()
-                self.edgevector = offset.scm(1/self.edgelength)
+        path = self.path
+        n = len(path.waypoints)
+        index = self.wpindex + 1
+
+        if index < n:
+            self.newway = path.waypoints[index]
+            edge = path.edges[index]
+        elif index == n and self.return_pos is not None:
+            self.newway = self.return_pos
+            edge = self.return_edges[0]
+        elif path.is_cyclic and (path.wrap_edge or self.return_edges):
+            # If cyclic, go back to the first waypoint
+            index = 0
+            self.newway = path.waypoints[0]
+            if self.return_edges is not None:
+                edge = self.return_edges[1]
             else:
-                self.newway = None
-                self.edgelength = 0
-                self.edgevector = None
+                edge = path.wrap_edge
+        else:
+            self.newway = None
+            edge = (0, None)
+
+        self.wpindex = index
+        self.edgelength, self.edgevector = edge
 
     def num_left(self):
         """Returns the number of waypoints remaining in this path.
@@ -658,10 +787,16 @@ class WaypointPath(object):
         For cyclic paths, we always return the total number of waypoints,
         regardless of where we are in the list.
         """
-        if self.is_cyclic:
-            return len(self.waypoints)
+        if self.path.is_cyclic:
+            return self.num_waypoints()
         else:
-            return len(self.waypoints) - self.wpindex
+            return self.num_waypoints() - self.wpindex
+
+def waypoint_cursor(waypath):
+    """Get a new WaypointCursor for a WaypointPath (cursors pass through)."""
+    if isinstance(waypath, WaypointCursor):
+        return waypath
+    return WaypointCursor(waypath)
 
 
 def force_waypathtraverse(owner, waypath):
@@ -671,8 +806,8 @@ def force_waypathtraverse(owner, waypath):
     ----------
     owner: SimpleVehicle2d
         The vehicle computing this force.
-    waypath: WaypointPath
-        Path to be followed by the owner
+    waypath: WaypointCursor
+        Owner's position along the path to be followed
 
     Notes
     -----
@@ -702,7 +837,7 @@ def force_waypathtraverse(owner, waypath):
 def activate_waypathtraverse(steering, waypath):
     """Activate WAYPATHTRAVERSE behaviour."""
     # TODO: Error checking here.
-    steering.targets['WAYPATHTRAVERSE'] = (waypath,)
+    steering.targets['WAYPATHTRAVERSE'] = (waypoint_cursor(waypath),)
     return True
 
 def force_waypathresume(owner, waypath, invk):
@@ -712,8 +847,8 @@ def force_waypathresume(owner, waypath, invk):
     ----------
     owner: SimpleVehicle2d
         The vehicle computing this force.
-    waypath: WaypointPath
-        Path to be followed by the owner
+    waypath: WaypointCursor
+        Owner's position along the path to be followed
     invk: positive float
         Reciprocal of exponential decay constant. See Notes.
 
@@ -764,7 +899,7 @@ def activate_waypathresume(steering, target):
         invk = 1.0/target[1]
     else:
         invk = 1.0/PATHRESUME_DECAY
-    steering.targets['WAYPATHRESUME'] = (target[0], invk)
+    steering.targets['WAYPATHRESUME'] = (waypoint_cursor(target[0]), invk)
     return True
 
 def force_flowfollow(owner, vel_field, dt=1.0):
@@ -914,13 +1049,13 @@ for behaviour in BEHAVIOUR_LIST[:]:
         FORCE_FNC[behaviour] = force_fnc
         ACTIVATE_FNC[behaviour] = activate_fnc
     except KeyError:
-        logging.debug("[steering.py] Warning: could not define behaviour %s." % behaviour)
+        logging.debug("[steering.py] Warning: could not define behaviour %s.", behaviour)
         BEHAVIOUR_LIST.remove(behaviour)
 
 # Now make sure that expected flocking behaviours were correctly defined
 for behaviour in FLOCKING_LIST:
     if not (behaviour in BEHAVIOUR_LIST):
-        logging.debug("[steering.py] Warning: flocking %s is not available." % behaviour)
+        logging.debug("[steering.py] Warning: flocking %s is not available.", behaviour)
         FLOCKING_LIST.remove(behaviour)
 
 ########################################################
@@ -954,6 +1089,7 @@ class SteeringBehavior(object):
                          'PURSUE',
                          'GUARD',
                          'FOLLOW',
+                         'FORMATION',
                          'WAYPATHRESUME',
                          'WAYPATHTRAVERSE',
                          'COHESION',
@@ -981,6 +1117,18 @@ class SteeringBehavior(object):
         else:
             self.compute_force = self.compute_force_simple
 
+    def __getstate__(self):
+        """Pickle support (used to migrate vehicles between processes)."""
+        state = self.__dict__.copy()
+        # Lambdas can't be pickled; priority_key is rebuilt on unpickling
+        state.pop('priority_key', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if 'priority_order' in state:
+            self.priority_key = lambda x: self.priority_order.index(x[0])
+
     def set_target(self, **kwargs):
         """Initializes one or more steering behaviours.
 
@@ -1006,14 +1154,17 @@ class SteeringBehavior(object):
             List of walls to be avoided
         GUARD: (BasePointMass2d, BasePointMass2d, float), optional
             (GuardTarget, GuardFrom, AggressivePercent)
-        WAYPATHTRAVERSE: (WaypointPath), optional
-            List of waypoints for WAYPATHTRAVERSE behaviour.
-        WAYPATHRESUME: (WaypointPath, invk), optional
-            List of waypoints and inverse of decay constant for PATHRESUME.
+        WAYPATHTRAVERSE: WaypointPath or WaypointCursor, optional
+            Path for WAYPATHTRAVERSE behaviour; a WaypointPath may be shared
+            between vehicles, since each one gets its own WaypointCursor.
+        WAYPATHRESUME: (WaypointPath or WaypointCursor, invk), optional
+            Path and inverse of decay constant for PATHRESUME.
         FLOWFOLLOW: (vel_field, dt), optional
             Callable vel_field function and time increment
         FOLLOW: (BasePointMass2d, Point2d), optional
             (Leader, OffsetFromLeader)
+        FORMATION: formations.Formation, optional
+            Formation to follow; normally set by Formation.add_follower().
         SEPARATE: List of BasePointMass2d, optional
             List of targets to flock with
         ALIGN: List of BasePointMass2d, optional
@@ -1043,10 +1194,14 @@ class SteeringBehavior(object):
                 result = activate(self, target)
                 if result is True:
                     self.status[behaviour] = True
-                    logging.debug('%s successfully initiated.' % behaviour)
+                    if LOG_DEBUG:
+                        logging.debug('%s successfully initiated.', behaviour)
+                    if EVENT_TRACE is not None:
+                        EVENT_TRACE.record(self.vehicle, 'SET', behaviour)
                     all_res.append(True)
             except KeyError:
-                logging.debug("Warning: %s behaviour improperly defined; cannot activate." % behaviour)
+                if LOG_DEBUG:
+                    logging.debug("Warning: %s behaviour improperly defined; cannot activate.", behaviour)
                 all_res.append(False)
         self.set_priorities()
         # If we only initialized one behaviour, don't return a list.
@@ -1072,13 +1227,17 @@ class SteeringBehavior(object):
         try:
             self.inactive_targets[steering_type] = self.targets[steering_type]
         except KeyError:
-            logging.debug('Warning: Behaviour %s has not been initialized. Ignoring pause.' % steering_type)
+            if LOG_DEBUG:
+                logging.debug('Warning: Behaviour %s has not been initialized. Ignoring pause.', steering_type)
             return False
         # Otherwise, pause until later resumed.
         del self.targets[steering_type]
         self.status[steering_type] = False
         self.set_priorities()
-        logging.debug('%s paused.' % steering_type)
+        if LOG_DEBUG:
+            logging.debug('%s paused.', steering_type)
+        if EVENT_TRACE is not None:
+            EVENT_TRACE.record(self.vehicle, 'PAUSE', steering_type)
         return True
 
     def resume(self, steering_type):
@@ -1098,14 +1257,18 @@ class SteeringBehavior(object):
         try:
             target = self.inactive_targets[steering_type]
         except KeyError:
-            logging.debug('Warning: Behaviour %s was not paused. Ignoring resume.' % steering_type)
+            if LOG_DEBUG:
+                logging.debug('Warning: Behaviour %s was not paused. Ignoring resume.', steering_type)
             return False
         # Otherwise, retreive previously-saved targets and resume.
         self.targets[steering_type] = target
         del self.inactive_targets[steering_type]
         self.status[steering_type] = True
         self.set_priorities()
-        logging.debug('%s resumed.' % steering_type)
+        if LOG_DEBUG:
+            logging.debug('%s resumed.', steering_type)
+        if EVENT_TRACE is not None:
+            EVENT_TRACE.record(self.vehicle, 'RESUME', steering_type)
         return True
 
     def stop(self, steering_type):
@@ -1125,12 +1288,16 @@ class SteeringBehavior(object):
         try:
             del self.targets[steering_type]
         except KeyError:
-            logging.debug('Warning: Behaviour %s has not been initialized. Ignoring stop.' % steering_type)
+            if LOG_DEBUG:
+                logging.debug('Warning: Behaviour %s has not been initialized. Ignoring stop.', steering_type)
             return False
         # Otherwise, stop this behaviour (without storing prior targets)
         self.status[steering_type] = False
         self.set_priorities()
-        logging.debug('%s stopped.' % steering_type)
+        if LOG_DEBUG:
+            logging.debug('%s stopped.', steering_type)
+        if EVENT_TRACE is not None:
+            EVENT_TRACE.record(self.vehicle, 'STOP', steering_type)
 
     def update_flocking_status(self):
         """Sets or clears flocking status based on currently-active behaviours."""
@@ -0,0 +1,192 @@
+# steering_profiler.py
+"""Opt-in timing and call counters for steering behaviours.
+
+Usage::
+
+    from steering_profiler import SteeringProfiler
+    profiler = SteeringProfiler()
+    profiler.enable()
+    # ...run the simulation for a while...
+    profiler.disable()
+    print(profiler.report())
+
+While enabled, each entry of steering.FORCE_FNC is replaced by a wrapper that
+records call count, cumulative and maximum time, and the magnitude of the
+returned force. SteeringBehavior.flag_neighbor_vehicles is wrapped in the same
+way to measure the cost of neighbour searches. Since the dispatch table itself
+is swapped, disabling the profiler restores the original functions and there
+is no overhead at all in normal use.
+
+Note
+----
+Force functions that call other force functions directly (for example, PURSUE
+calls force_seek) are timed inclusively; the inner call is not counted as a
+separate SEEK call.
+"""
+
+# for python3 compat
+from __future__ import unicode_literals
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import json
+from timeit import default_timer as timer
+
+import steering
+
+#: Name used in reports for the neighbour-search timings.
+NEIGHBOR_SEARCH = 'NEIGHBORS'
+
+class BehaviourStats(object):
+    """Accumulated timing information for a single behaviour."""
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        """Discard all calls recorded so far."""
+        self.calls = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.total_force = 0.0
+
+    def record(self, elapsed, magnitude=0.0):
+        """Include the results of one call in these statistics."""
+        self.calls += 1
+        self.total_time += elapsed
+        if elapsed > self.max_time:
+            self.max_time = elapsed
+        self.total_force += magnitude
+
+    def as_dict(self):
+        """Get these statistics (including averages) as a dictionary."""
+        if self.calls > 0:
+            avg_time = self.total_time/self.calls
+            avg_force = self.total_force/self.calls
+        else:
+            avg_time = avg_force = 0.0
+        return {'calls': self.calls,
+                'total_time': self.total_time,
+                'max_time': self.max_time,
+                'avg_time': avg_time,
+                'avg_force': avg_force
+               }
+
+class SteeringProfiler(object):
+    """Collects per-behaviour statistics for all SteeringBehavior instances.
+
+    Parameters
+    ----------
+    behaviours: list of string, optional
+        Behaviours to be profiled; defaults to steering.BEHAVIOUR_LIST.
+
+    Notes
+    -----
+    Profiling is global (the module-level dispatch table is shared by every
+    SteeringBehavior), so only one profiler should be enabled at a time.
+    """
+
+    def __init__(self, behaviours=None):
+        if behaviours is None:
+            behaviours = steering.BEHAVIOUR_LIST
+        self.behaviours = list(behaviours)
+        self.enabled = False
+        self._originals = dict()
+        self._neighbor_fnc = None
+        self.stats = {beh: BehaviourStats() for beh in self.behaviours}
+        self.stats[NEIGHBOR_SEARCH] = BehaviourStats()
+
+    def reset(self):
+        """Discard all statistics collected so far.
+
+        The statistics are cleared in place, since the wrappers installed by
+        enable() keep a reference to them.
+        """
+        for stats in self.stats.values():
+            stats.clear()
+
+    def _wrap_force(self, force_fnc, stats):
+        """Get a timed version of a force_foo() function."""
+        def profiled_force(owner, *args):
+            start = timer()
+            result = force_fnc(owner, *args)
+            stats.record(timer() - start, result.norm())
+            return result
+        profiled_force.__doc__ = force_fnc.__doc__
+        return profiled_force
+
+    def _wrap_neighbors(self, flag_fnc, stats):
+        """Get a timed version of SteeringBehavior.flag_neighbor_vehicles."""
+        def profiled_neighbors(behavior, vehlist=[]):
+            start = timer()
+            flag_fnc(behavior, vehlist)
+            stats.record(timer() - start, 0.0)
+        profiled_neighbors.__doc__ = flag_fnc.__doc__
+        return profiled_neighbors
+
+    def enable(self):
+        """Swap timed wrappers into the steering dispatch table."""
+        if self.enabled:
+            return
+        for behaviour in self.behaviours:
+            force_fnc = steering.FORCE_FNC[behaviour]
+            self._originals[behaviour] = force_fnc
+            steering.FORCE_FNC[behaviour] = self._wrap_force(force_fnc, self.stats[behaviour])
+
+        SteeringBehavior = steering.SteeringBehavior
+        self._neighbor_fnc = SteeringBehavior.__dict__['flag_neighbor_vehicles']
+        SteeringBehavior.flag_neighbor_vehicles = self._wrap_neighbors(self._neighbor_fnc, self.stats[NEIGHBOR_SEARCH])
+        self.enabled = True
+
+    def disable(self):
+        """Restore the original steering functions; statistics are kept."""
+        if not self.enabled:
+            return
+        steering.FORCE_FNC.update(self._originals)
+        self._originals = dict()
+        steering.SteeringBehavior.flag_neighbor_vehicles = self._neighbor_fnc
+        self._neighbor_fnc = None
+        self.enabled = False
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.disable()
+        return False
+
+    def as_dict(self, include_unused=False):
+        """Get collected statistics as a dictionary, keyed by behaviour.
+
+        Parameters
+        ----------
+        include_unused: boolean
+            If True, also include behaviours that were never called.
+        """
+        return {beh: stats.as_dict() for (beh, stats) in self.stats.items()
+                if include_unused or stats.calls > 0}
+
+    def to_json(self, include_unused=False, **kwargs):
+        """Get collected statistics as a JSON string; kwargs go to json.dumps."""
+        return json.dumps(self.as_dict(include_unused), sort_keys=True, **kwargs)
+
+    def report(self, include_unused=False):
+        """Get collected statistics as a printable table, slowest first.
+
+        Times are given in milliseconds.
+        """
+        results = self.as_dict(include_unused)
+        order = sorted(results, key=lambda beh: -results[beh]['total_time'])
+        lines = ['%-16s %10s %12s %10s %10s %10s' % ('BEHAVIOUR', 'CALLS', 'TOTAL(ms)',
+                                                  'AVG(ms)', 'MAX(ms)', 'AVG_FORCE')]
+        for beh in order:
+            res = results[beh]
+            lines.append('%-16s %10d %12.3f %10.4f %10.4f %10.3f' % (beh, res['calls'],
+                         1000*res['total_time'], 1000*res['avg_time'],
+                         1000*res['max_time'], res['avg_force']))
+        return '\n'.join(lines)
+
+if __name__ == "__main__":
+    print("Steering behaviour profiler. Import this elsewhere.")
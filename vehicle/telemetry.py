@@ -0,0 +1,198 @@
+# telemetry.py
+"""Columnar telemetry recording for simulations (e.g. fish_logger.py).
+
+A TelemetryRecorder keeps each logged quantity in its own preallocated
+NumPy column, instead of a Python list that grows by one tuple per tick:
+
+* Columns are added by name, with a dtype and a per-sample shape (for
+  example, (2,) for a position).
+* Objects can be added as sources: a source lists its columns with a
+  stats_fields() method, and writes its current values straight into them
+  with stats_write(); see Notes.
+* sample() is called once per tick. With decimate=n, only every n-th tick
+  is recorded. Each recorded row also gets the tick number, in the 'tick'
+  column.
+* In ring mode the columns never grow: once capacity rows are recorded,
+  each new row replaces the oldest. Otherwise the columns double in size
+  whenever they are full, as in VehicleStore.
+
+Recorded data is read back in time order with recorder[name], and all
+columns can be saved at once with save_npz().
+
+Usage::
+
+    recorder = TelemetryRecorder(capacity=5000, decimate=2, ring=True)
+    recorder.add_source('tail', fish.massnodes[1])
+    recorder.add_column('xspeed')
+    # ...each tick:
+    recorder.sample(xspeed=speed)
+    # ...afterwards:
+    plt.plot(recorder['tick'], recorder['tail_pos'][:, 1])
+    recorder.save_npz('fish_log.npz')
+
+Notes
+-----
+A source's stats_fields() returns a sequence of (name, shape) pairs; the
+recorder adds a float column prefix_name for each. stats_write(columns, row)
+is then given those columns (as a tuple, in the same order) and the row to
+fill, so no per-tick tuples or dicts need to be built::
+
+    def stats_fields(self):
+        return (('pos', (2,)), ('vel', (2,)))
+
+    def stats_write(self, columns, row):
+        columns[0][row] = self.pos.ntuple()
+        columns[1][row] = self.vel.ntuple()
+"""
+
+# for python3 compat
+from __future__ import unicode_literals
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import numpy as np
+
+#: Default number of rows a TelemetryRecorder holds (before growing).
+TELEMETRY_CAPACITY = 4096
+
+class TelemetryRecorder(object):
+    """Preallocated columns of per-tick data. See the module notes.
+
+    Parameters
+    ----------
+    capacity: positive int
+        Number of rows to preallocate; in ring mode, the number of most
+        recent rows that are kept.
+    decimate: positive int
+        Record only every decimate-th call to sample().
+    ring: boolean
+        If True, overwrite the oldest rows when full instead of growing.
+    """
+
+    def __init__(self, capacity=TELEMETRY_CAPACITY, decimate=1, ring=False):
+        if capacity < 1 or decimate < 1:
+            raise ValueError('capacity and decimate must be positive')
+        self.capacity = int(capacity)
+        self.decimate = int(decimate)
+        self.ring = ring
+        # Number of calls to sample() so far, and rows written so far
+        self.ticks = 0
+        self.written = 0
+        self.columns = {}
+        self.sources = []
+        self._bound = []
+        self.add_column('tick', dtype=np.int64)
+
+    def __len__(self):
+        """Number of rows currently held."""
+        return min(self.written, self.capacity) if self.ring else self.written
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def add_column(self, name, dtype=float, shape=()):
+        """Add a column, with one value of the given dtype and shape per row.
+
+        Rows recorded before the column was added are zero. The returned
+        array is replaced by a larger one whenever the recorder grows.
+        """
+        if name in self.columns:
+            raise ValueError('Column %r already exists' % name)
+        self.columns[name] = np.zeros((self.capacity,) + tuple(shape), dtype=dtype)
+        return self.columns[name]
+
+    def add_source(self, prefix, obj):
+        """Add an object that writes its own columns; see the module notes.
+
+        Parameters
+        ----------
+        prefix: string
+            Column names for this object are prefix_name.
+        obj: object
+            Anything with stats_fields() and stats_write() methods.
+        """
+        names = []
+        for name, shape in obj.stats_fields():
+            names.append('%s_%s' % (prefix, name))
+            self.add_column(names[-1], shape=shape)
+        self.sources.append((obj, tuple(names)))
+        self._bind_sources()
+
+    def _bind_sources(self):
+        """Look up the columns of each source, once rather than per tick."""
+        self._bound = [(obj, tuple(self.columns[name] for name in names))
+                       for obj, names in self.sources]
+
+    def _grow(self):
+        """Double the capacity of all columns."""
+        for name, old in self.columns.items():
+            new = np.zeros((2*self.capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.capacity] = old
+            self.columns[name] = new
+        self.capacity *= 2
+        self._bind_sources()
+
+    def sample(self, **values):
+        """Record one tick, unless it is skipped by decimation.
+
+        Parameters
+        ----------
+        values: keyword arguments
+            Values for other (non-source) columns; these columns must have
+            been added with add_column().
+
+        Returns
+        -------
+        int or None:
+            The row written, or None if this tick was not recorded.
+        """
+        tick = self.ticks
+        self.ticks += 1
+        if tick % self.decimate:
+            return None
+        if self.ring:
+            row = self.written % self.capacity
+        else:
+            if self.written == self.capacity:
+                self._grow()
+            row = self.written
+        self.written += 1
+
+        columns = self.columns
+        columns['tick'][row] = tick
+        for obj, source_columns in self._bound:
+            obj.stats_write(source_columns, row)
+        for name, value in values.items():
+            columns[name][row] = value
+        return row
+
+    def __getitem__(self, name):
+        """Recorded values of a column, oldest first."""
+        column = self.columns[name]
+        if self.ring and self.written > self.capacity:
+            start = self.written % self.capacity
+            return np.concatenate((column[start:], column[:start]))
+        return column[:len(self)]
+
+    def clear(self):
+        """Discard all recorded rows (columns and sources are kept)."""
+        self.ticks = 0
+        self.written = 0
+
+    def save_npz(self, path, compressed=True):
+        """Save all recorded columns (oldest first) to a NumPy .npz file.
+
+        The decimate and ring settings are saved as well, under the names
+        _decimate and _ring.
+        """
+        data = dict((name, self[name]) for name in self.columns)
+        data['_decimate'] = self.decimate
+        data['_ring'] = self.ring
+        if compressed:
+            np.savez_compressed(path, **data)
+        else:
+            np.savez(path, **data)
+
+if __name__ == "__main__":
+    print("Columnar telemetry recording. Import this elsewhere.")
@@ -0,0 +1,229 @@
+# trajectory.py
+"""Record and replay vehicle trajectories.
+
+TrajectoryRecorder appends the state of every body (by default pos, vel and
+front) to a file once per tick. TrajectoryReplay memory-maps that file, so
+that any tick can be read in O(1) time, and can drive bodies (and so their
+sprites) without running any steering or physics.
+
+File format
+-----------
+A fixed-size header (HEADER_SIZE bytes) is followed by one record per tick.
+Each record is an array of shape (fields, bodies, 2), so the file as a whole
+is an array of shape (ticks, fields, bodies, 2) and a single field over all
+ticks, such as replay.field('pos'), is an ordinary strided NumPy array
+suitable for offline analysis. Files are append-only; reopening an existing
+file with TrajectoryRecorder continues where it left off.
+
+Usage::
+
+    recorder = TrajectoryRecorder('run.trj', vehicles)
+    world.add_update(recorder.record)  # Or call record() once per tick
+    ...
+    recorder.close()
+
+    replay = TrajectoryReplay('run.trj')
+    replay.apply(vehicles, tick=500)   # Jump straight to tick 500
+"""
+
+# for python3 compat
+from __future__ import unicode_literals
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import os, struct
+
+import numpy as np
+
+from point2d import Point2d
+from vehicle_store import VehicleStore
+
+#: Magic bytes at the start of every trajectory file.
+TRAJECTORY_MAGIC = b'VTRJ'
+
+#: Format version stored in each trajectory file.
+TRAJECTORY_VERSION = 1
+
+#: Size of the file header, in bytes; records start at this offset.
+HEADER_SIZE = 256
+
+#: Default fields to record; any (N,2) body attributes may be used.
+RECORD_FIELDS = ('pos', 'vel', 'front')
+
+# Header: magic, version, number of bodies, number of fields, dtype string
+_HEADER = struct.Struct('<4sIII8s')
+_FIELD_NAME = struct.Struct('<16s')
+
+def _pack_header(n_bodies, fields, dtype):
+    header = _HEADER.pack(TRAJECTORY_MAGIC, TRAJECTORY_VERSION, n_bodies,
+                          len(fields), dtype.str.encode('ascii'))
+    header += b''.join(_FIELD_NAME.pack(f.encode('ascii')) for f in fields)
+    if len(header) > HEADER_SIZE:
+        raise ValueError('Too many fields for trajectory header: %s' % (fields,))
+    return header.ljust(HEADER_SIZE, b'\0')
+
+def _unpack_header(header):
+    """Get (n_bodies, fields, dtype) from a trajectory file header."""
+    magic, version, n_bodies, n_fields, dtype = _HEADER.unpack_from(header)
+    if magic != TRAJECTORY_MAGIC:
+        raise ValueError('Not a trajectory file')
+    if version != TRAJECTORY_VERSION:
+        raise ValueError('Unsupported trajectory version %d' % version)
+    fields = []
+    for i in range(n_fields):
+        name = _FIELD_NAME.unpack_from(header, _HEADER.size + i*_FIELD_NAME.size)[0]
+        fields.append(name.rstrip(b'\0').decode('ascii'))
+    return n_bodies, tuple(fields), np.dtype(dtype.rstrip(b'\0').decode('ascii'))
+
+class TrajectoryRecorder(object):
+    """Appends per-tick body state to a trajectory file.
+
+    Parameters
+    ----------
+    filename: string
+        File to record to; if it exists, new ticks are appended (and the
+        bodies and fields must match the existing header).
+    bodies: list of BasePointMass2d, or VehicleStore
+        Bodies to record, in a fixed order.
+    fields: tuple of string
+        Vector attributes to record for each body.
+    dtype: numpy.dtype
+        Storage type; float32 halves the file size.
+    """
+
+    def __init__(self, filename, bodies, fields=RECORD_FIELDS, dtype=np.float64):
+        self.bodies = bodies
+        self.fields = tuple(fields)
+        self.dtype = np.dtype(dtype)
+        if isinstance(bodies, VehicleStore):
+            n_bodies = bodies.count
+        else:
+            n_bodies = len(bodies)
+        self.record_shape = (len(self.fields), n_bodies, 2)
+        self.buffer = np.zeros(self.record_shape, dtype=self.dtype)
+
+        header = _pack_header(n_bodies, self.fields, self.dtype)
+        if os.path.exists(filename) and os.path.getsize(filename) > 0:
+            with open(filename, 'rb') as old:
+                old_header = old.read(HEADER_SIZE)
+            if old_header != header:
+                raise ValueError('Cannot append to %s: bodies or fields differ' % filename)
+            self.outfile = open(filename, 'ab')
+        else:
+            self.outfile = open(filename, 'wb')
+            self.outfile.write(header)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def record(self):
+        """Append the current state of all bodies as a new tick."""
+        buf = self.buffer
+        bodies = self.bodies
+        if isinstance(bodies, VehicleStore):
+            for i, field in enumerate(self.fields):
+                buf[i] = bodies.active(field)
+        else:
+            for i, field in enumerate(self.fields):
+                buf[i] = [getattr(body, field).ntuple() for body in bodies]
+        self.outfile.write(buf.tobytes())
+
+    def flush(self):
+        """Flush recorded ticks to disk, e.g. before replaying them."""
+        self.outfile.flush()
+
+    def close(self):
+        """Close the trajectory file."""
+        self.outfile.close()
+
+class TrajectoryReplay(object):
+    """Memory-mapped playback of a trajectory file.
+
+    Parameters
+    ----------
+    filename: string
+        Trajectory file, as written by TrajectoryRecorder.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, 'rb') as infile:
+            self.n_bodies, self.fields, self.dtype = _unpack_header(infile.read(HEADER_SIZE))
+        self.field_index = {field: i for i, field in enumerate(self.fields)}
+        self.tick = 0
+        self.refresh()
+
+    def refresh(self):
+        """Re-map the file, to pick up ticks recorded since it was opened."""
+        record_shape = (len(self.fields), self.n_bodies, 2)
+        record_size = int(np.prod(record_shape))*self.dtype.itemsize
+        ticks = (os.path.getsize(self.filename) - HEADER_SIZE)//max(record_size, 1)
+        if ticks > 0:
+            self.data = np.memmap(self.filename, dtype=self.dtype, mode='r',
+                                  offset=HEADER_SIZE, shape=(ticks,) + record_shape)
+        else:
+            self.data = np.zeros((0,) + record_shape, dtype=self.dtype)
+
+    def __len__(self):
+        return len(self.data)
+
+    def field(self, name):
+        """Get one field for all ticks, as an array of shape (ticks, bodies, 2)."""
+        return self.data[:, self.field_index[name]]
+
+    def frame(self, tick):
+        """Get the record for a tick, as an array of shape (fields, bodies, 2)."""
+        return self.data[tick]
+
+    def seek(self, tick):
+        """Set the current tick (negative values count from the end)."""
+        if tick < 0:
+            tick += len(self.data)
+        if not 0 <= tick < len(self.data):
+            raise IndexError('Tick %d out of range (%d ticks recorded)' % (tick, len(self.data)))
+        self.tick = tick
+
+    def apply(self, bodies, tick=None):
+        """Set the state of bodies from the current (or given) tick.
+
+        Parameters
+        ----------
+        bodies: list of BasePointMass2d, or VehicleStore
+            Bodies to update, in the order they were recorded.
+        tick: int, optional
+            If given, seek to this tick first.
+
+        Notes
+        -----
+        If front was recorded, left is also updated to match. Call update()
+        for the bodies' sprites afterwards, as usual.
+        """
+        if tick is not None:
+            self.seek(tick)
+        record = self.data[self.tick]
+        if isinstance(bodies, VehicleStore):
+            for i, field in enumerate(self.fields):
+                bodies.active(field)[:] = record[i]
+            if 'front' in self.field_index:
+                front = record[self.field_index['front']]
+                left = bodies.active('left')
+                left[:, 0] = -front[:, 1]
+                left[:, 1] = front[:, 0]
+            return
+        for i, field in enumerate(self.fields):
+            for body, (x, y) in zip(bodies, record[i].tolist()):
+                setattr(body, field, Point2d(x, y))
+        if 'front' in self.field_index:
+            for body in bodies:
+                body.left = body.front.left_normal()
+
+    def step(self, bodies, ticks=1):
+        """Advance by some number of ticks (stopping at the end) and apply."""
+        self.apply(bodies, min(self.tick + ticks, len(self.data) - 1))
+
+if __name__ == "__main__":
+    print("Trajectory recorder/replayer. Import this elsewhere.")
@@ -1,6 +1,11 @@
 # vehicle2d.py
 """Module containing Vehicle/Obstacle classes, for use with Pygame.
 
+The classes here contain physics only, so they can be imported and simulated
+without pygame. Rendering is done by the optional sprite classes found in
+sprites2d.py, which (along with pygame) is imported the first time a sprite
+is actually requested; see BasePointMass2d and BaseWall2d for details.
+
 TODO: Write a better docstring for this module.
 """
 
@@ -10,8 +15,7 @@ from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import division
 
-import os, sys, pygame, copy
-from pygame.locals import RLEACCEL
+import sys, copy
 
 INF = float('inf')
 
@@ -23,59 +27,113 @@ from steering import SteeringBehavior
 
 from steering_constants import BASEPOINTMASS2D_DEFAULTS, SIMPLERIGIDBODY2D_DEFAULTS
 
-# Point2d functions return radians, but pygame wants degrees. The negative
-# is needed since y coordinates increase downwards on screen. Multiply a
-# math radians result by SCREEN_DEG to get pygame screen-appropriate degrees.
-SCREEN_DEG = -57.2957795131
-
 #: A BasePointMass2d has velocity-aligned heading. However, if the speed is
 #: almost zero (squared speed is below this threshold), we skip alignment in
 #: order to avoid jittery behaviour.
 SPEED_EPSILON = .000000001
 
-def load_pygame_image(name, colorkey=None):
-    """Loads image from current working directory for use in pygame.
+class PhysicsProfile(object):
+    """Shared, immutable physics parameters for BasePointMass2d and children.
 
     Parameters
     ----------
-    name: string
-        Image file to load (must be pygame-compatible format)
-    colorkey: pygame.Color
-        Used to set a background color for this image that will be ignored
-        during blitting. If set to -1, the upper-left pixel color will be
-        used as the background color. See pygame.Surface.set_colorkey() for
-        further details.
-
-    Returns
-    -------
-    (pygame.Surface, pygame.rect):
-        For performance reasons, the returned Surface is the same format as
-        the pygame display. The alpha channel is removed.
+    mass: positive float
+        Mass of the body.
+    maxspeed: positive float
+        Maximum speed (INF for no limit).
+    maxforce: positive float
+        Maximum force applied per update (INF for no limit).
+    inertia: positive float
+        Rotational inertia (SimpleRigidBody2d only).
+    maxomega: positive float
+        Maximum angular velocity (SimpleRigidBody2d only).
+    maxtorque: positive float
+        Maximum torque applied per update (SimpleRigidBody2d only).
+
+    Notes
+    -----
+    Unspecified parameters are taken from steering_constants.py. A profile is
+    given to the constructor of each body, which copies these values into its
+    own attributes (so owner.maxspeed = 2.0 still works for a single body).
+    Profiles can't be modified; use replace() to get a modified copy. Since
+    profiles are hashable, bodies can be grouped by profile for batch
+    physics; see integrators.move_grouped().
+    """
+
+    __slots__ = ('mass', 'maxspeed', 'maxforce', 'inertia', 'maxomega', 'maxtorque')
+
+    def __init__(self, mass=BASEPOINTMASS2D_DEFAULTS['MASS'],
+                 maxspeed=BASEPOINTMASS2D_DEFAULTS['MAXSPEED'],
+                 maxforce=BASEPOINTMASS2D_DEFAULTS['MAXFORCE'],
+                 inertia=SIMPLERIGIDBODY2D_DEFAULTS['INERTIA'],
+                 maxomega=SIMPLERIGIDBODY2D_DEFAULTS['MAXOMEGA'],
+                 maxtorque=SIMPLERIGIDBODY2D_DEFAULTS['MAXTORQUE']):
+        for (name, value) in zip(PhysicsProfile.__slots__, (mass, maxspeed, maxforce, inertia, maxomega, maxtorque)):
+            if not value > 0:
+                raise ValueError('Physics parameter %s must be positive, not %s' % (name, value))
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('PhysicsProfile is immutable; use replace() instead.')
+
+    def __delattr__(self, name):
+        raise AttributeError('PhysicsProfile is immutable.')
+
+    def astuple(self):
+        """Get all parameters, in the order of the constructor arguments."""
+        return tuple(getattr(self, name) for name in PhysicsProfile.__slots__)
+
+    def replace(self, **kwargs):
+        """Get a new profile, with the given parameters changed."""
+        params = dict(zip(PhysicsProfile.__slots__, self.astuple()))
+        params.update(kwargs)
+        return PhysicsProfile(**params)
+
+    # Immutable, so copies can share the original
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (PhysicsProfile, self.astuple())
+
+    def __eq__(self, other):
+        return isinstance(other, PhysicsProfile) and self.astuple() == other.astuple()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.astuple())
+
+    def __repr__(self):
+        params = ', '.join('%s=%s' % pair for pair in zip(PhysicsProfile.__slots__, self.astuple()))
+        return 'PhysicsProfile(%s)' % params
+
+#: Profile used by bodies created without an explicit profile.
+DEFAULT_PROFILE = PhysicsProfile()
+
+def load_pygame_image(name, colorkey=None):
+    """Loads image from current working directory for use in pygame.
+
+    This imports pygame; see sprites2d.load_pygame_image() for details.
 
     Note
     ----
     TODO: This function is imported by the demos, but perhaps there is a
     better location for it?
-
     """
-    imagefile = os.path.join(os.getcwd(), name)
-    try:
-        image_surf = pygame.image.load(imagefile)
-    except pygame.error as message:
-        print('Error: Cannot load image file: %s' % name)
-        print('Current working directory is: %s' % os.getcwd())
-        raise SystemExit(message)
-
-    # This converts the surface for maximum blitting performance,
-    # including removal of any alpha channel:
-    image_surf = image_surf.convert()
-
-    # This sets the background (ignored during blit) color:
-    if colorkey is not None:
-        if colorkey is -1:
-            colorkey = image_surf.get_at((0,0))
-        image_surf.set_colorkey(colorkey, RLEACCEL)
-    return image_surf, image_surf.get_rect()
+    import sprites2d
+    return sprites2d.load_pygame_image(name, colorkey)
+
+def __getattr__(name):
+    """Sprite classes used to live here; import them from sprites2d on demand."""
+    if name == 'PointMass2dSprite':
+        import sprites2d
+        return sprites2d.PointMass2dSprite
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
 
 class BaseWall2d(object):
     """A base class for static wall-type obstacles.
@@ -93,36 +151,16 @@ class BaseWall2d(object):
         Normal vector out from the front of the wall.
     color: 3-tuple or pygame.Color, optional
         Color for rendering. Defaults to (0,0,0)
-    """
 
-    class BaseWall2dSprite(pygame.sprite.Sprite):
-        """Pygame Sprite for rendering BaseWall2d objects."""
-
-        def __init__(self, owner, color=None):
-            # Must call pygame's Sprite.__init__ first!
-            pygame.sprite.Sprite.__init__(self)
-
-            # Set-up sprite image
-            self.image = pygame.Surface((owner.length, owner.thick))
-            self.image.set_colorkey((255,0,255))
-            if color == None:
-                self.color = (0,0,0)
-            self.image.fill(self.color)
-            self.rect = self.image.get_rect()
-
-            # Put into place for rendering
-            self.image = pygame.transform.rotate(self.image, owner.theta)
-            self.rect = self.image.get_rect()
-            self.rect.center = owner.pos[0], owner.pos[1]
-
-        def update(self, delta_t=1.0):
-            """Update placeholder for pygame.Sprite parent class. Does nothing."""
-            pass
+    Notes
+    -----
+    The sprite attribute (a sprites2d.Wall2dSprite) is created the first time
+    it is accessed, so walls used only for physics never touch pygame.
+    """
 
     def __init__(self, center, length, thick, f_normal, color=None):
         # Positional data
         self.pos = Point2d(center[0], center[1])
-        self.theta = f_normal.angle()*SCREEN_DEG -90
         self.front = f_normal.unit()
         self.left = self.front.left_normal()
         self.rsq = (length/2)**2
@@ -130,39 +168,18 @@ class BaseWall2d(object):
         self.length = length
         self.thick = thick
 
-        # Wall sprite
-        self.sprite = BaseWall2d.BaseWall2dSprite(self, color)
-
-
-class PointMass2dSprite(pygame.sprite.Sprite):
-    """A Pygame sprite used to display a BasePointMass2d object."""
+        # Wall sprite is only created when needed; see Notes
+        self.color = color
+        self._sprite = None
 
-    def __init__(self, owner, img_surf, img_rect):
-        # Must call pygame's Sprite.__init__ first!
-        pygame.sprite.Sprite.__init__(self)
+    @property
+    def sprite(self):
+        """Pygame sprite for this wall, created on first access."""
+        if self._sprite is None:
+            import sprites2d
+            self._sprite = sprites2d.Wall2dSprite(self, self.color)
+        return self._sprite
 
-        self.owner = owner
-
-        # Pygame image information for blitting
-        self.orig = img_surf
-        self.image = img_surf
-        # This lets us share image sources!
-        self.rect = img_rect.copy()
-        self.rect.center = owner.pos[0], owner.pos[1]
-        # Only needed if we're use pygame Sprite collision
-        self.radius = owner.radius
-
-    def update(self, delta_t=1.0):
-        """Called by pygame.Group.update() to redraw this sprite."""
-        owner = self.owner
-        # Update position
-        self.rect.center = owner.pos[0], owner.pos[1]
-        # Rotate for blitting
-        theta = owner.front.angle()*SCREEN_DEG
-        center = self.rect.center
-        self.image = pygame.transform.rotate(self.orig, theta)
-        self.rect = self.image.get_rect()
-        self.rect.center = center
 
 class BasePointMass2d(object):
     """A moving object with rectilinear motion and optional sprite.
@@ -177,6 +194,9 @@ class BasePointMass2d(object):
         Velocity vector, in screen coordinates. Initial facing matches this.
     spritedata: list or tuple, optional
         Extra data used to create an associate sprite. See notes below.
+    profile: PhysicsProfile, optional
+        Mass and movement limits; if unspecified, use DEFAULT_PROFILE (as
+        changed by set_physics_defaults(), if at all).
 
     Notes
     -----
@@ -187,16 +207,15 @@ class BasePointMass2d(object):
     As we typically will be rendering these objects within some environment,
     the constructor provides an optional spritedata parameter that can be used
     to create an associated sprite. This is currently implemented using the
-    PointMass2dSprite class above (derived from pygame.sprite.Sprite), but
-    can be overridden by changing the _spriteclass attribute.
+    sprites2d.PointMass2dSprite class (derived from pygame.sprite.Sprite), but
+    can be overridden by changing the _spriteclass attribute. If spritedata
+    is None, no sprite is created and pygame is never imported.
     """
     
-    _spriteclass = PointMass2dSprite
-    """Default sprite class to use for rendering."""
-    
-    _PHYSICS_DEFAULTS = copy.copy(BASEPOINTMASS2D_DEFAULTS)
+    _spriteclass = None
+    """Sprite class to use for rendering; None uses sprites2d.PointMass2dSprite."""
 
-    def __init__(self, position, radius, velocity, spritedata=None):
+    def __init__(self, position, radius, velocity, spritedata=None, profile=None):
         # Basic object physics
         self.pos = copy.copy(position)  # Center of object
         self.radius = radius            # Bounding radius
@@ -213,12 +232,18 @@ class BasePointMass2d(object):
         self.left = Point2d(-self.front[1], self.front[0])
 
         # Movement constraints (defaults from steering_constants.py)
-        ## TODO: Put these in the function argument, perhaps as **kwargs
-        self.mass = BasePointMass2d._PHYSICS_DEFAULTS['MASS']
-        self.maxspeed = BasePointMass2d._PHYSICS_DEFAULTS['MAXSPEED']
-        self.maxforce = BasePointMass2d._PHYSICS_DEFAULTS['MAXFORCE']
+        if profile is None:
+            profile = DEFAULT_PROFILE
+        self.profile = profile
+        self.mass = profile.mass
+        self.maxspeed = profile.maxspeed
+        self.maxforce = profile.maxforce
         if spritedata is not None:
-            self.sprite = BasePointMass2d._spriteclass(self, *spritedata)
+            spriteclass = BasePointMass2d._spriteclass
+            if spriteclass is None:
+                import sprites2d
+                spriteclass = sprites2d.PointMass2dSprite
+            self.sprite = spriteclass(self, *spritedata)
 
     def accumulate_force(self, force_vector):
         """Add a new force to what's already been accumulated.
@@ -266,27 +291,31 @@ class BasePointMass2d(object):
         self.pos = self.pos + self.vel.scm(delta_t)
 
         # If no force_vector was given, use self-accumulated force.
+        # Note: Vector attributes are always replaced rather than modified in
+        # place, so that this also works for vehicle_store views.
         if force_vector is None:
-            force_vector = copy.copy(self.accumulated_force)
-            self.accumulated_force.zero()
+            force_vector = self.accumulated_force
+            self.accumulated_force = Point2d(0,0)
         # Don't exceed our maximum force; compute acceleration
         force_vector.truncate(self.maxforce)
         accel = force_vector.scm(delta_t/self.mass)
         # Compute new velocity, but don't exceed maximum speed.
-        self.vel = self.vel + accel
-        self.vel.truncate(self.maxspeed)
+        vel = self.vel + accel
+        vel.truncate(self.maxspeed)
+        self.vel = vel
 
         # Align heading to match our forward velocity. Note that
         # if velocity is very small, skip this to avoid jittering.
-        if self.vel.sqnorm() > SPEED_EPSILON:
-            self.front = self.vel.unit()
-            self.left = Point2d(-self.front[1], self.front[0])
+        if vel.sqnorm() > SPEED_EPSILON:
+            front = vel.unit()
+            self.front = front
+            self.left = Point2d(-front[1], front[0])
 
 class SimpleVehicle2d(BasePointMass2d):
     """Point mass with steering behaviour."""
 
-    def __init__(self, position, radius, velocity, spritedata=None):
-        BasePointMass2d.__init__(self, position, radius, velocity, spritedata)
+    def __init__(self, position, radius, velocity, spritedata=None, profile=None):
+        BasePointMass2d.__init__(self, position, radius, velocity, spritedata, profile)
         # Steering behavior class for this object.
         self.steering = SteeringBehavior(self)
 
@@ -315,27 +344,22 @@ class SimpleRigidBody2d(BasePointMass2d):
     from BasePointMass2d in order to avoid duplicating or refactoring code.
     """
     
-    # Additional defaults are added to parent class (BasePointMass2d) 
-    BasePointMass2d._PHYSICS_DEFAULTS.update(**SIMPLERIGIDBODY2D_DEFAULTS)
-    
-    def __init__(self, position, radius, velocity, beta, omega, spritedata=None):
+    def __init__(self, position, radius, velocity, beta, omega, spritedata=None, profile=None):
 
         # Use parent class for non-rotational stuff
-        BasePointMass2d.__init__(self, position, radius, velocity, spritedata)
+        BasePointMass2d.__init__(self, position, radius, velocity, spritedata, profile)
 
         # Rotational inertia and rotational velocity (degrees[??] per time)
-        self.inertia = BasePointMass2d._PHYSICS_DEFAULTS['INERTIA']
+        profile = self.profile
+        self.inertia = profile.inertia
         self.omega = omega
-        self.maxomega = BasePointMass2d._PHYSICS_DEFAULTS['MAXOMEGA']
-        self.maxtorque = BasePointMass2d._PHYSICS_DEFAULTS['MAXTORQUE']
+        self.maxomega = profile.maxomega
+        self.maxtorque = profile.maxtorque
 
         # Adjust facing (beta is measured relative to direction of velocity)
         self.front = self.front.rotated_by(beta)
         self.left = self.front.left_normal()
 
-        if spritedata is not None:
-            self.sprite = PointMass2dSprite(self, *spritedata)
-
     def move(self, delta_t=1.0, force_vector=None):
         """Updates position, velocity, and acceleration.
 
@@ -356,13 +380,15 @@ class SimpleRigidBody2d(BasePointMass2d):
         self.pos = self.pos + self.vel.scm(delta_t)
 
         # Apply force, if any...
+        vel = self.vel
         if force_vector:
             # Don't exceed our maximum force; compute acceleration/velocity
             force_vector.truncate(self.maxforce)
             accel = force_vector.scm(delta_t/self.mass)
-            self.vel = self.vel + accel
+            vel = vel + accel
         # ..but don't exceed our maximum speed
-        self.vel.truncate(self.maxspeed)
+        vel.truncate(self.maxspeed)
+        self.vel = vel
 
     def rotate(self, delta_t=1.0, torque=0):
         """Updates heading, angular velocity, and torque.
@@ -388,13 +414,22 @@ class SimpleRigidBody2d(BasePointMass2d):
         self.omega = max(min(omega, self.maxomega), -self.maxomega)
 
 def set_physics_defaults(**kwargs):
-    """Change default physics parameters for children of BasePointMass2d."""
-    available = BasePointMass2d._PHYSICS_DEFAULTS.keys()
+    """Change default physics parameters for children of BasePointMass2d.
+
+    Parameters are given in upper case (MASS, MAXSPEED, etc.). This replaces
+    DEFAULT_PROFILE with a modified copy, so it affects only bodies created
+    afterwards without an explicit profile. Library modules should not call
+    this; define a PhysicsProfile and pass it to constructors instead.
+    """
+    global DEFAULT_PROFILE
+    available = PhysicsProfile.__slots__
+    changes = dict()
     for (default, value) in kwargs.items():
-        if default in available and value > 0:
-            BasePointMass2d._PHYSICS_DEFAULTS[default] = value
+        if default.lower() in available and value > 0:
+            changes[default.lower()] = value
         else:
             print('Warning: Physics default %s is unavailable.' % default)
+    DEFAULT_PROFILE = DEFAULT_PROFILE.replace(**changes)
             
 if __name__ == "__main__":
     print("Two-Dimensional Vehicle/Obstacle Classes and Functions. Import this elsewhere.")
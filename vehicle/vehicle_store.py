@@ -0,0 +1,181 @@
+# vehicle_store.py
+"""Struct-of-arrays storage for BasePointMass2d-derived bodies.
+
+A VehicleStore keeps the state of many bodies in contiguous NumPy arrays:
+
+* Vectors (N,2): pos, vel, front, left, accumulated_force
+* Scalars (N,): radius, mass, maxspeed, maxforce
+
+Bodies created with a class from stored_class() are thin views: the vector
+and scalar attributes above are properties that read from and write to the
+store, so existing code (owner.pos, owner.front, owner.maxspeed = 5.0, etc.)
+keeps working unchanged, while world-level code can operate on the arrays
+of all bodies at once.
+
+Usage::
+
+    store = VehicleStore()
+    StoredVehicle2d = stored_class(SimpleVehicle2d)
+    veh = StoredVehicle2d(store, position, radius, velocity)
+    store.pos[:len(store)] # Positions of all bodies
+
+Note
+----
+Reading a vector attribute returns a new Point2d copy of the stored values,
+just as BasePointMass2d.move() replaces these attributes with new Point2d
+objects each update. Modifying the returned Point2d in place (for example,
+owner.vel.truncate(1.0)) does not change the store; assign the result to
+the attribute instead.
+"""
+
+# for python3 compat
+from __future__ import unicode_literals
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import numpy as np
+
+from point2d import Point2d
+
+#: Initial number of bodies a VehicleStore can hold before it is resized.
+STORE_CAPACITY = 256
+
+#: Vector attributes (stored as rows of an (N,2) array).
+VECTOR_FIELDS = ('pos', 'vel', 'front', 'left', 'accumulated_force')
+
+#: Scalar attributes (stored as entries of an (N,) array).
+SCALAR_FIELDS = ('radius', 'mass', 'maxspeed', 'maxforce')
+
+class VehicleStore(object):
+    """Contiguous NumPy storage for the physics state of many bodies.
+
+    Parameters
+    ----------
+    capacity: positive int
+        Initial number of bodies; the arrays double in size when full.
+
+    Notes
+    -----
+    Only the first len(store) rows of each array are in use; slice arrays
+    with store.active(field) (or [:len(store)]) before using them. Arrays are
+    reallocated when the store grows, so don't hold on to them across calls
+    to add().
+    """
+
+    def __init__(self, capacity=STORE_CAPACITY):
+        self.capacity = capacity
+        self.count = 0
+        self.bodies = []
+        for field in VECTOR_FIELDS:
+            setattr(self, field, np.zeros((capacity, 2)))
+        for field in SCALAR_FIELDS:
+            setattr(self, field, np.zeros(capacity))
+
+    def __len__(self):
+        return self.count
+
+    def _grow(self):
+        """Double the capacity of all arrays."""
+        new_capacity = 2*self.capacity
+        for field in VECTOR_FIELDS + SCALAR_FIELDS:
+            old = getattr(self, field)
+            new = np.zeros((new_capacity,) + old.shape[1:])
+            new[:self.count] = old[:self.count]
+            setattr(self, field, new)
+        self.capacity = new_capacity
+
+    def add(self, body):
+        """Reserve a row for a new body and return its index."""
+        if self.count == self.capacity:
+            self._grow()
+        index = self.count
+        for field in VECTOR_FIELDS:
+            getattr(self, field)[index] = 0.0
+        for field in SCALAR_FIELDS:
+            getattr(self, field)[index] = 0.0
+        self.bodies.append(body)
+        self.count += 1
+        return index
+
+    def remove(self, body):
+        """Remove a body, moving the last body into its row."""
+        index = body._index
+        last = self.count - 1
+        if index != last:
+            for field in VECTOR_FIELDS + SCALAR_FIELDS:
+                arr = getattr(self, field)
+                arr[index] = arr[last]
+            moved = self.bodies[last]
+            moved._index = index
+            self.bodies[index] = moved
+        self.bodies.pop()
+        self.count = last
+        body._store = None
+
+    def active(self, field):
+        """Get the in-use part of the array for a given field."""
+        return getattr(self, field)[:self.count]
+
+def _vector_property(field):
+    """Property for a Point2d attribute backed by a VehicleStore."""
+    def getter(self):
+        row = getattr(self._store, field)[self._index]
+        return Point2d(row[0], row[1])
+    def setter(self, value):
+        getattr(self._store, field)[self._index] = (value[0], value[1])
+    return property(getter, setter, doc="%s (stored in a VehicleStore)" % field)
+
+def _scalar_property(field):
+    """Property for a float attribute backed by a VehicleStore."""
+    def getter(self):
+        return float(getattr(self._store, field)[self._index])
+    def setter(self, value):
+        getattr(self._store, field)[self._index] = value
+    return property(getter, setter, doc="%s (stored in a VehicleStore)" % field)
+
+class StoreBacked(object):
+    """Mixin that keeps a body's physics state in a VehicleStore.
+
+    Use stored_class() rather than deriving from this directly. The store
+    is given as an extra first argument to the constructor; all remaining
+    arguments are passed on to the original class.
+    """
+
+    def __init__(self, store, *args, **kwargs):
+        # Must register with the store before any attributes are assigned
+        self._store = store
+        self._index = store.add(self)
+        super(StoreBacked, self).__init__(*args, **kwargs)
+
+for _field in VECTOR_FIELDS:
+    setattr(StoreBacked, _field, _vector_property(_field))
+for _field in SCALAR_FIELDS:
+    setattr(StoreBacked, _field, _scalar_property(_field))
+
+_STORED_CLASSES = dict()
+
+def stored_class(cls):
+    """Get a version of a BasePointMass2d-derived class backed by a store.
+
+    Parameters
+    ----------
+    cls: class
+        BasePointMass2d or any class derived from it.
+
+    Returns
+    -------
+    class:
+        Subclass of cls whose constructor takes a VehicleStore as an extra
+        first argument. The same subclass is returned on repeated calls.
+    """
+    try:
+        return _STORED_CLASSES[cls]
+    except KeyError:
+        name = str('Stored' + cls.__name__)
+        stored = type(name, (StoreBacked, cls), {'__doc__': cls.__doc__})
+        _STORED_CLASSES[cls] = stored
+        return stored
+
+if __name__ == "__main__":
+    print("Struct-of-arrays vehicle store. Import this elsewhere.")
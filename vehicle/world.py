@@ -0,0 +1,204 @@
+# world.py
+"""Fixed-timestep simulation runner for vehicles and other bodies.
+
+A World owns a fixed physics step, so that simulation speed no longer
+depends on how fast frames are rendered:
+
+* Each physics step moves every body by the same delta_t, optionally
+  resolves contacts with walls and obstacles (see contacts.py), then calls
+  any extra per-step updates (such as Formation.update).
+* advance() is called once per rendered frame. It runs as many physics steps
+  as needed to keep up with real time, up to a catch-up limit, and returns
+  an interpolation alpha for the renderer.
+* run_headless() steps the simulation as fast as possible, without any real
+  time clock, which is useful for measuring raw simulation throughput.
+
+Usage::
+
+    world = World(delta_t=0.2)
+    world.add(*vehicles)
+    world.add_update(formation.update)
+    # ...in the main loop, once per frame:
+    alpha = world.advance()
+    for veh in vehicles:
+        veh.sprite.rect.center = world.lerp_pos(veh, alpha).ntuple()
+"""
+
+# for python3 compat
+from __future__ import unicode_literals
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+from time import sleep
+from timeit import default_timer
+
+#: Default number of physics steps per second of real time.
+STEP_RATE = 60
+
+#: Default maximum number of physics steps run by a single advance(); any
+#: further backlog is dropped so the simulation doesn't spiral behind.
+MAX_CATCHUP_STEPS = 5
+
+class World(object):
+    """Fixed-timestep simulation loop.
+
+    Parameters
+    ----------
+    delta_t: float
+        Simulation time per physics step; this is passed to move().
+    step_rate: positive float
+        Number of physics steps per second of real time.
+    max_steps: positive int
+        Maximum number of steps to run in a single call to advance().
+    clock: function, optional
+        Returns the current real time in seconds; defaults to
+        timeit.default_timer.
+    contacts: contacts.ContactResolver, optional
+        If given, this is used after each step to stop bodies from passing
+        through walls and obstacles, which allows larger values of delta_t.
+    """
+
+    def __init__(self, delta_t=1.0, step_rate=STEP_RATE, max_steps=MAX_CATCHUP_STEPS, clock=default_timer,
+                 contacts=None):
+        self.delta_t = delta_t
+        self.contacts = contacts
+        self.step_interval = 1.0/step_rate
+        self.max_steps = max_steps
+        self.clock = clock
+        self.bodies = []
+        self.updates = []
+        self.previous = []
+        # Simulation progress
+        self.ticks = 0
+        self.sim_time = 0.0
+        # Real-time bookkeeping for advance()
+        self.accumulator = 0.0
+        self.last_time = None
+        self.dropped_time = 0.0
+
+    def add(self, *bodies):
+        """Add bodies to be moved each physics step, in the given order."""
+        for body in bodies:
+            self.bodies.append(body)
+            self.previous.append(body.pos)
+
+    def remove(self, body):
+        """Remove a body from this world."""
+        index = self.bodies.index(body)
+        del self.bodies[index]
+        del self.previous[index]
+
+    def add_update(self, func):
+        """Add a function to be called (with no arguments) after each step."""
+        self.updates.append(func)
+
+    def step(self):
+        """Run a single physics step."""
+        delta_t = self.delta_t
+        self.previous = [body.pos for body in self.bodies]
+        for body in self.bodies:
+            body.move(delta_t)
+        if self.contacts is not None:
+            self.contacts.resolve(self.bodies, self.previous)
+        self.ticks += 1
+        self.sim_time += delta_t
+        for func in self.updates:
+            func()
+
+    def reset_clock(self):
+        """Restart real-time bookkeeping, e.g. after a pause."""
+        self.accumulator = 0.0
+        self.last_time = None
+
+    def advance(self):
+        """Catch up with real time; call once per rendered frame.
+
+        Returns
+        -------
+        float:
+            Interpolation alpha in [0,1): the fraction of a physics step
+            that has elapsed since the most recent step. See lerp_pos().
+
+        Notes
+        -----
+        The first call only starts the clock. If more than max_steps would be
+        needed to catch up, the remaining backlog is dropped (and added to
+        self.dropped_time), so the simulation slows down rather than falling
+        further behind.
+        """
+        now = self.clock()
+        if self.last_time is not None:
+            self.accumulator += now - self.last_time
+        self.last_time = now
+
+        interval = self.step_interval
+        steps = 0
+        while self.accumulator >= interval and steps < self.max_steps:
+            self.step()
+            self.accumulator -= interval
+            steps += 1
+        if self.accumulator >= interval:
+            backlog = self.accumulator - self.accumulator % interval
+            self.dropped_time += backlog
+            self.accumulator -= backlog
+        return self.accumulator/interval
+
+    def lerp_pos(self, body, alpha):
+        """Position of a body interpolated between the last two steps."""
+        old = self.previous[self.bodies.index(body)]
+        return old + (body.pos - old).scm(alpha)
+
+    def interpolated(self, alpha):
+        """Get (body, interpolated position) pairs for all bodies."""
+        return [(body, old + (body.pos - old).scm(alpha))
+                for body, old in zip(self.bodies, self.previous)]
+
+    def run(self, render, frame_rate=None, frames=None):
+        """Main loop: advance the simulation and render once per frame.
+
+        Parameters
+        ----------
+        render: function
+            Called as render(alpha) once per frame; return False to stop.
+        frame_rate: positive float, optional
+            If given, sleep as needed to render at most this many frames per
+            real second. Otherwise, render as fast as possible.
+        frames: int, optional
+            If given, stop after this many frames.
+        """
+        frame = 0
+        while frames is None or frame < frames:
+            start = self.clock()
+            if render(self.advance()) is False:
+                break
+            frame += 1
+            if frame_rate is not None:
+                remaining = 1.0/frame_rate - (self.clock() - start)
+                if remaining > 0:
+                    sleep(remaining)
+
+    def run_headless(self, steps):
+        """Run physics steps as fast as possible, with no rendering.
+
+        Parameters
+        ----------
+        steps: int
+            Number of physics steps to run.
+
+        Returns
+        -------
+        float:
+            Throughput, in physics steps per second of real time.
+        """
+        start = default_timer()
+        for i in range(steps):
+            self.step()
+        elapsed = default_timer() - start
+        self.reset_clock()
+        if elapsed > 0:
+            return steps/elapsed
+        return float('inf')
+
+if __name__ == "__main__":
+    print("Fixed-timestep simulation runner. Import this elsewhere.")